@@ -10,6 +10,8 @@ NN_CONFIG = {
     'value_head_hidden': 256,     # Hidden units in value head
     'policy_head_hidden': 256,    # Hidden units in policy head
     'dropout': 0.3,               # Dropout rate
+    'mixed_precision': True,      # Run CUDA inference under fp16 autocast (CPU stays fp32)
+    'compile_inference': True,    # Compile the inference forward pass with torch.compile
 }
 
 # MCTS Configuration
@@ -19,6 +21,9 @@ MCTS_CONFIG = {
     'temperature': 1.0,           # Temperature for move selection
     'dirichlet_alpha': 0.3,       # Dirichlet noise parameter
     'dirichlet_epsilon': 0.25,    # Dirichlet noise weight
+    'batch_size': 8,              # Leaves evaluated per network call
+    'virtual_loss': 1,            # Penalty applied to in-flight paths during batching
+    'tt_size': 200000,            # Positions kept in the transposition table
 }
 
 # Self-Play Configuration
@@ -26,6 +31,10 @@ SELF_PLAY_CONFIG = {
     'num_games': 100,             # Number of games per iteration
     'max_moves': 400,             # Maximum moves per game
     'save_games': True,           # Whether to save game data
+    'num_workers': 0,             # Worker processes for self-play (0 = play in this process)
+    'quantize_inference': True,   # Run self-play inference with an int8 model on CPU
+    'calibration_size': 2000,     # Positions used to calibrate the int8 model
+    'onnx_inference': True,       # Run self-play inference with ONNX Runtime when installed
 }
 
 # Training Configuration
@@ -34,6 +43,7 @@ TRAINING_CONFIG = {
     'learning_rate': 0.001,       # Learning rate
     'weight_decay': 1e-4,         # L2 regularization
     'num_epochs': 10,             # Epochs per training iteration
+    'num_workers': 4,             # DataLoader worker processes
     'value_loss_weight': 1.0,     # Weight for value loss
     'policy_loss_weight': 1.0,    # Weight for policy loss
     'checkpoint_dir': 'models/checkpoints',
@@ -44,6 +54,16 @@ TRAINING_CONFIG = {
 GAME_CONFIG = {
     'board_size': 8,              # Chess board size (always 8)
     'num_planes': 18,              # Number of input planes for board encoding
+    'encoding_cache_size': 20000, # Positions kept by the board encoding cache
+    'quantize_cpu_play': True,    # Play against an int8 model when running on CPU
+}
+
+# Web Server Configuration
+WEB_CONFIG = {
+    'batch_window': 0.02,         # Seconds a batch waits for positions of other running searches
+    'max_batch': 256,             # Most positions evaluated per shared network call
+    'session_ttl': 600,           # Seconds an idle game's search tree is kept
+    'search_workers': 4,          # AI-move searches run at the same time; others queue
 }
 
 # Paths
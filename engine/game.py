@@ -8,6 +8,32 @@ from typing import Optional, List, Tuple
 import numpy as np
 
 
+def board_result(board: chess.Board) -> Optional[float]:
+    """
+    Get the result of a finished position for the side to move.
+    
+    Args:
+        board: python-chess Board object
+        
+    Returns:
+        1.0 if current player wins
+        -1.0 if current player loses
+        0.0 if draw
+        None if game not over
+    """
+    if not board.is_game_over():
+        return None
+    
+    result = board.result()
+    
+    if result == "1-0":  # White wins
+        return 1.0 if board.turn == chess.BLACK else -1.0
+    elif result == "0-1":  # Black wins
+        return 1.0 if board.turn == chess.WHITE else -1.0
+    else:  # Draw
+        return 0.0
+
+
 class ChessGame:
     """Wrapper class for chess game management."""
     
@@ -59,17 +85,7 @@ class ChessGame:
             0.0 if draw
             None if game not over
         """
-        if not self.is_game_over():
-            return None
-        
-        result = self.board.result()
-        
-        if result == "1-0":  # White wins
-            return 1.0 if self.board.turn == chess.BLACK else -1.0
-        elif result == "0-1":  # Black wins
-            return 1.0 if self.board.turn == chess.WHITE else -1.0
-        else:  # Draw
-            return 0.0
+        return board_result(self.board)
     
     def get_legal_moves(self) -> List[chess.Move]:
         """Get list of legal moves."""
@@ -0,0 +1,246 @@
+"""
+Numeric kernels for NeuroChess
+JIT-compiled with Numba when it is installed, NumPy implementations otherwise
+"""
+
+import math
+import numpy as np
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+if NUMBA_AVAILABLE:
+    @njit(cache=True)
+    def puct_argmax(n_parent, child_N, child_W, child_P, c_puct):
+        """
+        Index of the child maximizing Q + c_puct * P * sqrt(N_parent) / (1 + N_child).
+        
+        Args:
+            n_parent: Visit count of the parent node
+            child_N: Child visit counts
+            child_W: Child total values
+            child_P: Child priors
+            c_puct: Exploration constant
+            
+        Returns:
+            Index of the selected child
+        """
+        sqrt_n = math.sqrt(n_parent)
+        best = 0
+        best_score = -np.inf
+        for i in range(child_N.shape[0]):
+            n = child_N[i]
+            q = child_W[i] / n if n > 0 else 0.0
+            score = q + c_puct * child_P[i] * sqrt_n / (1 + n)
+            if score > best_score:
+                best_score = score
+                best = i
+        return best
+    
+    @njit(cache=True)
+    def normalize_visits(counts):
+        """
+        Turn visit counts into probabilities (all zeros if nothing was visited).
+        
+        Args:
+            counts: Visit counts
+            
+        Returns:
+            float64 array of probabilities
+        """
+        total = 0.0
+        for i in range(counts.shape[0]):
+            total += counts[i]
+        out = np.zeros(counts.shape[0])
+        if total > 0:
+            for i in range(counts.shape[0]):
+                out[i] = counts[i] / total
+        return out
+    
+    @njit(cache=True)
+    def apply_temperature_nb(p, temperature):
+        """
+        Apply temperature to a probability vector, in place.
+        
+        Temperatures below 0.1 are applied in log space, where p ** (1/T)
+        would underflow to all zeros.
+        
+        Args:
+            p: Writable float probabilities
+            temperature: Temperature (1.0 = no change, <1.0 = sharper, >1.0 = flatter)
+            
+        Returns:
+            p, temperature-adjusted
+        """
+        if temperature == 1.0:
+            return p
+        inv_t = 1.0 / temperature
+        total = 0.0
+        if temperature < 0.1:
+            peak = -np.inf
+            for i in range(p.shape[0]):
+                p[i] = math.log(p[i] + 1e-30) * inv_t
+                peak = max(peak, p[i])
+            for i in range(p.shape[0]):
+                p[i] = math.exp(p[i] - peak)
+                total += p[i]
+        else:
+            for i in range(p.shape[0]):
+                p[i] = p[i] ** inv_t
+                total += p[i]
+            total += 1e-8
+        for i in range(p.shape[0]):
+            p[i] /= total
+        return p
+    
+    @njit(cache=True)
+    def encode_planes(bitboards, aux, out):
+        """
+        Write board planes from piece bitboards and per-plane scalars.
+        
+        Args:
+            bitboards: uint64 piece bitboards, one per piece plane (bit i = square i)
+            aux: uint8 values broadcast over the planes after the piece planes
+            out: uint8 output array of shape (len(bitboards) + len(aux), 8, 8)
+            
+        Returns:
+            out
+        """
+        one = np.uint64(1)
+        for p in range(bitboards.shape[0]):
+            bb = bitboards[p]
+            for sq in range(64):
+                out[p, sq >> 3, sq & 7] = np.uint8((bb >> np.uint64(sq)) & one)
+        n = bitboards.shape[0]
+        for p in range(aux.shape[0]):
+            for row in range(8):
+                for col in range(8):
+                    out[n + p, row, col] = aux[p]
+        return out
+    
+    @njit(parallel=True, cache=True)
+    def encode_planes_batch(bitboards, aux, out):
+        """
+        Write board planes for a batch of positions, one position per thread.
+        
+        Args:
+            bitboards: uint64 array of shape (N, n) with the piece bitboards
+            aux: uint8 array of shape (N, m) with the broadcast plane values
+            out: uint8 output array of shape (N, n + m, 8, 8)
+            
+        Returns:
+            out
+        """
+        one = np.uint64(1)
+        n = bitboards.shape[1]
+        for i in prange(bitboards.shape[0]):
+            for p in range(n):
+                bb = bitboards[i, p]
+                for sq in range(64):
+                    out[i, p, sq >> 3, sq & 7] = np.uint8((bb >> np.uint64(sq)) & one)
+            for p in range(aux.shape[1]):
+                for row in range(8):
+                    for col in range(8):
+                        out[i, n + p, row, col] = aux[i, p]
+        return out
+
+else:
+    def puct_argmax(n_parent, child_N, child_W, child_P, c_puct):
+        """
+        Index of the child maximizing Q + c_puct * P * sqrt(N_parent) / (1 + N_child).
+        
+        Args:
+            n_parent: Visit count of the parent node
+            child_N: Child visit counts
+            child_W: Child total values
+            child_P: Child priors
+            c_puct: Exploration constant
+            
+        Returns:
+            Index of the selected child
+        """
+        q = child_W / np.maximum(child_N, 1)
+        u = c_puct * child_P * math.sqrt(n_parent) / (1 + child_N)
+        return int(np.argmax(q + u))
+    
+    def normalize_visits(counts):
+        """
+        Turn visit counts into probabilities (all zeros if nothing was visited).
+        
+        Args:
+            counts: Visit counts
+            
+        Returns:
+            float64 array of probabilities
+        """
+        counts = np.asarray(counts, dtype=np.float64)
+        total = counts.sum()
+        return counts / total if total > 0 else np.zeros_like(counts)
+    
+    def apply_temperature_nb(p, temperature):
+        """
+        Apply temperature to a probability vector, in place.
+        
+        Temperatures below 0.1 are applied in log space, where p ** (1/T)
+        would underflow to all zeros.
+        
+        Args:
+            p: Writable float probabilities
+            temperature: Temperature (1.0 = no change, <1.0 = sharper, >1.0 = flatter)
+            
+        Returns:
+            p, temperature-adjusted
+        """
+        if temperature == 1.0:
+            return p
+        inv_t = 1.0 / temperature
+        if temperature < 0.1:
+            np.log(p + 1e-30, out=p)
+            p *= inv_t
+            p -= p.max()
+            np.exp(p, out=p)
+            p *= 1.0 / p.sum()
+            return p
+        np.power(p, inv_t, out=p)
+        p *= 1.0 / (p.sum() + 1e-8)
+        return p
+    
+    def encode_planes(bitboards, aux, out):
+        """
+        Write board planes from piece bitboards and per-plane scalars.
+        
+        Args:
+            bitboards: uint64 piece bitboards, one per piece plane (bit i = square i)
+            aux: uint8 values broadcast over the planes after the piece planes
+            out: uint8 output array of shape (len(bitboards) + len(aux), 8, 8)
+            
+        Returns:
+            out
+        """
+        n = len(bitboards)
+        bits = np.asarray(bitboards, dtype='<u8').view(np.uint8)
+        out[:n] = np.unpackbits(bits, bitorder='little').reshape(n, 8, 8)
+        out[n:] = np.asarray(aux)[:, None, None]
+        return out
+    
+    def encode_planes_batch(bitboards, aux, out):
+        """
+        Write board planes for a batch of positions with one unpackbits call.
+        
+        Args:
+            bitboards: uint64 array of shape (N, n) with the piece bitboards
+            aux: uint8 array of shape (N, m) with the broadcast plane values
+            out: uint8 output array of shape (N, n + m, 8, 8)
+            
+        Returns:
+            out
+        """
+        count, n = bitboards.shape
+        bits = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8)
+        out[:, :n] = np.unpackbits(bits, bitorder='little').reshape(count, n, 8, 8)
+        out[:, n:] = aux[:, :, None, None]
+        return out
@@ -2,44 +2,124 @@
 Monte Carlo Tree Search implementation for NeuroChess
 """
 
+import threading
 import numpy as np
 import chess
-from typing import Dict, List, Optional, Tuple
-import math
-from engine.game import ChessGame
-from engine.utils import board_to_tensor, move_to_index, create_move_mask, apply_temperature
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from engine.game import ChessGame, board_result
+from engine.utils import NUM_MOVES, board_to_tensor, boards_to_tensor, move_to_index
+from engine.kernels import puct_argmax, normalize_visits, apply_temperature_nb
 import config
 
 
 class MCTSNode:
-    """Node in the Monte Carlo Tree."""
+    """
+    Node in the Monte Carlo Tree.
     
-    def __init__(self, game: ChessGame, parent: Optional['MCTSNode'] = None, move: Optional[chess.Move] = None):
+    Nodes do not own a board. The search keeps a single board that is pushed
+    while descending and popped while unwinding, so a node only needs the
+    position when it is reached, at which point its views are cached.
+    
+    Child statistics are stored as parallel arrays on the parent (structure
+    of arrays), so PUCT selection is one vectorized expression. Child node
+    objects are only created once a child is first selected.
+    """
+    
+    def __init__(self, parent: Optional['MCTSNode'] = None, move: Optional[chess.Move] = None,
+                 index: int = None):
         """
         Initialize MCTS node.
         
         Args:
-            game: ChessGame object representing the position
             parent: Parent node
             move: Move that led to this position
+            index: Position of this node in the parent's child arrays
         """
-        self.game = game
         self.parent = parent
         self.move = move
-        self.children: Dict[chess.Move, 'MCTSNode'] = {}
+        self.index = index
         self.visit_count = 0
-        self.value_sum = 0.0
-        self.prior = 0.0  # Prior probability from neural network
+        
+        # Child statistics, filled by expand()
+        self.child_move: List[chess.Move] = []
+        self.child_idx = None   # Policy indices (int64)
+        self.child_N = None     # Visit counts (int32)
+        self.child_W = None     # Total values (float32)
+        self.child_P = None     # Priors (float32)
+        self.child_node: List[Optional['MCTSNode']] = []
+        
+        # Lazily computed views of the position
+        self._cached_tensor = None
+        self._cached_legal = None
+        self._terminal_checked = False
+        self._terminal_value = None
+    
+    def board_tensor(self, board: chess.Board) -> np.ndarray:
+        """
+        Get the (cached) network input tensor for this position.
+        
+        Args:
+            board: Board set to this node's position
+        """
+        if self._cached_tensor is None:
+            self._cached_tensor = board_to_tensor(board)
+        return self._cached_tensor
+    
+    def legal_with_indices(self, board: chess.Board = None) -> Tuple[List[chess.Move], np.ndarray]:
+        """
+        Get the (cached) legal moves and an array of their policy indices.
+        
+        Args:
+            board: Board set to this node's position (only needed on first call)
+        """
+        if self._cached_legal is None:
+            legal_moves = list(board.legal_moves)
+            idxs = np.fromiter((move_to_index(move, board) for move in legal_moves),
+                               dtype=np.int64, count=len(legal_moves))
+            self._cached_legal = (legal_moves, idxs)
+        return self._cached_legal
+    
+    def terminal_value(self, board: chess.Board) -> Optional[float]:
+        """
+        Get the (cached) game result if this position is terminal.
+        
+        Args:
+            board: Board set to this node's position
+            
+        Returns:
+            Result from the current player's perspective, or None if not terminal
+        """
+        if not self._terminal_checked:
+            self._terminal_value = board_result(board)
+            self._terminal_checked = True
+        return self._terminal_value
     
     def is_expanded(self) -> bool:
         """Check if node has been expanded."""
-        return len(self.children) > 0
+        return len(self.child_move) > 0
     
     def get_value(self) -> float:
         """Get average value of this node."""
-        if self.visit_count == 0:
+        if self.visit_count == 0 or self.parent is None:
             return 0.0
-        return self.value_sum / self.visit_count
+        return float(self.parent.child_W[self.index]) / self.visit_count
+    
+    def get_child(self, move: chess.Move) -> Optional['MCTSNode']:
+        """
+        Get the child reached by move, if it has been visited.
+        
+        Args:
+            move: Move from this position
+            
+        Returns:
+            Child node, or None if the move is unknown or was never selected
+        """
+        try:
+            i = self.child_move.index(move)
+        except ValueError:
+            return None
+        return self.child_node[i]
     
     def select_child(self, c_puct: float) -> 'MCTSNode':
         """
@@ -51,51 +131,57 @@ class MCTSNode:
         Returns:
             Selected child node
         """
-        best_score = float('-inf')
-        best_child = None
-        
-        for move, child in self.children.items():
-            # UCT formula: Q + c_puct * P * sqrt(N_parent) / (1 + N_child)
-            u = c_puct * child.prior * math.sqrt(self.visit_count) / (1 + child.visit_count)
-            score = child.get_value() + u
-            
-            if score > best_score:
-                best_score = score
-                best_child = child
+        # UCT formula: Q + c_puct * P * sqrt(N_parent) / (1 + N_child)
+        i = int(puct_argmax(self.visit_count, self.child_N, self.child_W, self.child_P, c_puct))
         
-        return best_child
+        child = self.child_node[i]
+        if child is None:
+            child = MCTSNode(parent=self, move=self.child_move[i], index=i)
+            self.child_node[i] = child
+        return child
     
-    def expand(self, policy: np.ndarray):
+    def expand(self, policy: np.ndarray, board: chess.Board = None):
         """
-        Expand node by creating children for all legal moves.
+        Expand node by creating child entries for all legal moves.
         
         Args:
-            policy: Policy vector from neural network (4096 elements)
+            policy: Policy vector from neural network (NUM_MOVES elements)
+            board: Board set to this node's position, unless its legal moves
+                were already cached when the node was reached
         """
-        legal_moves = self.game.get_legal_moves()
-        move_mask = create_move_mask(self.game.get_board())
+        legal_moves, idxs = self.legal_with_indices(board)
+        if len(legal_moves) == 0:
+            return
         
         # Normalize policy over legal moves only
-        legal_policy = np.zeros(len(legal_moves))
-        for i, move in enumerate(legal_moves):
-            idx = move_to_index(move, self.game.get_board())
-            legal_policy[i] = policy[idx] * move_mask[idx]
-        
-        # Normalize
+        legal_policy = policy[idxs]
         total = legal_policy.sum()
         if total > 0:
             legal_policy = legal_policy / total
         else:
             # Uniform distribution if all zeros
-            legal_policy = np.ones(len(legal_moves)) / len(legal_moves)
+            legal_policy = np.full(len(legal_moves), 1.0 / len(legal_moves))
         
-        # Create children
-        for i, move in enumerate(legal_moves):
-            new_game = self.game.copy()
-            new_game.make_move(move)
-            child = MCTSNode(new_game, parent=self, move=move)
-            child.prior = legal_policy[i]
-            self.children[move] = child
+        self.expand_from_priors(legal_policy)
+    
+    def expand_from_priors(self, priors: np.ndarray, board: chess.Board = None):
+        """
+        Expand node from priors already normalized over its legal moves.
+        
+        Args:
+            priors: One prior per legal move, in legal_with_indices order
+            board: Board set to this node's position, unless its legal moves
+                were already cached when the node was reached
+        """
+        legal_moves, idxs = self.legal_with_indices(board)
+        
+        # Child nodes themselves are created lazily by select_child
+        self.child_move = legal_moves
+        self.child_idx = idxs
+        self.child_N = np.zeros(len(legal_moves), dtype=np.int32)
+        self.child_W = np.zeros(len(legal_moves), dtype=np.float32)
+        self.child_P = np.array(priors, dtype=np.float32)
+        self.child_node = [None] * len(legal_moves)
     
     def backpropagate(self, value: float):
         """
@@ -104,19 +190,80 @@ class MCTSNode:
         Args:
             value: Value to propagate (from current player's perspective)
         """
-        self.visit_count += 1
-        self.value_sum += value
-        
-        if self.parent is not None:
+        node = self
+        while node is not None:
+            node.visit_count += 1
+            parent = node.parent
+            if parent is not None:
+                parent.child_N[node.index] += 1
+                parent.child_W[node.index] += value
             # Flip value for parent (opponent's perspective)
-            self.parent.backpropagate(-value)
+            value = -value
+            node = parent
+
+
+class TranspositionTable:
+    """Least-recently-used map from position key to (legal move priors, value)."""
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def __contains__(self, key) -> bool:
+        return key in self._entries
+    
+    def get(self, key) -> Optional[Tuple[np.ndarray, float]]:
+        """Return the entry for key, marking it recently used, or None."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+    
+    def put(self, key, priors: np.ndarray, value: float):
+        """Store an evaluation, evicting the least recently used entry if full."""
+        self._entries[key] = (priors, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+    
+    def clear(self):
+        """Drop all entries."""
+        self._entries.clear()
+
+
+class SharedTranspositionTable(TranspositionTable):
+    """TranspositionTable that searches running in several threads can share."""
+    
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize)
+        self._lock = threading.Lock()
+    
+    def get(self, key) -> Optional[Tuple[np.ndarray, float]]:
+        """Return the entry for key, marking it recently used, or None."""
+        with self._lock:
+            return super().get(key)
+    
+    def put(self, key, priors: np.ndarray, value: float):
+        """Store an evaluation, evicting the least recently used entry if full."""
+        with self._lock:
+            super().put(key, priors, value)
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            super().clear()
 
 
 class MCTS:
     """Monte Carlo Tree Search with neural network guidance."""
     
     def __init__(self, model, num_simulations: int = None, c_puct: float = None,
-                 temperature: float = None, device: str = 'cpu'):
+                 temperature: float = None, device: str = 'cpu', batch_size: int = None,
+                 virtual_loss: int = None, play_mode: bool = False,
+                 transposition_table: TranspositionTable = None):
         """
         Initialize MCTS.
         
@@ -126,104 +273,306 @@ class MCTS:
             c_puct: Exploration constant
             temperature: Temperature for move selection
             device: Device to run model on
+            batch_size: Number of leaves gathered per neural network call
+            virtual_loss: Penalty on in-flight paths, spreading a batch over
+                more distinct leaves
+            play_mode: Play the most visited move without root Dirichlet noise
+                or temperature, for games against a person; self-play keeps
+                both for exploration
+            transposition_table: Table of evaluations to share with other
+                searches of the same model, such as a SharedTranspositionTable
+                when they run in threads; by default the search has its own
         """
         self.model = model
         self.num_simulations = num_simulations or config.MCTS_CONFIG['num_simulations']
         self.c_puct = c_puct or config.MCTS_CONFIG['c_puct']
         self.temperature = temperature or config.MCTS_CONFIG['temperature']
         self.device = device
+        self.batch_size = batch_size or config.MCTS_CONFIG['batch_size']
+        self.virtual_loss = virtual_loss if virtual_loss is not None else config.MCTS_CONFIG['virtual_loss']
+        self.play_mode = play_mode
+        self.root = None  # Root of the previous search, kept for subtree reuse
+        self._root_board = None  # Position self.root stands for
+        
+        # Progress of the running search, readable from other threads
+        self.simulations_done = 0
+        self._stop_requested = False
+        
+        # Slab the leaf positions of a batch are encoded into. Each MCTS
+        # instance owns one, so a search must not be shared between threads.
+        self._leaf_planes = np.empty((self.batch_size, 18, 8, 8), dtype=np.uint8)
+        
+        # Transposition table: position key -> (legal move priors, value), so
+        # positions reached through different move orders are evaluated once.
+        # It outlives a single search, so it is bounded.
+        if transposition_table is None:
+            transposition_table = TranspositionTable(config.MCTS_CONFIG['tt_size'])
+        self._tt = transposition_table
+    
+    @property
+    def transposition_table(self) -> TranspositionTable:
+        """Table of evaluations this search reads and fills."""
+        return self._tt
+    
+    def _select_leaf(self, root: MCTSNode, board: chess.Board) -> MCTSNode:
+        """
+        Traverse from the root to a leaf, applying virtual loss along the path.
+        
+        The virtual loss makes the path look temporarily worse so that the
+        following selections in the same batch explore different leaves.
+        The moves along the path are pushed onto board, which is left at the
+        leaf position; the caller must pop them again.
+        
+        Args:
+            root: Root node of the search tree
+            board: Board set to the root position
+            
+        Returns:
+            Selected leaf node
+        """
+        node = root
+        node.visit_count += self.virtual_loss
+        while node.is_expanded():
+            node = node.select_child(self.c_puct)
+            board.push(node.move)
+            node.visit_count += self.virtual_loss
+            node.parent.child_N[node.index] += self.virtual_loss
+            node.parent.child_W[node.index] -= self.virtual_loss
+        return node
     
-    def search(self, game: ChessGame) -> Tuple[chess.Move, np.ndarray]:
+    def _revert_virtual_loss(self, leaf: MCTSNode):
+        """
+        Remove the virtual loss applied by _select_leaf on the path to leaf.
+        
+        Args:
+            leaf: Leaf node returned by _select_leaf
+        """
+        node = leaf
+        while node is not None:
+            node.visit_count -= self.virtual_loss
+            if node.parent is not None:
+                node.parent.child_N[node.index] -= self.virtual_loss
+                node.parent.child_W[node.index] += self.virtual_loss
+            node = node.parent
+    
+    @staticmethod
+    def _add_dirichlet_noise(priors: np.ndarray) -> np.ndarray:
+        """
+        Mix Dirichlet noise into root priors, in place.
+        
+        Stays in NumPy: at a few dozen entries a device round-trip would cost
+        far more than the sampling itself.
+        
+        Args:
+            priors: Writable prior probabilities over the legal moves
+            
+        Returns:
+            priors (the same array) with noise mixed in
+        """
+        epsilon = config.MCTS_CONFIG['dirichlet_epsilon']
+        noise = np.random.dirichlet(np.full(len(priors), config.MCTS_CONFIG['dirichlet_alpha']))
+        noise *= epsilon
+        priors *= 1 - epsilon
+        priors += noise
+        return priors
+    
+    def best_move_so_far(self) -> Optional[chess.Move]:
+        """
+        Most visited root move of the search in progress (or the last one).
+        
+        Safe to call from another thread while search runs; the answer may
+        lag the search by a batch.
+        
+        Returns:
+            The move, or None before the root has been expanded
+        """
+        root = self.root
+        if root is None or not root.is_expanded() or len(root.child_move) == 0:
+            return None
+        return root.child_move[int(np.argmax(root.child_N))]
+    
+    def stop(self):
+        """Ask a running search to finish after its current batch."""
+        self._stop_requested = True
+    
+    def advance_root(self, move: chess.Move):
+        """
+        Follow a move played on the board down the kept search tree.
+        
+        Call it for every move played, by either side, so the next search
+        starts from the matching subtree instead of an empty tree.
+        
+        Args:
+            move: Move played from the position of the current root
+        """
+        if self.root is None:
+            return
+        self.root = self.root.get_child(move)
+        if self.root is None:
+            self._root_board = None
+        else:
+            self._root_board.push(move)
+    
+    def search(self, game: ChessGame, last_move: Optional[chess.Move] = None) -> Tuple[chess.Move, np.ndarray]:
         """
         Perform MCTS search and return best move.
         
         Args:
             game: Current game state
-            
+            last_move: Move played since the previous search. When given, the
+                matching subtree of the previous search becomes the new root,
+                as with advance_root(last_move).
+                
         Returns:
             best_move: Best move according to MCTS
             visit_counts: Visit counts for all moves (normalized as probabilities)
         """
-        root = MCTSNode(game)
+        # Single board shared by all simulations (push on descent, pop on unwind)
+        board = game.get_board().copy()
         
-        # Get initial policy and value from neural network
-        board_tensor = board_to_tensor(game.get_board())
-        policy, value = self.model.predict(board_tensor, self.device)
+        if last_move is not None:
+            self.advance_root(last_move)
         
-        # Add Dirichlet noise to root policy for exploration
-        legal_moves = game.get_legal_moves()
-        if len(legal_moves) > 0:
-            dirichlet_noise = np.random.dirichlet(
-                [config.MCTS_CONFIG['dirichlet_alpha']] * len(legal_moves)
-            )
-            move_mask = create_move_mask(game.get_board())
+        # The kept tree is reused only if it stands for this position
+        root = None
+        if (self.root is not None
+                and self._root_board._transposition_key() == board._transposition_key()):
+            root = self.root
+        
+        if root is not None:
+            # Reuse the subtree; its statistics are still valid for this position
+            root.parent = None
+            legal_moves, legal_idxs = root.legal_with_indices(board)
+            if root.is_expanded() and not self.play_mode:
+                # Add Dirichlet noise to the existing child priors for exploration
+                self._add_dirichlet_noise(root.child_P)
+        else:
+            root = MCTSNode()
+            legal_moves, legal_idxs = root.legal_with_indices(board)
+        self.root = root
+        self._root_board = board.copy(stack=False)
+        
+        if not root.is_expanded():
+            # Get initial policy and value from neural network, unless an
+            # earlier search already evaluated the position
+            key = board._transposition_key()
+            cached = self._tt.get(key)
+            if cached is not None:
+                # Copied, since the noise below is mixed in place
+                priors = cached[0].copy()
+            else:
+                priors, value = self.model.predict_legal(root.board_tensor(board), legal_idxs, self.device)
+                self._tt.put(key, priors.copy(), value)
             
-            for i, move in enumerate(legal_moves):
-                idx = move_to_index(move, game.get_board())
-                policy[idx] = (1 - config.MCTS_CONFIG['dirichlet_epsilon']) * policy[idx] + \
-                             config.MCTS_CONFIG['dirichlet_epsilon'] * dirichlet_noise[i]
-                policy[idx] *= move_mask[idx]
+            # Add Dirichlet noise to root priors for exploration
+            if len(legal_moves) > 0 and not self.play_mode:
+                self._add_dirichlet_noise(priors)
             
-            # Renormalize
-            policy = policy / (policy.sum() + 1e-8)
+            root.expand_from_priors(priors)
         
-        root.expand(policy)
-        
-        # Perform simulations
-        for _ in range(self.num_simulations):
-            node = root
+        # Perform simulations, evaluating leaves in batches
+        root_depth = len(board.move_stack)
+        simulations = 0
+        self.simulations_done = 0
+        self._stop_requested = False
+        while simulations < self.num_simulations and not self._stop_requested:
+            self.simulations_done = simulations
+            leaves = []           # (node, position in the batch, position key)
+            leaf_boards = []      # Positions to evaluate, encoded together
+            batch_legal = []      # Legal move indices per position in the batch
+            pending = {}          # Position key -> position in the batch
+            collided = False
+            while not collided and len(leaves) < self.batch_size and simulations < self.num_simulations:
+                # Selection: traverse to leaf
+                node = self._select_leaf(root, board)
+                
+                value = node.terminal_value(board)
+                if value is not None:
+                    # Terminal positions need no network evaluation
+                    self._revert_virtual_loss(node)
+                    node.backpropagate(value)
+                    simulations += 1
+                elif any(node is leaf for leaf, _, _ in leaves):
+                    # Collided with a leaf already waiting in this batch
+                    self._revert_virtual_loss(node)
+                    collided = True
+                else:
+                    # Capture what the later expansion needs while the board is here
+                    _, idxs = node.legal_with_indices(board)
+                    # Same key as the encoding caches: read straight off the
+                    # bitboards, cheaper than hashing square by square
+                    key = board._transposition_key()
+                    cached = self._tt.get(key)
+                    if cached is not None:
+                        # Transposition of an evaluated position: reuse it
+                        priors, value = cached
+                        self._revert_virtual_loss(node)
+                        node.expand_from_priors(priors)
+                        node.backpropagate(value)
+                    elif key in pending:
+                        # Same position as another leaf in this batch
+                        leaves.append((node, pending[key], key))
+                    else:
+                        pending[key] = len(leaf_boards)
+                        leaf_boards.append(board.copy(stack=False))
+                        batch_legal.append(idxs)
+                        leaves.append((node, pending[key], key))
+                    simulations += 1
+                
+                # Unwind the shared board back to the root
+                while len(board.move_stack) > root_depth:
+                    board.pop()
             
-            # Selection: traverse to leaf
-            while node.is_expanded() and not node.game.is_game_over():
-                node = node.select_child(self.c_puct)
+            if not leaves:
+                continue
             
-            # Evaluation
-            if node.game.is_game_over():
-                value = node.game.get_result()
-                if value is None:
-                    value = 0.0
-            else:
-                # Expand and evaluate with neural network
-                board_tensor = board_to_tensor(node.game.get_board())
-                policy, value = self.model.predict(board_tensor, self.device)
-                node.expand(policy)
+            # Evaluation: one forward pass for the whole batch
+            try:
+                priors, values = self.model.predict_legal_batch(
+                    boards_to_tensor(leaf_boards, out=self._leaf_planes[:len(leaf_boards)]),
+                    batch_legal, self.device
+                )
+            except BaseException:
+                # Leave the kept tree as it was before this batch, so a later
+                # search does not inherit the in-flight paths' virtual loss
+                for leaf, _, _ in leaves:
+                    self._revert_virtual_loss(leaf)
+                raise
             
-            # Backpropagation
-            node.backpropagate(value)
-        
-        # Select move based on visit counts
-        visit_counts = np.zeros(4096)
-        for move, child in root.children.items():
-            idx = move_to_index(move, game.get_board())
-            visit_counts[idx] = child.visit_count
-        
-        # Normalize visit counts to get move probabilities
-        total_visits = visit_counts.sum()
-        if total_visits > 0:
-            visit_counts = visit_counts / total_visits
-        else:
-            # Fallback to uniform
-            legal_moves = game.get_legal_moves()
-            for move in legal_moves:
-                idx = move_to_index(move, game.get_board())
-                visit_counts[idx] = 1.0 / len(legal_moves)
-        
-        # Apply temperature
-        visit_counts = apply_temperature(visit_counts, self.temperature)
+            # Expansion and backpropagation
+            for leaf, slot, key in leaves:
+                self._revert_virtual_loss(leaf)
+                value = float(values[slot])
+                cached = self._tt.get(key)
+                if cached is not None:
+                    leaf.expand_from_priors(cached[0])
+                else:
+                    # The node copies the priors, so root noise mixed into
+                    # child_P later never reaches the table
+                    leaf.expand_from_priors(priors[slot])
+                    self._tt.put(key, priors[slot], value)
+                leaf.backpropagate(value)
+        self.simulations_done = simulations
         
-        # Select best move
-        legal_moves = game.get_legal_moves()
+        # Select move based on visit counts, working on the legal moves only
         if len(legal_moves) == 0:
-            return None, visit_counts
+            return None, np.zeros(NUM_MOVES)
+        
+        if root.is_expanded():
+            probs = normalize_visits(root.child_N)
+        else:
+            probs = np.zeros(len(legal_moves))
+        if not probs.any():
+            # Fallback to uniform
+            probs[:] = 1.0 / len(legal_moves)
         
-        best_move = None
-        best_score = -1
+        # Apply temperature; it cannot change the argmax, so play mode skips it
+        if not self.play_mode:
+            probs = apply_temperature_nb(probs, self.temperature)
+        best_move = legal_moves[int(np.argmax(probs))]
         
-        for move in legal_moves:
-            idx = move_to_index(move, game.get_board())
-            if visit_counts[idx] > best_score:
-                best_score = visit_counts[idx]
-                best_move = move
+        # Scatter into the full policy vector for the caller
+        visit_counts = np.zeros(NUM_MOVES)
+        visit_counts[legal_idxs] = probs
         
         return best_move, visit_counts
-
@@ -3,13 +3,66 @@ Neural network architecture for NeuroChess
 PyTorch CNN model with policy and value heads
 """
 
+import os
+from concurrent.futures import ThreadPoolExecutor
 import torch
 import torch.nn as nn
 import torch.nn.functional as F
 import numpy as np
-from typing import Tuple
+from typing import List, Sequence, Tuple
+from engine.utils import MMAP_CHECKPOINTS, MOVE_COUNT_SCALE, NUM_MOVES, read_checkpoint
 import config
 
+try:
+    import onnxruntime as ort
+    ONNXRUNTIME_AVAILABLE = True
+except ImportError:
+    ONNXRUNTIME_AVAILABLE = False
+
+
+def inference_autocast(device: str):
+    """
+    Mixed-precision context for inference on the given device.
+    
+    On CUDA, matmuls and convolutions run in float16, while ops on
+    autocast's float32 list, such as softmax, stay in float32. Other ops,
+    including BatchNorm, follow their input's dtype. CPU inference stays in
+    float32: bfloat16 is slower there without native hardware support, and
+    less accurate.
+    
+    Args:
+        device: device the model runs on
+        
+    Returns:
+        torch.autocast context manager
+    """
+    device_type = 'cuda' if 'cuda' in str(device) else 'cpu'
+    if device_type != 'cuda':
+        return torch.autocast(device_type='cpu', enabled=False)
+    return torch.autocast(device_type='cuda', dtype=torch.float16,
+                          enabled=config.NN_CONFIG['mixed_precision'])
+
+
+def to_network_input(x: torch.Tensor, memory_format=torch.contiguous_format) -> torch.Tensor:
+    """
+    Convert encoded board planes to the float32 network input.
+    
+    uint8 planes from board_to_tensor are cast and get their move count plane
+    scaled to [0, 1]; float planes (e.g. older saved data) are already scaled.
+    
+    Args:
+        x: Board planes of shape (batch_size, 18, 8, 8)
+        memory_format: Memory format of the returned tensor
+        
+    Returns:
+        float32 tensor of shape (batch_size, 18, 8, 8) on the same device
+    """
+    encoded = x.dtype == torch.uint8
+    x = x.to(dtype=torch.float32, memory_format=memory_format)
+    if encoded:
+        x[:, 17].mul_(MOVE_COUNT_SCALE)
+    return x
+
 
 class ResidualBlock(nn.Module):
     """Residual block for the neural network."""
@@ -37,7 +90,7 @@ class ChessNet(nn.Module):
     Architecture:
     - Input: 18 planes of 8x8 (board representation)
     - Convolutional layers with residual blocks
-    - Policy head: outputs move probabilities (4096 possible moves)
+    - Policy head: outputs move probabilities (1858-entry AlphaZero move table)
     - Value head: outputs position evaluation (-1 to 1)
     """
     
@@ -67,7 +120,7 @@ class ChessNet(nn.Module):
         self.policy_bn = nn.BatchNorm2d(32)
         self.policy_fc = nn.Linear(32 * 8 * 8, policy_head_hidden)
         self.policy_dropout = nn.Dropout(dropout)
-        self.policy_out = nn.Linear(policy_head_hidden, 4096)  # 64*64 possible moves
+        self.policy_out = nn.Linear(policy_head_hidden, NUM_MOVES)
         
         # Value head
         self.value_conv = nn.Conv2d(num_filters, 32, kernel_size=1)
@@ -75,6 +128,14 @@ class ChessNet(nn.Module):
         self.value_fc1 = nn.Linear(32 * 8 * 8, value_head_hidden)
         self.value_dropout = nn.Dropout(dropout)
         self.value_fc2 = nn.Linear(value_head_hidden, 1)
+        
+        # Inference-only state (not part of the state dict)
+        self._compiled_forward = None
+        self._quantized_forward = None
+        self._in_np = None    # Host input buffer (pinned when CUDA is available)
+        self._in_t = None     # Torch view of the host input buffer
+        self._inp = None      # Device input buffer
+        self._out_bufs = {}   # Pinned host output buffers keyed by shape
     
     def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
         """
@@ -84,7 +145,7 @@ class ChessNet(nn.Module):
             x: Input tensor of shape (batch_size, 18, 8, 8)
             
         Returns:
-            policy: Policy tensor of shape (batch_size, 4096)
+            policy: Policy tensor of shape (batch_size, NUM_MOVES)
             value: Value tensor of shape (batch_size, 1)
         """
         # Input convolution
@@ -110,6 +171,195 @@ class ChessNet(nn.Module):
         
         return policy, value
     
+    def compile_for_inference(self, mode: str = 'reduce-overhead') -> bool:
+        """
+        Compile the forward pass used by predict with torch.compile.
+        
+        Training keeps calling the eager forward, and the state dict keeps its
+        plain parameter names, so checkpoints are unaffected.
+        
+        Args:
+            mode: torch.compile mode
+            
+        Returns:
+            True if a compiled forward is installed
+        """
+        if not config.NN_CONFIG['compile_inference'] or not hasattr(torch, 'compile'):
+            return False
+        try:
+            self._compiled_forward = torch.compile(self.forward, mode=mode)
+        except Exception as e:
+            print(f"Warning: torch.compile unavailable ({e}). Using eager inference.")
+            self._compiled_forward = None
+        return self._compiled_forward is not None
+    
+    def _clone(self) -> 'ChessNet':
+        """Create an eval-mode copy of this network with the same architecture and weights."""
+        clone = ChessNet(
+            num_res_blocks=len(self.res_blocks),
+            num_filters=self.input_conv.out_channels,
+            value_head_hidden=self.value_fc1.out_features,
+            policy_head_hidden=self.policy_fc.out_features,
+            dropout=self.policy_dropout.p
+        )
+        clone.load_state_dict(self.state_dict())
+        return clone.to(self.input_conv.weight.device).eval()
+    
+    def fuse(self) -> 'ChessNet':
+        """
+        Build an inference copy with BatchNorm folded into the preceding convolutions.
+        
+        Each Conv-BN pair becomes a single convolution, removing a kernel
+        launch per pair. BatchNorm statistics are frozen by the fold, so the
+        copy must not be trained; the original network is left untouched.
+        
+        Returns:
+            Fused ChessNet on the same device
+        """
+        from torch.ao.quantization import fuse_modules
+        
+        fused = self._clone()
+        pairs = [['input_conv', 'input_bn'], ['policy_conv', 'policy_bn'], ['value_conv', 'value_bn']]
+        for i in range(len(fused.res_blocks)):
+            pairs.append([f'res_blocks.{i}.conv1', f'res_blocks.{i}.bn1'])
+            pairs.append([f'res_blocks.{i}.conv2', f'res_blocks.{i}.bn2'])
+        fuse_modules(fused, pairs, inplace=True)
+        fused.compile_for_inference()
+        return fused
+    
+    def quantize(self, calibration_boards: np.ndarray, batch_size: int = 64) -> 'ChessNet':
+        """
+        Build an int8 copy of this network for CPU inference.
+        
+        Convolutions and linear layers are statically quantized with FX graph
+        mode quantization, using activation ranges observed on the calibration
+        positions. The original network is left untouched, so it can keep
+        training in float32.
+        
+        Args:
+            calibration_boards: numpy array of shape (num_positions, 18, 8, 8)
+            batch_size: Number of positions per calibration forward pass
+            
+        Returns:
+            ChessNet whose predict/predict_batch run the int8 model on CPU
+        """
+        from torch.ao.quantization import get_default_qconfig_mapping
+        from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+        
+        # fbgemm uses VNNI on x86; qnnpack is the ARM backend
+        engines = torch.backends.quantized.supported_engines
+        engine = 'fbgemm' if 'fbgemm' in engines else 'qnnpack'
+        torch.backends.quantized.engine = engine
+        
+        calibration = to_network_input(torch.from_numpy(np.asarray(calibration_boards)))
+        prepared = prepare_fx(self._clone().cpu(), get_default_qconfig_mapping(engine),
+                              example_inputs=(calibration[:1],))
+        with torch.no_grad():
+            for start in range(0, len(calibration), batch_size):
+                prepared(calibration[start:start + batch_size])
+        
+        quantized = self._clone().cpu()
+        quantized._quantized_forward = convert_fx(prepared)
+        return quantized
+    
+    def export_onnx(self, path: str, device: str = 'cpu') -> str:
+        """
+        Export the network to an ONNX file for inference with ONNX Runtime.
+        
+        Args:
+            path: Output file path
+            device: Device the model currently lives on
+            
+        Returns:
+            The output file path
+        """
+        self.eval()
+        example = torch.zeros(1, 18, 8, 8, device=device)
+        with torch.no_grad():
+            torch.onnx.export(
+                self, example, path,
+                input_names=['input'], output_names=['policy', 'value'],
+                dynamic_axes={'input': {0: 'batch'}, 'policy': {0: 'batch'}, 'value': {0: 'batch'}},
+                opset_version=17
+            )
+        return path
+    
+    def _inference_forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Run the forward pass used for inference, compiled when available."""
+        if self._quantized_forward is not None:
+            # The int8 kernels take float32 input and run outside autocast
+            with torch.autocast(device_type='cpu', enabled=False):
+                return self._quantized_forward(x)
+        if self._compiled_forward is not None:
+            try:
+                return self._compiled_forward(x)
+            except Exception as e:
+                # Compilation happens lazily on the first call; fall back for good
+                print(f"Warning: compiled inference failed ({e}). Using eager inference.")
+                self._compiled_forward = None
+        return self.forward(x)
+    
+    def _stage_input(self, board_tensors: np.ndarray, device: str) -> torch.Tensor:
+        """
+        Copy a batch of board tensors into the persistent input buffers.
+        
+        The host buffer keeps the dtype of the encoded planes (uint8 for
+        board_to_tensor output) and is pinned when CUDA is available, so the
+        transfer to the device is a small non_blocking copy; the conversion
+        to a float32, channels-last input happens on the device.
+        
+        Args:
+            board_tensors: numpy array of shape (batch_size, 18, 8, 8)
+            device: device to run inference on
+            
+        Returns:
+            float32 input tensor of shape (batch_size, 18, 8, 8) on device
+        """
+        batch_size = len(board_tensors)
+        dtype = torch.uint8 if board_tensors.dtype == np.uint8 else torch.float32
+        if self._in_np is None or len(self._in_np) < batch_size or self._in_t.dtype != dtype:
+            self._in_t = torch.zeros(batch_size, 18, 8, 8, dtype=dtype)
+            if torch.cuda.is_available():
+                self._in_t = self._in_t.pin_memory()
+            self._in_np = self._in_t.numpy()
+            self._inp = None
+        np.copyto(self._in_np[:batch_size], board_tensors)
+        
+        host = self._in_t[:batch_size]
+        if torch.device(device).type == 'cpu':
+            return to_network_input(host)
+        
+        if self._inp is None or self._inp.device != torch.device(device):
+            self._inp = torch.empty(self._in_t.shape, dtype=dtype, device=device)
+        x = self._inp[:batch_size]
+        x.copy_(host, non_blocking=True)
+        # Channels-last so convolutions can use NHWC (tensor-core) kernels
+        return to_network_input(x, memory_format=torch.channels_last)
+    
+    def _fetch_output(self, tensor: torch.Tensor) -> np.ndarray:
+        """
+        Copy an output tensor back to a numpy array.
+        
+        Device outputs go through a reusable pinned host buffer so the
+        device-to-host copy can be non-blocking.
+        
+        Args:
+            tensor: float32 output tensor
+            
+        Returns:
+            numpy array owned by the caller
+        """
+        if tensor.device.type == 'cpu':
+            return tensor.numpy()
+        
+        out = self._out_bufs.get(tensor.shape)
+        if out is None:
+            out = torch.empty(tensor.shape, pin_memory=True)
+            self._out_bufs[tensor.shape] = out
+        out.copy_(tensor, non_blocking=True)
+        torch.cuda.current_stream(tensor.device).synchronize()
+        return out.numpy().copy()
+    
     def predict(self, board_tensor: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, float]:
         """
         Predict policy and value for a single board position.
@@ -119,16 +369,214 @@ class ChessNet(nn.Module):
             device: device to run inference on
             
         Returns:
-            policy: numpy array of shape (4096,)
+            policy: numpy array of shape (NUM_MOVES,)
             value: float value
         """
+        policies, values = self.predict_batch(board_tensor[np.newaxis], device)
+        return policies[0], float(values[0])
+    
+    def predict_batch(self, board_tensors: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Predict policies and values for a batch of board positions.
+        
+        Args:
+            board_tensors: numpy array of shape (batch_size, 18, 8, 8)
+            device: device to run inference on (CPU only for a quantized network)
+            
+        Returns:
+            policies: numpy array of shape (batch_size, NUM_MOVES)
+            values: numpy array of shape (batch_size,)
+        """
         self.eval()
-        with torch.no_grad():
-            # Add batch dimension
-            x = torch.FloatTensor(board_tensor).unsqueeze(0).to(device)
-            policy, value = self.forward(x)
-            policy = F.softmax(policy, dim=1)
-            policy = policy.cpu().numpy()[0]
-            value = value.cpu().numpy()[0, 0]
-        return policy, value
+        with torch.inference_mode():
+            x = self._stage_input(board_tensors, device)
+            with inference_autocast(device):
+                policy, value = self._inference_forward(x)
+            policy = F.softmax(policy.float(), dim=1)
+            value = value.float()[:, 0]
+            policies = self._fetch_output(policy)
+            values = self._fetch_output(value)
+        return policies, values
+    
+    def predict_legal(self, board_tensor: np.ndarray, legal_indices: np.ndarray,
+                      device: str = 'cpu') -> Tuple[np.ndarray, float]:
+        """
+        Predict priors over the legal moves and value for a single board position.
+        
+        Args:
+            board_tensor: numpy array of shape (18, 8, 8)
+            legal_indices: Policy indices of the legal moves
+            device: device to run inference on
+            
+        Returns:
+            priors: numpy array with one probability per legal move
+            value: float value
+        """
+        priors, values = self.predict_legal_batch(board_tensor[np.newaxis], [legal_indices], device)
+        return priors[0], float(values[0])
+    
+    def predict_legal_batch(self, board_tensors: np.ndarray, legal_indices: Sequence[np.ndarray],
+                            device: str = 'cpu') -> Tuple[List[np.ndarray], np.ndarray]:
+        """
+        Predict priors over the legal moves and values for a batch of positions.
+        
+        The softmax runs over the legal logits only, and only those
+        probabilities are copied back from the device rather than the dense
+        NUM_MOVES-entry policies.
+        
+        Args:
+            board_tensors: numpy array of shape (batch_size, 18, 8, 8)
+            legal_indices: One array of legal move policy indices per position
+            device: device to run inference on
+            
+        Returns:
+            priors: List of arrays, each aligned with its legal_indices entry
+            values: numpy array of shape (batch_size,)
+        """
+        counts = [len(idxs) for idxs in legal_indices]
+        width = max(16, -(-max(counts) // 16) * 16)  # Round up to bound the output buffer shapes
+        index = np.zeros((len(counts), width), dtype=np.int64)
+        mask = np.zeros((len(counts), width), dtype=bool)
+        for row, idxs in enumerate(legal_indices):
+            index[row, :len(idxs)] = idxs
+            mask[row, :len(idxs)] = True
+        
+        self.eval()
+        with torch.inference_mode():
+            x = self._stage_input(board_tensors, device)
+            with inference_autocast(device):
+                policy, value = self._inference_forward(x)
+            index_t = torch.from_numpy(index).to(policy.device, non_blocking=True)
+            mask_t = torch.from_numpy(mask).to(policy.device, non_blocking=True)
+            logits = policy.float().gather(1, index_t).masked_fill_(~mask_t, float('-inf'))
+            priors = self._fetch_output(F.softmax(logits, dim=1))
+            values = self._fetch_output(value.float()[:, 0])
+        return [priors[row, :n] for row, n in enumerate(counts)], values
 
+
+def load_model(checkpoint_path: str = None, device: str = 'cpu') -> Tuple[ChessNet, bool]:
+    """
+    Create a ChessNet for inference, with weights from a checkpoint if it exists.
+    
+    The checkpoint is read on a background thread while the network is built
+    and, on CUDA, the device is initialized, so disk I/O overlaps with driver
+    start-up. The weights are adopted without another host copy before the
+    move to the device.
+    
+    Args:
+        checkpoint_path: Path to a checkpoint written by save_checkpoint
+        device: Device to put the model on
+        
+    Returns:
+        model: ChessNet in eval mode on device
+        loaded: Whether the checkpoint weights were loaded
+    """
+    exists = bool(checkpoint_path) and os.path.exists(checkpoint_path)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        future = executor.submit(read_checkpoint, checkpoint_path) if exists else None
+        model = ChessNet()
+        if torch.device(device).type == 'cuda':
+            torch.cuda.init()
+        
+        if future is not None:
+            state_dict = future.result()['model_state_dict']
+            if MMAP_CHECKPOINTS:
+                model.load_state_dict(state_dict, assign=True)
+            else:
+                model.load_state_dict(state_dict)
+    
+    model = model.to(device, non_blocking=True)
+    return model.eval(), exists
+
+
+def load_play_model(checkpoint_path: str = None, device: str = 'cpu') -> Tuple[nn.Module, bool]:
+    """
+    Load the model that plays against people, in int8 on CPU if configured.
+    
+    A checkpoint that cannot be read is replaced by an untrained model, so a
+    game can still start.
+    
+    Args:
+        checkpoint_path: Path to a checkpoint written by save_checkpoint
+        device: Device to put the model on
+        
+    Returns:
+        model: ChessNet in eval mode on device, or its int8 version
+        quantized: Whether the model was quantized
+    """
+    try:
+        model, loaded = load_model(checkpoint_path, device)
+        if loaded:
+            print(f"Loaded model from {checkpoint_path}")
+    except Exception:
+        print("Warning: Could not load checkpoint. Using untrained model.")
+        model = ChessNet().to(device).eval()
+    
+    # int8 convolutions and linear layers are several times faster on CPU
+    if device == 'cpu' and config.GAME_CONFIG['quantize_cpu_play']:
+        # Imported here because engine.self_play imports this module
+        from engine.self_play import calibration_boards
+        try:
+            return model.quantize(calibration_boards(config.SELF_PLAY_CONFIG['calibration_size'])), True
+        except Exception as e:
+            print(f"Warning: int8 quantization failed ({e}). Using float32 model.")
+    return model, False
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    """Softmax over the last axis of a numpy array."""
+    exp = np.exp(logits - logits.max(axis=-1, keepdims=True))
+    return exp / exp.sum(axis=-1, keepdims=True)
+
+
+class OnnxChessNet:
+    """
+    ChessNet inference through ONNX Runtime.
+    
+    Wraps an InferenceSession over a file written by ChessNet.export_onnx and
+    provides the same predict methods, so it can stand in for the model in
+    MCTS. It cannot be trained.
+    """
+    
+    def __init__(self, path: str, device: str = 'cpu'):
+        """
+        Load an exported model.
+        
+        Args:
+            path: ONNX file written by ChessNet.export_onnx
+            device: 'cuda' to prefer the CUDA execution provider
+        """
+        providers = ['CPUExecutionProvider']
+        if 'cuda' in str(device):
+            providers.insert(0, 'CUDAExecutionProvider')
+        self.session = ort.InferenceSession(path, providers=providers)
+        self.input_name = self.session.get_inputs()[0].name
+    
+    def _run(self, board_tensors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Run the session, returning policy logits and values of shape (batch_size,)."""
+        inputs = to_network_input(torch.from_numpy(np.ascontiguousarray(board_tensors))).numpy()
+        logits, values = self.session.run(None, {self.input_name: inputs})
+        return logits, values[:, 0]
+    
+    def predict(self, board_tensor: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, float]:
+        """Predict policy (NUM_MOVES,) and value for a single board position."""
+        policies, values = self.predict_batch(board_tensor[np.newaxis], device)
+        return policies[0], float(values[0])
+    
+    def predict_batch(self, board_tensors: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, np.ndarray]:
+        """Predict policies (batch_size, NUM_MOVES) and values (batch_size,) for a batch of positions."""
+        logits, values = self._run(board_tensors)
+        return _softmax(logits), values
+    
+    def predict_legal(self, board_tensor: np.ndarray, legal_indices: np.ndarray,
+                      device: str = 'cpu') -> Tuple[np.ndarray, float]:
+        """Predict priors over the legal moves and value for a single board position."""
+        priors, values = self.predict_legal_batch(board_tensor[np.newaxis], [legal_indices], device)
+        return priors[0], float(values[0])
+    
+    def predict_legal_batch(self, board_tensors: np.ndarray, legal_indices: Sequence[np.ndarray],
+                            device: str = 'cpu') -> Tuple[List[np.ndarray], np.ndarray]:
+        """Predict priors over the legal moves and values for a batch of positions."""
+        logits, values = self._run(board_tensors)
+        priors = [_softmax(row[idxs]) for row, idxs in zip(logits, legal_indices)]
+        return priors, values
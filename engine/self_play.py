@@ -3,17 +3,136 @@ Self-play system for generating training data
 """
 
 import os
-import pickle
+import queue
 import numpy as np
+import torch
+import torch.multiprocessing as mp
+from numpy.lib.format import open_memmap
 from tqdm import tqdm
-from typing import List, Tuple
+from typing import Iterator, List, Sequence, Tuple
 import chess
 from engine.game import ChessGame
 from engine.mcts import MCTS
-from engine.utils import board_to_tensor, move_to_index
+from engine.neural_net import ChessNet, OnnxChessNet, ONNXRUNTIME_AVAILABLE
+from engine.utils import NUM_MOVES, board_to_tensor, boards_to_tensor, clear_encoding_caches, move_to_index
 import config
 
 
+# Upper bound on legal moves in a chess position; sparse policies are padded to it
+MAX_POLICY_ENTRIES = 218
+
+
+class _RemoteModel:
+    """
+    Stand-in for ChessNet inside self-play worker processes.
+    
+    Board tensors are written into shared-memory buffers and evaluated by the
+    parent process, which batches the pending requests of all workers into
+    one forward pass and writes the results back into the same buffers.
+    """
+    
+    def __init__(self, worker_id: int, buffers: Tuple[torch.Tensor, torch.Tensor, torch.Tensor],
+                 request_queue, response_queue):
+        """
+        Initialize the remote model handle.
+        
+        Args:
+            worker_id: Index of the worker owning the buffers
+            buffers: Shared (inputs, policies, values) tensors
+            request_queue: Queue shared by all workers for inference requests
+            response_queue: Queue on which the parent signals completed requests
+        """
+        self.worker_id = worker_id
+        self.inputs, self.policies, self.values = buffers
+        self.request_queue = request_queue
+        self.response_queue = response_queue
+    
+    def predict_batch(self, board_tensors: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, np.ndarray]:
+        """Evaluate a batch of positions in the parent process."""
+        n = len(board_tensors)
+        self.inputs[:n] = torch.from_numpy(np.asarray(board_tensors, dtype=np.uint8))
+        self.request_queue.put((self.worker_id, n))
+        self.response_queue.get()
+        return self.policies[:n].numpy().copy(), self.values[:n].numpy().copy()
+    
+    def predict(self, board_tensor: np.ndarray, device: str = 'cpu') -> Tuple[np.ndarray, float]:
+        """Evaluate a single position in the parent process."""
+        policies, values = self.predict_batch(board_tensor[np.newaxis], device)
+        return policies[0], float(values[0])
+    
+    def predict_legal_batch(self, board_tensors: np.ndarray, legal_indices: Sequence[np.ndarray],
+                            device: str = 'cpu') -> Tuple[List[np.ndarray], np.ndarray]:
+        """Evaluate a batch of positions, returning priors over the legal moves only."""
+        policies, values = self.predict_batch(board_tensors, device)
+        priors = []
+        for policy, idxs in zip(policies, legal_indices):
+            legal = policy[idxs]
+            total = legal.sum()
+            priors.append(legal / total if total > 0 else np.full(len(idxs), 1.0 / max(len(idxs), 1)))
+        return priors, values
+    
+    def predict_legal(self, board_tensor: np.ndarray, legal_indices: np.ndarray,
+                      device: str = 'cpu') -> Tuple[np.ndarray, float]:
+        """Evaluate a single position, returning priors over the legal moves only."""
+        priors, values = self.predict_legal_batch(board_tensor[np.newaxis], [legal_indices], device)
+        return priors[0], float(values[0])
+
+
+def calibration_boards(num_positions: int) -> np.ndarray:
+    """
+    Collect positions for calibrating a quantized model.
+    
+    Uses the most recently saved self-play boards when available, and
+    positions from random playouts otherwise.
+    
+    Args:
+        num_positions: Number of positions to collect
+        
+    Returns:
+        numpy array of shape (num_positions, 18, 8, 8)
+    """
+    latest = None
+    data_dir = config.PATHS['game_data_dir']
+    if os.path.isdir(data_dir):
+        # One directory pass, newest file by mtime, no sort
+        with os.scandir(data_dir) as entries:
+            latest = max(
+                (entry for entry in entries
+                 if entry.name.startswith('self_play_data_') and entry.name.endswith('_boards.npy')),
+                key=lambda entry: entry.stat().st_mtime,
+                default=None
+            )
+    if latest is not None:
+        boards = np.load(latest.path, mmap_mode='r')
+        if len(boards) > 0:
+            rows = np.random.choice(len(boards), size=min(num_positions, len(boards)), replace=False)
+            return boards[np.sort(rows)]
+    
+    positions = []
+    while len(positions) < num_positions:
+        board = chess.Board()
+        while not board.is_game_over() and len(positions) < num_positions:
+            positions.append(board.copy(stack=False))
+            board.push(list(board.legal_moves)[np.random.randint(board.legal_moves.count())])
+    return boards_to_tensor(positions)
+
+
+def _self_play_worker(worker_id: int, num_games: int, seed: int, buffers, request_queue,
+                      response_queue, result_queue):
+    """
+    Entry point of a self-play worker process.
+    
+    Plays num_games games against itself with a _RemoteModel and puts each
+    game's data on result_queue, followed by None when done.
+    """
+    np.random.seed(seed)
+    model = _RemoteModel(worker_id, buffers, request_queue, response_queue)
+    self_play = SelfPlay(model)
+    for _ in range(num_games):
+        result_queue.put(self_play.play_game())
+    result_queue.put(None)
+
+
 class SelfPlay:
     """Manages self-play games for training data generation."""
     
@@ -27,7 +146,46 @@ class SelfPlay:
         """
         self.model = model
         self.device = device
-        self.mcts = MCTS(model, device=device)
+        
+        self.inference_model = self._build_inference_model(model, device)
+        self.mcts = MCTS(self.inference_model, device=device)
+    
+    def _build_inference_model(self, model, device: str):
+        """
+        Pick the fastest available inference backend for the search.
+        
+        The network used by MCTS is exported to ONNX Runtime when it is
+        installed, quantized to int8 on CPU, or otherwise has its BatchNorm
+        layers folded into the convolutions. The float32 model passed in is
+        kept unchanged for training.
+        
+        Args:
+            model: Neural network model
+            device: Device to run model on
+            
+        Returns:
+            Object providing the model's predict methods
+        """
+        if not isinstance(model, ChessNet):
+            return model
+        
+        if config.SELF_PLAY_CONFIG['onnx_inference'] and ONNXRUNTIME_AVAILABLE:
+            try:
+                checkpoint_dir = config.PATHS['checkpoint_dir']
+                os.makedirs(checkpoint_dir, exist_ok=True)
+                path = os.path.join(checkpoint_dir, f"{config.PATHS['model_name']}.onnx")
+                return OnnxChessNet(model.export_onnx(path, device), device)
+            except Exception as e:
+                print(f"Warning: ONNX Runtime inference unavailable ({e}).")
+        
+        if torch.device(device).type == 'cpu' and config.SELF_PLAY_CONFIG['quantize_inference']:
+            try:
+                calibration = calibration_boards(config.SELF_PLAY_CONFIG['calibration_size'])
+                return model.quantize(calibration)
+            except Exception as e:
+                print(f"Warning: int8 quantization failed ({e}). Using float32 inference.")
+        
+        return model.fuse()
     
     def play_game(self, max_moves: int = None) -> List[Tuple]:
         """
@@ -37,23 +195,27 @@ class SelfPlay:
             max_moves: Maximum number of moves before draw
             
         Returns:
-            List of (board_state, policy, result) tuples
+            List of (board_state, policy_indices, policy_probs, result) tuples,
+            where the policy is stored sparsely as its nonzero entries
         """
         max_moves = max_moves or config.SELF_PLAY_CONFIG['max_moves']
         game = ChessGame()
         game_data = []
         
         move_count = 0
+        move = None
         while not game.is_game_over() and move_count < max_moves:
-            # Get MCTS policy
-            move, policy = self.mcts.search(game)
+            # Get MCTS policy, reusing the subtree of the move just played
+            move, policy = self.mcts.search(game, last_move=move)
             
             if move is None:
                 break
             
-            # Store game state and policy
+            # Store game state and the nonzero entries of the policy
             board_tensor = board_to_tensor(game.get_board())
-            game_data.append((board_tensor.copy(), policy.copy()))
+            nonzero = np.nonzero(policy)[0]
+            game_data.append((board_tensor.copy(), nonzero.astype(np.int16),
+                              policy[nonzero].astype(np.float16)))
             
             # Make move
             game.make_move(move)
@@ -67,46 +229,185 @@ class SelfPlay:
         # Assign result to all positions (from perspective of player who made the move)
         # We need to flip the result for positions where it was black's turn
         final_data = []
-        for i, (board_state, policy) in enumerate(game_data):
+        for i, (board_state, policy_indices, policy_probs) in enumerate(game_data):
             # Determine if this was white's or black's move
             # Even indices (0, 2, 4...) are white, odd are black
             is_white_move = (i % 2 == 0)
             position_result = result if is_white_move else -result
-            final_data.append((board_state, policy, position_result))
+            final_data.append((board_state, policy_indices, policy_probs, position_result))
         
         return final_data
     
-    def generate_games(self, num_games: int = None, save: bool = None) -> List[Tuple]:
+    def _play_games_parallel(self, num_games: int, num_workers: int) -> Iterator[List[Tuple]]:
+        """
+        Play games in worker processes while serving their network evaluations.
+        
+        This process acts as the inference server: it collects the pending
+        requests of all workers, runs them through the model as one batch,
+        and routes the results back through shared-memory buffers.
+        
+        Args:
+            num_games: Total number of games to play
+            num_workers: Number of worker processes
+            
+        Yields:
+            Game data lists as returned by play_game, in completion order
+        """
+        ctx = mp.get_context('spawn')
+        batch_size = config.MCTS_CONFIG['batch_size']
+        request_queue = ctx.Queue()
+        result_queue = ctx.Queue()
+        response_queues = [ctx.Queue() for _ in range(num_workers)]
+        buffers = [
+            (torch.zeros(batch_size, 18, 8, 8, dtype=torch.uint8).share_memory_(),
+             torch.zeros(batch_size, NUM_MOVES).share_memory_(),
+             torch.zeros(batch_size).share_memory_())
+            for _ in range(num_workers)
+        ]
+        
+        workers = []
+        seeds = np.random.randint(0, 2 ** 31, size=num_workers)
+        for worker_id in range(num_workers):
+            worker_games = num_games // num_workers + (1 if worker_id < num_games % num_workers else 0)
+            if worker_games == 0:
+                continue
+            worker = ctx.Process(
+                target=_self_play_worker,
+                args=(worker_id, worker_games, int(seeds[worker_id]), buffers[worker_id],
+                      request_queue, response_queues[worker_id], result_queue),
+                daemon=True
+            )
+            worker.start()
+            workers.append(worker)
+        
+        active = len(workers)
+        try:
+            while active > 0:
+                # Hand over finished games
+                while True:
+                    try:
+                        game_data = result_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if game_data is None:
+                        active -= 1
+                    else:
+                        yield game_data
+                
+                # Gather every pending inference request into one batch
+                try:
+                    pending = [request_queue.get(timeout=0.01)]
+                except queue.Empty:
+                    # A worker killed or failing with an exception never
+                    # sends its None, so waiting for it would never end
+                    for worker in workers:
+                        if worker.exitcode not in (None, 0):
+                            raise RuntimeError(f"Self-play worker {worker.name} died "
+                                               f"with exit code {worker.exitcode}")
+                    continue
+                while True:
+                    try:
+                        pending.append(request_queue.get_nowait())
+                    except queue.Empty:
+                        break
+                
+                board_tensors = torch.cat([buffers[w][0][:n] for w, n in pending]).numpy()
+                policies, values = self.inference_model.predict_batch(board_tensors, self.device)
+                
+                offset = 0
+                for w, n in pending:
+                    buffers[w][1][:n] = torch.from_numpy(policies[offset:offset + n])
+                    buffers[w][2][:n] = torch.from_numpy(values[offset:offset + n])
+                    offset += n
+                    response_queues[w].put(None)
+        finally:
+            for worker in workers:
+                worker.join(timeout=5)
+                if worker.is_alive():
+                    worker.terminate()
+    
+    def generate_games(self, num_games: int = None, save: bool = None) -> Tuple[np.ndarray, ...]:
         """
         Generate multiple self-play games.
         
+        Positions are written into preallocated arrays as each game finishes,
+        so memory use stays flat regardless of the number of games. When
+        saving, the arrays are memory-mapped .npy files in the game data
+        directory.
+        
         Args:
             num_games: Number of games to generate
             save: Whether to save games to disk
             
         Returns:
-            List of all game data tuples
+            Tuple of (boards, policy_indices, policy_probs, values) arrays with
+            one row per position. Policies are sparse: each row holds up to
+            MAX_POLICY_ENTRIES (index, probability) pairs, zero-padded.
         """
         num_games = num_games or config.SELF_PLAY_CONFIG['num_games']
         save = save if save is not None else config.SELF_PLAY_CONFIG['save_games']
+        max_positions = num_games * config.SELF_PLAY_CONFIG['max_moves']
         
-        all_data = []
+        shapes = {
+            'boards': ((max_positions, 18, 8, 8), np.uint8),
+            'policy_indices': ((max_positions, MAX_POLICY_ENTRIES), np.int16),
+            'policy_probs': ((max_positions, MAX_POLICY_ENTRIES), np.float16),
+            'values': ((max_positions,), np.float32),
+        }
+        if save:
+            data_dir = config.PATHS['game_data_dir']
+            os.makedirs(data_dir, exist_ok=True)
+            scratch_paths = {
+                name: os.path.join(data_dir, f'.self_play_partial_{os.getpid()}_{name}.npy')
+                for name in shapes
+            }
+            arrays = {
+                name: open_memmap(scratch_paths[name], mode='w+', dtype=dtype, shape=shape)
+                for name, (shape, dtype) in shapes.items()
+            }
+        else:
+            arrays = {name: np.empty(shape, dtype=dtype) for name, (shape, dtype) in shapes.items()}
+        
+        num_workers = config.SELF_PLAY_CONFIG['num_workers']
+        if num_workers > 0:
+            games = self._play_games_parallel(num_games, num_workers)
+        else:
+            games = (self.play_game() for _ in range(num_games))
+        
+        # Positions cached for the previous network's iteration are not reused
+        clear_encoding_caches()
         
+        num_positions = 0
         print(f"Generating {num_games} self-play games...")
-        for game_idx in tqdm(range(num_games), desc="Self-play games"):
-            game_data = self.play_game()
-            all_data.extend(game_data)
+        for game_data in tqdm(games, total=num_games, desc="Self-play games"):
+            if not game_data:
+                continue
+            
+            # Write this game's positions straight into the output slices
+            end = num_positions + len(game_data)
+            board_states, policy_indices, policy_probs, results = zip(*game_data)
+            arrays['boards'][num_positions:end] = np.stack(board_states)
+            arrays['policy_indices'][num_positions:end] = 0
+            arrays['policy_probs'][num_positions:end] = 0
+            for row, (indices, probs) in enumerate(zip(policy_indices, policy_probs), start=num_positions):
+                arrays['policy_indices'][row, :len(indices)] = indices
+                arrays['policy_probs'][row, :len(probs)] = probs
+            arrays['values'][num_positions:end] = results
+            num_positions = end
         
         # Save to disk if requested
         if save:
-            os.makedirs(config.PATHS['game_data_dir'], exist_ok=True)
-            filename = os.path.join(
-                config.PATHS['game_data_dir'],
-                f'self_play_data_{len(all_data)}_positions.pkl'
-            )
-            with open(filename, 'wb') as f:
-                pickle.dump(all_data, f)
-            print(f"Saved {len(all_data)} positions to {filename}")
+            results = []
+            for name in shapes:
+                filename = os.path.join(
+                    data_dir,
+                    f'self_play_data_{num_positions}_positions_{name}.npy'
+                )
+                np.save(filename, arrays[name][:num_positions])
+                del arrays[name]  # Unmaps the scratch file
+                os.remove(scratch_paths[name])
+                results.append(np.load(filename, mmap_mode='c'))
+            print(f"Saved {num_positions} positions to {data_dir}")
+            return tuple(results)
         
-        return all_data
-
+        return tuple(arrays[name][:num_positions] for name in shapes)
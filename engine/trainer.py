@@ -7,10 +7,10 @@ import torch
 import torch.nn as nn
 import torch.optim as optim
 import numpy as np
-from typing import List, Tuple
+from typing import List, Tuple, Union
 from tqdm import tqdm
-from engine.neural_net import ChessNet
-from engine.utils import save_checkpoint, load_checkpoint
+from engine.neural_net import ChessNet, to_network_input
+from engine.utils import NUM_MOVES, save_checkpoint, load_checkpoint
 import config
 
 
@@ -32,6 +32,14 @@ class Trainer:
         else:
             self.model = model.to(device)
         
+        # The input shape is fixed at (B, 18, 8, 8): let cuDNN benchmark its
+        # algorithms once, and use NHWC kernels on tensor-core GPUs
+        self.memory_format = torch.preserve_format
+        if torch.device(device).type == 'cuda':
+            torch.backends.cudnn.benchmark = True
+            self.memory_format = torch.channels_last
+            self.model = self.model.to(memory_format=self.memory_format)
+        
         self.optimizer = optim.Adam(
             self.model.parameters(),
             lr=config.TRAINING_CONFIG['learning_rate'],
@@ -40,12 +48,15 @@ class Trainer:
         
         self.iteration = 0
     
-    def train_on_data(self, training_data: List[Tuple], num_epochs: int = None) -> dict:
+    def train_on_data(self, training_data: Union[Tuple[np.ndarray, ...], List[Tuple]], num_epochs: int = None) -> dict:
         """
         Train model on self-play data.
         
         Args:
-            training_data: List of (board_state, policy, value) tuples
+            training_data: Tuple of (boards, policy_indices, policy_probs, values)
+                arrays as returned by SelfPlay.generate_games (possibly
+                memory-mapped), or a list of (board_state, policy, value) tuples
+                with dense policies
             num_epochs: Number of training epochs
             
         Returns:
@@ -54,13 +65,29 @@ class Trainer:
         num_epochs = num_epochs or config.TRAINING_CONFIG['num_epochs']
         batch_size = config.TRAINING_CONFIG['batch_size']
         
-        # Convert to tensors
-        boards = torch.FloatTensor([data[0] for data in training_data]).to(self.device)
-        policies = torch.FloatTensor([data[1] for data in training_data]).to(self.device)
-        values = torch.FloatTensor([data[2] for data in training_data]).to(self.device).unsqueeze(1)
+        if not isinstance(training_data, tuple):
+            # Stack the list once into contiguous arrays
+            training_data = (
+                np.stack([data[0] for data in training_data]),
+                np.stack([data[1] for data in training_data]).astype(np.float32, copy=False),
+                np.array([data[2] for data in training_data], dtype=np.float32),
+            )
         
-        dataset = torch.utils.data.TensorDataset(boards, policies, values)
-        dataloader = torch.utils.data.DataLoader(dataset, batch_size=batch_size, shuffle=True)
+        # Wrap the stacked arrays without copying; batches are moved to the device below
+        tensors = [torch.from_numpy(array) for array in training_data]
+        tensors[-1] = tensors[-1].unsqueeze(1)
+        
+        dataset = torch.utils.data.TensorDataset(*tensors)
+        num_workers = config.TRAINING_CONFIG['num_workers']
+        pin_memory = torch.device(self.device).type == 'cuda'
+        dataloader = torch.utils.data.DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=True,
+            num_workers=num_workers,
+            pin_memory=pin_memory,
+            persistent_workers=num_workers > 0
+        )
         
         self.model.train()
         total_loss = 0.0
@@ -72,9 +99,22 @@ class Trainer:
             epoch_value_loss = 0.0
             epoch_policy_loss = 0.0
             
-            for batch_boards, batch_policies, batch_values in tqdm(
+            for batch in tqdm(
                 dataloader, desc=f"Epoch {epoch+1}/{num_epochs}", leave=False
             ):
+                batch_boards = to_network_input(batch[0].to(self.device, non_blocking=pin_memory),
+                                                memory_format=self.memory_format)
+                batch_values = batch[-1].to(self.device, non_blocking=pin_memory).float()
+                if len(batch) == 4:
+                    # Sparse (index, probability) policies: scatter back to dense on the device
+                    batch_indices = batch[1].to(self.device, non_blocking=pin_memory).long()
+                    batch_probs = batch[2].to(self.device, non_blocking=pin_memory).float()
+                    batch_policies = torch.zeros(
+                        len(batch_boards), NUM_MOVES, device=self.device
+                    ).scatter_add_(1, batch_indices, batch_probs)
+                else:
+                    batch_policies = batch[1].to(self.device, non_blocking=pin_memory).float()
+                
                 self.optimizer.zero_grad()
                 
                 # Forward pass
@@ -139,7 +179,7 @@ class Trainer:
         """Get the trained model."""
         return self.model
     
-    def train_iteration(self, training_data: List[Tuple]) -> dict:
+    def train_iteration(self, training_data: Union[Tuple[np.ndarray, ...], List[Tuple]]) -> dict:
         """
         Perform one training iteration.
         
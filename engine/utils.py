@@ -2,12 +2,95 @@
 Utility functions for NeuroChess
 """
 
+import os
+import threading
+from collections import OrderedDict
 import chess
 import numpy as np
 import torch
+from engine.kernels import encode_planes, encode_planes_batch
+import config
 
 
-def board_to_tensor(board: chess.Board) -> np.ndarray:
+# Piece order of the piece planes, white planes 0-5 and black planes 6-11
+_PIECE_TYPES = (chess.PAWN, chess.ROOK, chess.KNIGHT, chess.BISHOP, chess.QUEEN, chess.KING)
+
+# Plane 17 stores min(fullmove_number, 100); this scales it to [0, 1]
+MOVE_COUNT_SCALE = 0.01
+
+
+class _PositionCache:
+    """
+    Least-recently-used cache of read-only arrays keyed by position.
+    
+    Locked, since the searches of the web server encode boards from
+    several threads at once.
+    """
+    
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key):
+        """Return the cached array for key, or None."""
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+    
+    def put(self, key, value: np.ndarray) -> np.ndarray:
+        """Store value (made read-only) under key, evicting the oldest entry if full."""
+        value.setflags(write=False)
+        with self._lock:
+            self._entries[key] = value
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+    
+    def clear(self):
+        """Drop all entries."""
+        with self._lock:
+            self._entries.clear()
+
+
+_tensor_cache = _PositionCache(config.GAME_CONFIG['encoding_cache_size'])
+
+
+# (color, piece type) of the 12 piece planes, in plane order
+_PIECE_PLANES = [
+    (color, piece_type)
+    for color in (chess.WHITE, chess.BLACK)
+    for piece_type in _PIECE_TYPES
+]
+
+
+def _piece_bitboards(board: chess.Board) -> list:
+    """Occupancy bitboards of the 12 piece planes, in plane order."""
+    return [board.pieces_mask(piece_type, color) for color, piece_type in _PIECE_PLANES]
+
+
+def _aux_values(board: chess.Board) -> list:
+    """Values of the constant planes 12-17: castling rights, side to move, move count."""
+    # Castling rights as a bitmask of the rooks' home squares
+    castling = board.clean_castling_rights()
+    return [
+        castling & chess.BB_H1 != 0,  # White kingside
+        castling & chess.BB_A1 != 0,  # White queenside
+        castling & chess.BB_H8 != 0,  # Black kingside
+        castling & chess.BB_A8 != 0,  # Black queenside
+        board.turn,                   # chess.WHITE is True
+        min(board.fullmove_number, 100),
+    ]
+
+
+def clear_encoding_caches():
+    """Empty the board_to_tensor cache."""
+    _tensor_cache.clear()
+
+
+def board_to_tensor(board: chess.Board, out: np.ndarray = None) -> np.ndarray:
     """
     Convert a chess board to a tensor representation.
     
@@ -16,68 +99,134 @@ def board_to_tensor(board: chess.Board) -> np.ndarray:
     - 6 planes for black pieces (pawn, rook, knight, bishop, queen, king)
     - 4 planes for castling rights (white kingside, white queenside, black kingside, black queenside)
     - 1 plane for side to move (1 if white, 0 if black)
-    - 1 plane for move count (normalized)
+    - 1 plane for move count (0-100, scaled by MOVE_COUNT_SCALE in the network input)
+    
+    Planes are uint8 to keep stored and transferred positions small; they
+    become float32 in to_network_input, on the device.
+    
+    Without out, results are cached by position and returned read-only;
+    copy before modifying.
     
     Args:
         board: python-chess Board object
-        
+        out: Optional caller-owned uint8 buffer of shape (18, 8, 8) to fill;
+            every plane is overwritten, so it needs no clearing
+            
     Returns:
-        numpy array of shape (18, 8, 8)
+        uint8 numpy array of shape (18, 8, 8) (out, when given)
     """
-    planes = np.zeros((18, 8, 8), dtype=np.float32)
-    
-    # Piece planes (0-11)
-    piece_types = [
-        chess.PAWN, chess.ROOK, chess.KNIGHT,
-        chess.BISHOP, chess.QUEEN, chess.KING
-    ]
+    # The move count plane is not part of the transposition key
+    key = (board._transposition_key(), board.fullmove_number)
+    planes = _tensor_cache.get(key)
+    if planes is not None:
+        if out is None:
+            return planes
+        np.copyto(out, planes)
+        return out
     
-    for i, piece_type in enumerate(piece_types):
-        # White pieces (planes 0-5)
-        for square in board.pieces(piece_type, chess.WHITE):
-            row, col = divmod(square, 8)
-            planes[i, row, col] = 1.0
-        
-        # Black pieces (planes 6-11)
-        for square in board.pieces(piece_type, chess.BLACK):
-            row, col = divmod(square, 8)
-            planes[i + 6, row, col] = 1.0
+    bitboards = np.array(_piece_bitboards(board), dtype=np.uint64)
+    aux = np.array(_aux_values(board), dtype=np.uint8)
+    if out is not None:
+        return encode_planes(bitboards, aux, out)
+    planes = encode_planes(bitboards, aux, np.empty((18, 8, 8), dtype=np.uint8))
+    return _tensor_cache.put(key, planes)
+
+
+def boards_to_tensor(boards, out: np.ndarray = None) -> np.ndarray:
+    """
+    Convert several chess boards to tensors in one pass.
     
-    # Castling rights (planes 12-15)
-    if board.has_kingside_castling_rights(chess.WHITE):
-        planes[12, :, :] = 1.0
-    if board.has_queenside_castling_rights(chess.WHITE):
-        planes[13, :, :] = 1.0
-    if board.has_kingside_castling_rights(chess.BLACK):
-        planes[14, :, :] = 1.0
-    if board.has_queenside_castling_rights(chess.BLACK):
-        planes[15, :, :] = 1.0
+    Produces the same planes as board_to_tensor, encoding all positions in
+    one kernel call (parallel over positions with Numba, one unpackbits
+    call otherwise).
     
-    # Side to move (plane 16)
-    if board.turn == chess.WHITE:
-        planes[16, :, :] = 1.0
+    Args:
+        boards: Sequence of python-chess Board objects
+        out: Optional caller-owned uint8 buffer of shape (len(boards), 18, 8, 8)
+            to fill, e.g. a slice of a reusable batch slab
+            
+    Returns:
+        uint8 numpy array of shape (len(boards), 18, 8, 8) (out, when given)
+    """
+    n = len(boards)
+    # Structure of arrays: one column of bitboards per piece plane, gathered
+    # straight into a uint64 array without per-board Python lists
+    bitboards = np.empty((n, 12), dtype=np.uint64)
+    for plane, (color, piece_type) in enumerate(_PIECE_PLANES):
+        bitboards[:, plane] = np.fromiter(
+            (board.pieces_mask(piece_type, color) for board in boards), dtype=np.uint64, count=n
+        )
+    aux = np.array([_aux_values(board) for board in boards], dtype=np.uint8).reshape(n, 6)
     
-    # Move count (plane 17) - normalized
-    planes[17, :, :] = min(board.fullmove_number / 100.0, 1.0)
+    planes = np.empty((n, 18, 8, 8), dtype=np.uint8) if out is None else out
+    return encode_planes_batch(bitboards, aux, planes)
+
+
+# AlphaZero-style policy encoding: every queen-line and knight move from
+# every square, plus white underpromotions. Queen promotions share the plain
+# move's slot and black moves reuse the slot of their mirrored white move.
+_UNDERPROMOTIONS = (chess.KNIGHT, chess.BISHOP, chess.ROOK)
+
+
+def _build_move_table():
+    moves = []
+    for from_square in range(64):
+        rank, file = chess.square_rank(from_square), chess.square_file(from_square)
+        for to_square in range(64):
+            if to_square == from_square:
+                continue
+            d_rank = chess.square_rank(to_square) - rank
+            d_file = chess.square_file(to_square) - file
+            queen_line = d_rank == 0 or d_file == 0 or abs(d_rank) == abs(d_file)
+            knight = {abs(d_rank), abs(d_file)} == {1, 2}
+            if queen_line or knight:
+                moves.append(chess.Move(from_square, to_square))
+    for from_square in range(chess.A7, chess.H7 + 1):
+        for d_file in (-1, 0, 1):
+            file = chess.square_file(from_square) + d_file
+            if 0 <= file < 8:
+                for promotion in _UNDERPROMOTIONS:
+                    moves.append(chess.Move(from_square, chess.square(file, 7), promotion))
     
-    return planes
+    # Flat lookup keyed by from * 384 + to * 6 + (promotion or 0)
+    table = np.full(64 * 64 * 6, -1, dtype=np.int16)
+    for index, move in enumerate(moves):
+        table[move.from_square * 384 + move.to_square * 6 + (move.promotion or 0)] = index
+        if move.promotion is None and chess.square_rank(move.to_square) == 7:
+            table[move.from_square * 384 + move.to_square * 6 + chess.QUEEN] = index
+        elif move.promotion is not None:
+            from_square = chess.square_mirror(move.from_square)
+            to_square = chess.square_mirror(move.to_square)
+            table[from_square * 384 + to_square * 6 + move.promotion] = index
+    # Black queen promotions on the first rank map to the plain move
+    for from_square in range(chess.A2, chess.H2 + 1):
+        for to_square in range(chess.A1, chess.H1 + 1):
+            plain = table[from_square * 384 + to_square * 6]
+            if plain >= 0:
+                table[from_square * 384 + to_square * 6 + chess.QUEEN] = plain
+    return moves, table
+
+
+_INDEX_MOVES, _MOVE_TABLE = _build_move_table()
+NUM_MOVES = len(_INDEX_MOVES)  # 1858
 
 
-def move_to_index(move: chess.Move, board: chess.Board) -> int:
+def move_to_index(move: chess.Move, board: chess.Board = None) -> int:
     """
-    Convert a chess move to a unique index.
+    Convert a chess move to its policy index.
     
-    Uses a simple encoding: from_square * 64 + to_square
-    This gives 4096 possible moves (some invalid, but we'll mask them).
+    Uses the 1858-entry AlphaZero move table: queen-line and knight moves
+    from every square plus underpromotions. Black underpromotions share the
+    index of the mirrored white move.
     
     Args:
         move: chess.Move object
-        board: chess.Board object (for validation)
+        board: unused, kept for backward compatibility
         
     Returns:
-        integer index
+        integer index in [0, NUM_MOVES)
     """
-    return move.from_square * 64 + move.to_square
+    return int(_MOVE_TABLE[move.from_square * 384 + move.to_square * 6 + (move.promotion or 0)])
 
 
 def index_to_move(index: int, board: chess.Board) -> chess.Move:
@@ -91,22 +240,17 @@ def index_to_move(index: int, board: chess.Board) -> chess.Move:
     Returns:
         chess.Move object or None if invalid
     """
-    from_square = index // 64
-    to_square = index % 64
+    move = _INDEX_MOVES[index]
+    if move.promotion is not None:
+        if board.turn == chess.BLACK:
+            move = chess.Move(chess.square_mirror(move.from_square),
+                              chess.square_mirror(move.to_square), move.promotion)
+    elif (board.piece_type_at(move.from_square) == chess.PAWN
+            and chess.square_rank(move.to_square) in (0, 7)):
+        # The plain slot of a pawn reaching the last rank is the queen promotion
+        move = chess.Move(move.from_square, move.to_square, chess.QUEEN)
     
-    move = chess.Move(from_square, to_square)
-    
-    # Check if move is legal
-    if move in board.legal_moves:
-        return move
-    
-    # Try to find promotion moves
-    for promotion in [chess.QUEEN, chess.ROOK, chess.BISHOP, chess.KNIGHT]:
-        move = chess.Move(from_square, to_square, promotion=promotion)
-        if move in board.legal_moves:
-            return move
-    
-    return None
+    return move if move in board.legal_moves else None
 
 
 def create_move_mask(board: chess.Board) -> np.ndarray:
@@ -117,9 +261,9 @@ def create_move_mask(board: chess.Board) -> np.ndarray:
         board: chess.Board object
         
     Returns:
-        numpy array of shape (4096,) with 1.0 for valid moves, 0.0 otherwise
+        numpy array of shape (NUM_MOVES,) with 1.0 for valid moves, 0.0 otherwise
     """
-    mask = np.zeros(4096, dtype=np.float32)
+    mask = np.zeros(NUM_MOVES, dtype=np.float32)
     
     for move in board.legal_moves:
         idx = move_to_index(move, board)
@@ -156,9 +300,76 @@ def save_checkpoint(model, optimizer, iteration, filepath: str):
     }, filepath)
 
 
+# torch.load gained weights_only=True in 1.13, and mmap=True (and
+# load_state_dict assign=True) in 2.1
+_TORCH_VERSION = tuple(int(part) for part in torch.__version__.split('+')[0].split('.')[:2])
+WEIGHTS_ONLY_CHECKPOINTS = _TORCH_VERSION >= (1, 13)
+MMAP_CHECKPOINTS = _TORCH_VERSION >= (2, 1)
+
+
+def read_checkpoint(filepath: str, map_location='cpu') -> dict:
+    """
+    Read a checkpoint file written by save_checkpoint.
+    
+    On torch 2.1+ the file is memory-mapped, so tensor data is paged in from
+    disk as load_state_dict copies it instead of being read into host memory
+    first; the optimizer state of a model-only load is never read. From
+    torch 1.13 unpickling is restricted to tensors and plain containers.
+    
+    Args:
+        filepath: Path to the checkpoint file
+        map_location: Device to map tensors to
+        
+    Returns:
+        Checkpoint dictionary
+    """
+    if MMAP_CHECKPOINTS:
+        return torch.load(filepath, map_location=map_location, mmap=True, weights_only=True)
+    if WEIGHTS_ONLY_CHECKPOINTS:
+        return torch.load(filepath, map_location=map_location, weights_only=True)
+    return torch.load(filepath, map_location=map_location)
+
+
+def latest_checkpoint(checkpoint_dir: str):
+    """
+    Find the most recently modified .pth file in a directory.
+    
+    Args:
+        checkpoint_dir: Directory to search
+        
+    Returns:
+        Path to the newest checkpoint, or None if there is none
+    """
+    if not os.path.isdir(checkpoint_dir):
+        return None
+    with os.scandir(checkpoint_dir) as entries:
+        newest = max(
+            (entry for entry in entries if entry.name.endswith('.pth') and entry.is_file()),
+            key=lambda entry: entry.stat().st_mtime,
+            default=None
+        )
+    return newest.path if newest is not None else None
+
+
+def checkpoint_key(checkpoint_path):
+    """
+    Identify a checkpoint's contents, for caching the model loaded from it.
+    
+    The mtime makes a checkpoint overwritten under the same name count as new.
+    
+    Args:
+        checkpoint_path: Path to a checkpoint, or None
+        
+    Returns:
+        (checkpoint_path, mtime), the mtime None when there is no checkpoint
+    """
+    mtime = os.path.getmtime(checkpoint_path) if checkpoint_path is not None else None
+    return checkpoint_path, mtime
+
+
 def load_checkpoint(model, optimizer, filepath: str):
     """Load model checkpoint."""
-    checkpoint = torch.load(filepath)
+    checkpoint = read_checkpoint(filepath, map_location=next(model.parameters()).device)
     model.load_state_dict(checkpoint['model_state_dict'])
     optimizer.load_state_dict(checkpoint['optimizer_state_dict'])
     return checkpoint['iteration']
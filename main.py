@@ -5,9 +5,10 @@ Main entry point for NeuroChess
 import argparse
 import os
 import torch
-from engine.neural_net import ChessNet
+from engine.neural_net import ChessNet, load_model
 from engine.trainer import Trainer
 from engine.self_play import SelfPlay
+from engine.utils import latest_checkpoint
 from ui.cli import ChessCLI
 from ui.simple_gui import ChessGUI
 import config
@@ -45,7 +46,7 @@ def train_model(num_iterations: int = 10, resume_from: str = None):
         self_play = SelfPlay(model, device=device)
         training_data = self_play.generate_games()
         
-        print(f"\nGenerated {len(training_data)} training positions")
+        print(f"\nGenerated {len(training_data[0])} training positions")
         
         # Train on self-play data
         stats = trainer.train_iteration(training_data)
@@ -61,29 +62,39 @@ def train_model(num_iterations: int = 10, resume_from: str = None):
     print(f"\nTraining complete! Model saved to {config.PATHS['checkpoint_dir']}")
 
 
-def play_cli(checkpoint_path: str = None, human_plays_white: bool = True):
+def _load_model(checkpoint_path: str, device: str) -> ChessNet:
     """
-    Play against the AI using command-line interface.
+    Load the model to play with, reporting whether a checkpoint was found.
     
     Args:
         checkpoint_path: Path to model checkpoint
-        human_plays_white: Whether human plays as white
+        device: Device to put the model on
+        
+    Returns:
+        ChessNet in eval mode
     """
-    device = 'cuda' if torch.cuda.is_available() else 'cpu'
-    
-    # Load model
-    model = ChessNet().to(device)
-    
-    if checkpoint_path and os.path.exists(checkpoint_path):
-        checkpoint = torch.load(checkpoint_path, map_location=device)
-        model.load_state_dict(checkpoint['model_state_dict'])
+    model, loaded = load_model(checkpoint_path, device)
+    if loaded:
         print(f"Loaded model from {checkpoint_path}")
     else:
         print("Warning: No checkpoint found. Using untrained model.")
         if checkpoint_path:
             print(f"  (Tried to load: {checkpoint_path})")
+    return model
+
+
+def play_cli(checkpoint_path: str = None, human_plays_white: bool = True):
+    """
+    Play against the AI using command-line interface.
     
-    model.eval()
+    Args:
+        checkpoint_path: Path to model checkpoint
+        human_plays_white: Whether human plays as white
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    
+    # Load model
+    model = _load_model(checkpoint_path, device)
     
     # Start CLI
     cli = ChessCLI(model, device=device)
@@ -100,24 +111,21 @@ def play_gui(checkpoint_path: str = None):
     device = 'cuda' if torch.cuda.is_available() else 'cpu'
     
     # Load model
-    model = ChessNet().to(device)
-    
-    if checkpoint_path and os.path.exists(checkpoint_path):
-        checkpoint = torch.load(checkpoint_path, map_location=device)
-        model.load_state_dict(checkpoint['model_state_dict'])
-        print(f"Loaded model from {checkpoint_path}")
-    else:
-        print("Warning: No checkpoint found. Using untrained model.")
-        if checkpoint_path:
-            print(f"  (Tried to load: {checkpoint_path})")
-    
-    model.eval()
+    model = _load_model(checkpoint_path, device)
     
     # Start GUI
     gui = ChessGUI(model, device=device)
     gui.run()
 
 
+def _find_latest_checkpoint():
+    """Find the newest checkpoint in the checkpoint directory, if any."""
+    checkpoint = latest_checkpoint(config.PATHS['checkpoint_dir'])
+    if checkpoint is not None:
+        print(f"Using latest checkpoint: {checkpoint}")
+    return checkpoint
+
+
 def main():
     """Main entry point."""
     parser = argparse.ArgumentParser(description='NeuroChess - AI Chess Engine')
@@ -165,33 +173,21 @@ def main():
         train_model(num_iterations=args.iterations, resume_from=args.resume)
     elif args.mode == 'play':
         # Find latest checkpoint if not specified
-        checkpoint = args.checkpoint
-        if checkpoint is None:
-            checkpoint_dir = config.PATHS['checkpoint_dir']
-            if os.path.exists(checkpoint_dir):
-                checkpoints = [f for f in os.listdir(checkpoint_dir) if f.endswith('.pth')]
-                if checkpoints:
-                    checkpoint = os.path.join(checkpoint_dir, sorted(checkpoints)[-1])
-                    print(f"Using latest checkpoint: {checkpoint}")
+        checkpoint = args.checkpoint or _find_latest_checkpoint()
         
         play_cli(checkpoint_path=checkpoint, human_plays_white=not args.black)
     elif args.mode == 'gui':
         # Find latest checkpoint if not specified
-        checkpoint = args.checkpoint
-        if checkpoint is None:
-            checkpoint_dir = config.PATHS['checkpoint_dir']
-            if os.path.exists(checkpoint_dir):
-                checkpoints = [f for f in os.listdir(checkpoint_dir) if f.endswith('.pth')]
-                if checkpoints:
-                    checkpoint = os.path.join(checkpoint_dir, sorted(checkpoints)[-1])
-                    print(f"Using latest checkpoint: {checkpoint}")
+        checkpoint = args.checkpoint or _find_latest_checkpoint()
         
         play_gui(checkpoint_path=checkpoint)
 
 
 def on_login_success(username):
     """Callback when user successfully logs in."""
-    from ui.game_menu import GameMenu
+    from ui.game_menu import GameMenu, preload_model
+    # Start loading the model before the menu window is built
+    preload_model()
     menu = GameMenu(username)
     menu.run()
 
@@ -4,22 +4,115 @@ Login and registration interface using MySQL with premium design
 """
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, ttk
 import hashlib
-from ui.database import get_database
+import hmac
+import os
+from ui.database import UPDATE_STATS_SQL, get_database
+from ui.background import run_in_background
+from ui.hover import modern_button_style
+from ui.window import run_root, screen_frame, shared_root, ui_font
 from mysql.connector import Error
 
 
+# PBKDF2-HMAC-SHA256 work factor for new password hashes
+PBKDF2_ITERATIONS = 100_000
+
+# Queries run by AuthSystem as prepared statements
+_QUERIES = {
+    'user_id': "SELECT id FROM users WHERE username = %s",
+    'insert_user': "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+    'password_hash': "SELECT password_hash FROM users WHERE username = %s",
+    'set_password_hash': "UPDATE users SET password_hash = %s WHERE username = %s",
+    'user_stats': "SELECT games_played, wins, losses, draws FROM users WHERE username = %s",
+    'update_stats': UPDATE_STATS_SQL,
+}
+
+
 class AuthSystem:
     """Handles user authentication - login and registration using MySQL."""
     
     def __init__(self):
         """Initialize authentication system."""
         self.db = get_database()
+        self._statements = {}               # Query name -> prepared cursor
+        self._statements_connection = None  # Connection the cursors belong to
+    
+    def hash_password(self, password, salt=None, iterations=PBKDF2_ITERATIONS):
+        """
+        Hash password with salted PBKDF2-HMAC-SHA256.
+        
+        Args:
+            password: Plain text password
+            salt: Salt bytes (a random 16-byte salt if None)
+            iterations: PBKDF2 iteration count
+            
+        Returns:
+            String of the form pbkdf2_sha256$iterations$salt$hash (hex encoded)
+        """
+        salt = salt if salt is not None else os.urandom(16)
+        digest = hashlib.pbkdf2_hmac('sha256', password.encode(), salt, iterations)
+        return f"pbkdf2_sha256${iterations}${salt.hex()}${digest.hex()}"
     
-    def hash_password(self, password):
-        """Hash password using SHA256."""
-        return hashlib.sha256(password.encode()).hexdigest()
+    def verify_password(self, password, stored_hash):
+        """
+        Check a password against a stored hash.
+        
+        Accepts hashes from hash_password as well as the unsalted SHA256
+        hex digests stored by earlier versions.
+        
+        Args:
+            password: Plain text password
+            stored_hash: Value of the password_hash column
+            
+        Returns:
+            True if the password matches
+        """
+        if stored_hash.startswith('pbkdf2_sha256$'):
+            _, iterations, salt, _ = stored_hash.split('$')
+            candidate = self.hash_password(password, bytes.fromhex(salt), int(iterations))
+        else:
+            candidate = hashlib.sha256(password.encode()).hexdigest()
+        return hmac.compare_digest(candidate, stored_hash)
+    
+    def _statement(self, name):
+        """
+        Get the connection and prepared-statement cursor for one of _QUERIES.
+        
+        Each query keeps its own prepared cursor, so the server parses it
+        once per connection rather than on every call. The cursors are
+        recreated when the database reconnects.
+        
+        Args:
+            name: Key into _QUERIES
+            
+        Returns:
+            (connection, cursor) tuple
+        """
+        connection = self.db.get_connection()
+        if connection is not self._statements_connection:
+            self._statements = {}
+            self._statements_connection = connection
+        cursor = self._statements.get(name)
+        if cursor is None:
+            cursor = connection.cursor(prepared=True)
+            self._statements[name] = cursor
+        return connection, cursor
+    
+    def _execute(self, name, params):
+        """
+        Execute one of _QUERIES with a prepared statement.
+        
+        Args:
+            name: Key into _QUERIES
+            params: Query parameters
+            
+        Returns:
+            (connection, cursor) tuple
+        """
+        connection, cursor = self._statement(name)
+        cursor.execute(_QUERIES[name], params)
+        return connection, cursor
     
     def register(self, username, password):
         """
@@ -33,23 +126,15 @@ class AuthSystem:
             True if successful, False if username already exists
         """
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
             # Check if username exists
-            cursor.execute("SELECT id FROM users WHERE username = %s", (username,))
-            if cursor.fetchone():
-                cursor.close()
+            _, cursor = self._execute('user_id', (username,))
+            if cursor.fetchall():
                 return False
             
             # Insert new user
             password_hash = self.hash_password(password)
-            cursor.execute(
-                "INSERT INTO users (username, password_hash) VALUES (%s, %s)",
-                (username, password_hash)
-            )
+            connection, _ = self._execute('insert_user', (username, password_hash))
             connection.commit()
-            cursor.close()
             return True
         except Error as e:
             print(f"Error registering user: {e}")
@@ -67,17 +152,21 @@ class AuthSystem:
             True if successful, False if invalid credentials
         """
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
+            _, cursor = self._execute('password_hash', (username,))
+            rows = cursor.fetchall()
+            if not rows:
+                return False
+            stored_hash = rows[0][0]
+            if isinstance(stored_hash, (bytes, bytearray)):
+                stored_hash = stored_hash.decode()
+            if not self.verify_password(password, stored_hash):
+                return False
             
-            password_hash = self.hash_password(password)
-            cursor.execute(
-                "SELECT id FROM users WHERE username = %s AND password_hash = %s",
-                (username, password_hash)
-            )
-            result = cursor.fetchone()
-            cursor.close()
-            return result is not None
+            # Upgrade legacy unsalted hashes now that the password is known
+            if not stored_hash.startswith('pbkdf2_sha256$'):
+                connection, _ = self._execute('set_password_hash', (self.hash_password(password), username))
+                connection.commit()
+            return True
         except Error as e:
             print(f"Error logging in: {e}")
             return False
@@ -85,44 +174,26 @@ class AuthSystem:
     def get_user_stats(self, username):
         """Get user statistics."""
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute(
-                "SELECT games_played, wins, losses, draws FROM users WHERE username = %s",
-                (username,)
-            )
-            result = cursor.fetchone()
-            cursor.close()
-            return result
+            _, cursor = self._execute('user_stats', (username,))
+            rows = cursor.fetchall()
+            if not rows:
+                return None
+            return dict(zip(cursor.column_names, rows[0]))
         except Error as e:
             print(f"Error getting user stats: {e}")
             return None
     
     def update_user_stats(self, username, won=False, lost=False, draw=False):
         """Update user game statistics."""
+        if not (won or lost or draw):
+            return
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor()
-            
-            if won:
-                cursor.execute(
-                    "UPDATE users SET games_played = games_played + 1, wins = wins + 1 WHERE username = %s",
-                    (username,)
-                )
-            elif lost:
-                cursor.execute(
-                    "UPDATE users SET games_played = games_played + 1, losses = losses + 1 WHERE username = %s",
-                    (username,)
-                )
-            elif draw:
-                cursor.execute(
-                    "UPDATE users SET games_played = games_played + 1, draws = draws + 1 WHERE username = %s",
-                    (username,)
-                )
-            
+            # One statement for all outcomes; a win takes precedence, then a loss
+            wins = int(bool(won))
+            losses = int(bool(lost) and not won)
+            draws = int(bool(draw) and not won and not lost)
+            connection, _ = self._execute('update_stats', (wins, losses, draws, username))
             connection.commit()
-            cursor.close()
         except Error as e:
             print(f"Error updating user stats: {e}")
 
@@ -140,6 +211,7 @@ class AuthGUI:
         self.auth_system = AuthSystem()
         self.on_login_success = on_login_success
         self.current_user = None
+        self._busy = False  # A login or registration is being checked in the background
         
         # Check database connection
         try:
@@ -161,7 +233,8 @@ class AuthGUI:
             return
         
         # Create main window with modern styling
-        self.root = tk.Tk()
+        self.root = shared_root()
+        self.frame = screen_frame(self.root)
         self.root.title("♔ NeuroChess - Login")
         self.root.geometry("500x650")  # Increased height for better visibility
         self.root.configure(bg='#0f0f1e')
@@ -170,7 +243,9 @@ class AuthGUI:
         # Center window
         self.center_window()
         
-        # Create login frame
+        # Build both views once and switch between them
+        self._build_login_view()
+        self._build_register_view()
         self.show_login()
     
     def center_window(self):
@@ -182,43 +257,23 @@ class AuthGUI:
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'{width}x{height}+{x}+{y}')
     
+    def _font(self, size, weight='normal'):
+        """Get a shared Segoe UI font, so Tk resolves each font only once."""
+        return ui_font(self.root, size, weight)
+    
     def create_modern_button(self, parent, text, command, bg_color='#6366f1', hover_color='#7c3aed'):
-        """Create a modern styled button with hover effects."""
-        btn = tk.Button(
-            parent,
-            text=text,
-            command=command,
-            font=("Segoe UI", 12, "bold"),
-            bg=bg_color,
-            fg='white',
-            activebackground=hover_color,
-            activeforeground='white',
-            relief=tk.FLAT,
-            cursor='hand2',
-            borderwidth=0,
-            pady=12
-        )
-        
-        # Hover effects
-        def on_enter(e):
-            btn.config(bg=hover_color)
-        
-        def on_leave(e):
-            btn.config(bg=bg_color)
-        
-        btn.bind("<Enter>", on_enter)
-        btn.bind("<Leave>", on_leave)
-        
-        return btn
+        """Create a modern styled ttk button; hover colors come from its style map."""
+        style = modern_button_style(self.root, bg_color, hover_color,
+                                    self._font(12, 'bold'), (1, 12))
+        return ttk.Button(parent, text=text, command=command,
+                          style=style, cursor='hand2')
     
-    def show_login(self):
-        """Show modern login interface."""
-        # Clear existing widgets
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def _build_login_view(self):
+        """Build the login interface once; show_login displays it."""
+        self.login_view = tk.Frame(self.frame, bg='#0f0f1e')
         
         # Header section - reduced height
-        header_frame = tk.Frame(self.root, bg='#1a1a2e', height=120)
+        header_frame = tk.Frame(self.login_view, bg='#1a1a2e', height=120)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
         
@@ -226,7 +281,7 @@ class AuthGUI:
         title = tk.Label(
             header_frame,
             text="♔ NeuroChess ♚",
-            font=("Segoe UI", 30, "bold"),
+            font=self._font(30, 'bold'),
             bg='#1a1a2e',
             fg='#ffffff'
         )
@@ -235,21 +290,21 @@ class AuthGUI:
         subtitle = tk.Label(
             header_frame,
             text="Login to Play",
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='#a0a0c0'
         )
         subtitle.pack(pady=(0, 15))
         
         # Login form container - reduced padding
-        login_frame = tk.Frame(self.root, bg='#0f0f1e')
+        login_frame = tk.Frame(self.login_view, bg='#0f0f1e')
         login_frame.pack(pady=25, padx=50, fill=tk.BOTH, expand=True)
         
         # Username
         tk.Label(
             login_frame,
             text="👤 Username",
-            font=("Segoe UI", 11, "bold"),
+            font=self._font(11, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -257,7 +312,7 @@ class AuthGUI:
         
         self.username_entry = tk.Entry(
             login_frame,
-            font=("Segoe UI", 11),
+            font=self._font(11),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -265,13 +320,12 @@ class AuthGUI:
             borderwidth=0
         )
         self.username_entry.pack(fill=tk.X, pady=(0, 15), ipady=9)
-        self.username_entry.focus()
         
         # Password
         tk.Label(
             login_frame,
             text="🔒 Password",
-            font=("Segoe UI", 11, "bold"),
+            font=self._font(11, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -279,7 +333,7 @@ class AuthGUI:
         
         self.password_entry = tk.Entry(
             login_frame,
-            font=("Segoe UI", 11),
+            font=self._font(11),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -324,14 +378,12 @@ class AuthGUI:
         )
         guest_btn.pack(fill=tk.X, pady=4)
     
-    def show_register(self):
-        """Show modern registration interface."""
-        # Clear existing widgets
-        for widget in self.root.winfo_children():
-            widget.destroy()
+    def _build_register_view(self):
+        """Build the registration interface once; show_register displays it."""
+        self.register_view = tk.Frame(self.frame, bg='#0f0f1e')
         
         # Header section
-        header_frame = tk.Frame(self.root, bg='#1a1a2e', height=120)
+        header_frame = tk.Frame(self.register_view, bg='#1a1a2e', height=120)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
         
@@ -339,7 +391,7 @@ class AuthGUI:
         title = tk.Label(
             header_frame,
             text="✨ Create Account",
-            font=("Segoe UI", 28, "bold"),
+            font=self._font(28, 'bold'),
             bg='#1a1a2e',
             fg='#ffffff'
         )
@@ -348,21 +400,21 @@ class AuthGUI:
         subtitle = tk.Label(
             header_frame,
             text="Join the NeuroChess community",
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='#a0a0c0'
         )
         subtitle.pack(pady=(0, 15))
         
         # Register form container
-        register_frame = tk.Frame(self.root, bg='#0f0f1e')
+        register_frame = tk.Frame(self.register_view, bg='#0f0f1e')
         register_frame.pack(pady=30, padx=50, fill=tk.BOTH, expand=True)
         
         # Username
         tk.Label(
             register_frame,
             text="👤 Username",
-            font=("Segoe UI", 11, "bold"),
+            font=self._font(11, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -370,7 +422,7 @@ class AuthGUI:
         
         self.reg_username_entry = tk.Entry(
             register_frame,
-            font=("Segoe UI", 11),
+            font=self._font(11),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -378,13 +430,12 @@ class AuthGUI:
             borderwidth=0
         )
         self.reg_username_entry.pack(fill=tk.X, pady=(0, 15), ipady=9)
-        self.reg_username_entry.focus()
         
         # Password
         tk.Label(
             register_frame,
             text="🔒 Password",
-            font=("Segoe UI", 11, "bold"),
+            font=self._font(11, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -392,7 +443,7 @@ class AuthGUI:
         
         self.reg_password_entry = tk.Entry(
             register_frame,
-            font=("Segoe UI", 11),
+            font=self._font(11),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -406,7 +457,7 @@ class AuthGUI:
         tk.Label(
             register_frame,
             text="🔐 Confirm Password",
-            font=("Segoe UI", 11, "bold"),
+            font=self._font(11, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -414,7 +465,7 @@ class AuthGUI:
         
         self.reg_confirm_entry = tk.Entry(
             register_frame,
-            font=("Segoe UI", 11),
+            font=self._font(11),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -449,6 +500,22 @@ class AuthGUI:
         )
         back_btn.pack(fill=tk.X, pady=5)
     
+    def show_login(self):
+        """Show modern login interface."""
+        self.register_view.pack_forget()
+        for entry in (self.username_entry, self.password_entry):
+            entry.delete(0, tk.END)
+        self.login_view.pack(fill=tk.BOTH, expand=True)
+        self.username_entry.focus()
+    
+    def show_register(self):
+        """Show modern registration interface."""
+        self.login_view.pack_forget()
+        for entry in (self.reg_username_entry, self.reg_password_entry, self.reg_confirm_entry):
+            entry.delete(0, tk.END)
+        self.register_view.pack(fill=tk.BOTH, expand=True)
+        self.reg_username_entry.focus()
+    
     def login(self):
         """Handle login."""
         username = self.username_entry.get().strip()
@@ -462,15 +529,23 @@ class AuthGUI:
             messagebox.showerror("Error", "Please enter a password")
             return
         
-        try:
-            if self.auth_system.login(username, password):
+        if self._busy:
+            return
+        self._busy = True
+        
+        # Password hashing is deliberately slow; keep the window responsive
+        def on_done(success, error):
+            self._busy = False
+            if error is not None:
+                messagebox.showerror("Database Error", f"Could not connect to database:\n{str(error)}")
+            elif success:
                 self.current_user = username
-                self.root.destroy()
+                self.frame.destroy()
                 self.on_login_success(username)
             else:
                 messagebox.showerror("Login Failed", "Invalid username or password")
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Could not connect to database:\n{str(e)}")
+        
+        run_in_background(self.root, lambda: self.auth_system.login(username, password), on_done)
     
     def register(self):
         """Handle registration."""
@@ -498,21 +573,28 @@ class AuthGUI:
             messagebox.showerror("Error", "Passwords do not match")
             return
         
-        try:
-            if self.auth_system.register(username, password):
+        if self._busy:
+            return
+        self._busy = True
+        
+        def on_done(success, error):
+            self._busy = False
+            if error is not None:
+                messagebox.showerror("Database Error", f"Could not create account:\n{str(error)}")
+            elif success:
                 messagebox.showinfo("Success", f"Account created for {username}!\nYou can now login.")
                 self.show_login()
             else:
                 messagebox.showerror("Error", "Username already exists")
-        except Exception as e:
-            messagebox.showerror("Database Error", f"Could not create account:\n{str(e)}")
+        
+        run_in_background(self.root, lambda: self.auth_system.register(username, password), on_done)
     
     def play_as_guest(self):
         """Play as guest without login."""
         self.current_user = "Guest"
-        self.root.destroy()
+        self.frame.destroy()
         self.on_login_success("Guest")
     
     def run(self):
         """Start the authentication GUI."""
-        self.root.mainloop()
+        run_root(self.root)
@@ -0,0 +1,40 @@
+"""
+Background work for the Tkinter interfaces
+Runs blocking calls off the Tk event loop and delivers results back on it
+"""
+
+import threading
+
+
+def run_in_background(root, func, callback, poll_ms: int = 50):
+    """
+    Run func in a worker thread and hand its outcome to callback on the Tk thread.
+    
+    Tk widgets may only be touched from the thread running mainloop, so the
+    worker stores its outcome and the Tk thread polls for it with after().
+    
+    Args:
+        root: Tk widget whose event loop delivers the callback
+        func: Callable taking no arguments, run in the worker thread
+        callback: Called as callback(result, error) once func returns or
+            raises; error is None on success
+        poll_ms: Polling interval in milliseconds
+    """
+    outcome = {}
+    
+    def worker():
+        try:
+            outcome['result'] = func()
+        except Exception as e:
+            outcome['error'] = e
+    
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    
+    def poll():
+        if thread.is_alive():
+            root.after(poll_ms, poll)
+        else:
+            callback(outcome.get('result'), outcome.get('error'))
+    
+    root.after(poll_ms, poll)
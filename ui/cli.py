@@ -2,13 +2,50 @@
 Command-line interface for playing against NeuroChess
 """
 
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import chess
 from engine.game import ChessGame
 from engine.mcts import MCTS
+from engine.neural_net import ChessNet
 from engine.utils import board_to_tensor
 import config
 
 
+# Text of an empty board as print_board shows it: a blank line, eight ranks
+# of '.' separated by spaces (rank 8 first), and a blank line
+_BOARD_TEMPLATE = b'\n' + b'\n'.join([b' '.join([b'.'] * 8)] * 8) + b'\n\n'
+# Offset of each square's character in the template
+_SQUARE_OFFSETS = [1 + (7 - chess.square_rank(sq)) * 16 + chess.square_file(sq) * 2 for sq in chess.SQUARES]
+# (color, piece type, symbol byte) for every piece kind
+_PIECE_SYMBOLS = [
+    (color, piece_type, ord(chess.piece_symbol(piece_type).upper() if color else chess.piece_symbol(piece_type)))
+    for color in (chess.WHITE, chess.BLACK)
+    for piece_type in chess.PIECE_TYPES
+]
+
+
+def render_board(board: chess.Board) -> str:
+    """
+    Render a board in the same layout as str(board), framed by blank lines.
+    
+    Fills a copy of a fixed template from the piece bitboards rather than
+    building the string square by square.
+    
+    Args:
+        board: Position to render
+        
+    Returns:
+        Board text ending in a newline
+    """
+    text = bytearray(_BOARD_TEMPLATE)
+    for color, piece_type, symbol in _PIECE_SYMBOLS:
+        for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+            text[_SQUARE_OFFSETS[square]] = symbol
+    return text.decode('ascii')
+
+
 class ChessCLI:
     """Command-line interface for chess gameplay."""
     
@@ -20,13 +57,30 @@ class ChessCLI:
             model: Neural network model
             device: Device to run model on
         """
-        self.model = model
+        # BatchNorm-folded (and, when enabled, compiled) copy for play; the
+        # wrapper models from ONNX or self-play workers are used as given
+        self.model = model.fuse() if isinstance(model, ChessNet) else model
         self.device = device
-        self.mcts = MCTS(model, device=device, temperature=0.1)  # Low temperature for deterministic play
+        self._mcts = None  # Created on the first AI move, then kept across moves and games
+        self._board_text = (None, '')  # (position key, rendered text) of the last board printed
+        self._search_pool = ThreadPoolExecutor(max_workers=1)  # Runs AI searches off the prompt thread
+    
+    @property
+    def mcts(self) -> MCTS:
+        """Search used for AI moves; its tree follows the game between moves."""
+        if self._mcts is None:
+            # Low temperature for deterministic play; wider leaf batches than
+            # self-play, since one interactive search has the device to itself
+            self._mcts = MCTS(self.model, device=self.device, temperature=0.1,
+                              batch_size=16, virtual_loss=3, play_mode=True)
+        return self._mcts
     
     def print_board(self, board: chess.Board):
         """Print the chess board in a readable format."""
-        print("\n" + str(board) + "\n")
+        key = board._transposition_key()
+        if self._board_text[0] != key:
+            self._board_text = (key, render_board(board))
+        sys.stdout.write(self._board_text[1])
     
     def get_user_move(self, game: ChessGame) -> chess.Move:
         """
@@ -38,7 +92,9 @@ class ChessCLI:
         Returns:
             chess.Move object
         """
-        legal_moves = game.get_legal_moves()
+        # LegalMoveGenerator checks membership with board.is_legal instead
+        # of enumerating every legal move
+        legal_moves = game.get_board().legal_moves
         
         while True:
             move_str = input("Enter your move (e.g., e2e4): ").strip()
@@ -56,6 +112,47 @@ class ChessCLI:
             except ValueError:
                 print("Invalid move format. Use UCI notation (e.g., e2e4).")
     
+    def think(self, game: ChessGame, poll_seconds: float = 0.2) -> chess.Move:
+        """
+        Search for the AI's move in the background, printing progress meanwhile.
+        
+        Ctrl+C stops the search early and plays the best move found so far.
+        
+        Args:
+            game: Current game state
+            poll_seconds: Interval between progress updates
+            
+        Returns:
+            The chosen move, or None if there are no legal moves
+        """
+        mcts = self.mcts
+        future = self._search_pool.submit(mcts.search, game)
+        start = time.monotonic()
+        shown = False  # Whether a progress line needs ending
+        try:
+            while True:
+                try:
+                    move, _ = future.result(timeout=poll_seconds)
+                    break
+                except FutureTimeout:
+                    elapsed = time.monotonic() - start
+                    best = mcts.best_move_so_far()
+                    sys.stdout.write(
+                        f"\r  {mcts.simulations_done}/{mcts.num_simulations} simulations "
+                        f"({mcts.simulations_done / elapsed:.0f}/s), "
+                        f"best so far: {best.uci() if best else '-'}   "
+                    )
+                    sys.stdout.flush()
+                    shown = True
+        except KeyboardInterrupt:
+            mcts.stop()
+            move, _ = future.result()
+            print("\nSearch interrupted.")
+            shown = False
+        if shown:
+            print()
+        return move
+    
     def play(self, human_plays_white: bool = True):
         """
         Play a game against the AI.
@@ -80,10 +177,12 @@ class ChessCLI:
                 print("Your turn!")
                 move = self.get_user_move(game)
                 game.make_move(move)
+                if self._mcts is not None:
+                    self._mcts.advance_root(move)
             else:
                 # AI's turn
                 print("AI is thinking...")
-                move, _ = self.mcts.search(game)
+                move = self.think(game)
                 
                 if move is None:
                     print("AI has no legal moves!")
@@ -91,6 +190,8 @@ class ChessCLI:
                 
                 print(f"AI plays: {move.uci()}")
                 game.make_move(move)
+                # Keep the subtree under the AI's move for its next search
+                self.mcts.advance_root(move)
         
         # Game over
         self.print_board(game.get_board())
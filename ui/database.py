@@ -4,16 +4,69 @@ Uses XAMPP MySQL
 """
 
 import mysql.connector
+import mysql.connector.pooling
 from mysql.connector import Error
+from contextlib import contextmanager
 import os
 
 
+# Read queries issued on every menu and history refresh, run as prepared statements
+SELECT_STATS_SQL = (
+    "SELECT games_played, wins, losses, draws FROM users WHERE username = %s"
+)
+# Writes for a finished game, on a pooled connection
+INSERT_GAME_SQL = (
+    "INSERT INTO game_history (player1_username, player2_username, winner, result, moves) "
+    "VALUES (%s, %s, %s, %s, %s)"
+)
+UPDATE_STATS_SQL = (
+    "UPDATE users SET games_played = games_played + 1, wins = wins + %s, "
+    "losses = losses + %s, draws = draws + %s WHERE username = %s"
+)
+# Columns shown for a game, worked out from the given user's side in SQL so the
+# moves text never leaves the server. {opponent} is the other player's column.
+_HISTORY_COLUMNS = """
+        SELECT played_at,
+               DATE_FORMAT(played_at, '%Y-%m-%d %H:%i') AS played_on,
+               DATE_FORMAT(played_at, '%b %d, %H:%i') AS played_at_str,
+               {opponent} AS opponent,
+               CASE
+                   WHEN winner = %s THEN 'Win'
+                   WHEN winner = {opponent} THEN 'Loss'
+                   WHEN result = 'draw' THEN 'Draw'
+                   ELSE result
+               END AS outcome,
+               COALESCE(winner, 'Draw') AS winner
+        FROM game_history"""
+# One branch per player column, so each is a range scan on its
+# (player, played_at) index instead of a full scan for the OR.
+# Parameters: username, username, limit, username, username, username, limit, limit.
+SELECT_HISTORY_SQL = (
+    "(" + _HISTORY_COLUMNS.format(opponent='player2_username') + """
+        WHERE player1_username = %s
+        ORDER BY played_at DESC LIMIT %s)
+    UNION ALL
+    (""" + _HISTORY_COLUMNS.format(opponent='player1_username') + """
+        WHERE player2_username = %s AND NOT player1_username <=> %s
+        ORDER BY played_at DESC LIMIT %s)
+    ORDER BY played_at DESC
+    LIMIT %s
+""")
+
+# Indexes added to existing game_history tables as well as new ones
+_GAME_HISTORY_INDEXES = {
+    'idx_p1_time': '(player1_username, played_at DESC)',
+    'idx_p2_time': '(player2_username, played_at DESC)',
+}
+
+
 class Database:
     """MySQL database connection and operations."""
     
     def __init__(self):
         """Initialize database connection."""
         self.connection = None
+        self.pool = None
         self.config = {
             'host': 'localhost',
             'user': 'root',
@@ -24,6 +77,10 @@ class Database:
         self.connect()
         self.create_database_if_not_exists()
         self.create_tables()
+        # The database exists now, so pooled connections can select it directly
+        self.pool = mysql.connector.pooling.MySQLConnectionPool(
+            pool_name='neurochess', pool_size=4, **self.config
+        )
     
     def connect(self):
         """Connect to MySQL server and database."""
@@ -104,11 +161,14 @@ class Database:
                 result VARCHAR(10),
                 moves TEXT,
                 played_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                INDEX idx_p1_time (player1_username, played_at DESC),
+                INDEX idx_p2_time (player2_username, played_at DESC),
                 FOREIGN KEY (player1_username) REFERENCES users(username) ON DELETE SET NULL,
                 FOREIGN KEY (player2_username) REFERENCES users(username) ON DELETE SET NULL
             )
             """
             cursor.execute(create_games_table)
+            self._add_missing_indexes(cursor)
             
             self.connection.commit()
             cursor.close()
@@ -117,6 +177,18 @@ class Database:
             print(f"Error creating tables: {e}")
             raise
     
+    def _add_missing_indexes(self, cursor):
+        """Create the game_history indexes on tables made before they were part of the schema."""
+        cursor.execute(
+            "SELECT DISTINCT index_name FROM information_schema.statistics "
+            "WHERE table_schema = %s AND table_name = 'game_history'",
+            (self.config['database'],)
+        )
+        existing = {row[0] for row in cursor.fetchall()}
+        for name, columns in _GAME_HISTORY_INDEXES.items():
+            if name not in existing:
+                cursor.execute(f"CREATE INDEX {name} ON game_history {columns}")
+    
     def get_connection(self):
         """Get database connection."""
         if not self.connection or not self.connection.is_connected():
@@ -130,6 +202,91 @@ class Database:
                 self.create_database_if_not_exists()
         return self.connection
     
+    @contextmanager
+    def pooled_connection(self):
+        """
+        Borrow an already authenticated connection from the pool.
+        
+        The connection goes back to the pool when the block exits.
+        """
+        connection = self.pool.get_connection()
+        try:
+            yield connection
+        finally:
+            connection.close()
+    
+    def _fetch_dicts(self, sql: str, params: tuple) -> list:
+        """Run a prepared read query on a pooled connection, returning rows as dicts."""
+        with self.pooled_connection() as connection:
+            cursor = connection.cursor(prepared=True)
+            try:
+                cursor.execute(sql, params)
+                columns = cursor.column_names
+                return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+    
+    def fetch_user_stats(self, username: str):
+        """
+        Get a user's game statistics.
+        
+        Args:
+            username: Username to look up
+            
+        Returns:
+            Dict with games_played, wins, losses and draws, or None if no such user
+        """
+        rows = self._fetch_dicts(SELECT_STATS_SQL, (username,))
+        return rows[0] if rows else None
+    
+    def fetch_game_history(self, username: str, limit: int = 100) -> list:
+        """
+        Get the most recent games a user played in, newest first.
+        
+        Args:
+            username: Username of either player
+            limit: Maximum number of games
+            
+        Returns:
+            List of dicts with played_at, played_on and played_at_str (formatted
+            dates for the history table and the menu), opponent, outcome ('Win',
+            'Loss', 'Draw' or the stored result) and winner ('Draw' when there
+            is none)
+        """
+        return self._fetch_dicts(
+            SELECT_HISTORY_SQL,
+            (username, username, limit, username, username, username, limit, limit)
+        )
+    
+    def record_game(self, player1: str, player2: str, winner, result: str, moves: str,
+                    stats: list):
+        """
+        Save a finished game and its players' statistics in one transaction.
+        
+        Runs on a pooled connection, so it may be called from a worker thread.
+        
+        Args:
+            player1: Username of the white player
+            player2: Username of the black player
+            winner: Username of the winner, or None for a draw
+            result: '1-0', '0-1' or 'draw'
+            moves: Space separated SAN moves
+            stats: (wins, losses, draws, username) per player whose
+                statistics are updated
+        """
+        with self.pooled_connection() as connection:
+            cursor = connection.cursor(prepared=True)
+            try:
+                cursor.execute(INSERT_GAME_SQL, (player1, player2, winner, result, moves))
+                if stats:
+                    cursor.executemany(UPDATE_STATS_SQL, stats)
+                connection.commit()
+            except Error:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+    
     def close(self):
         """Close database connection."""
         if self.connection and self.connection.is_connected():
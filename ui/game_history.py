@@ -6,8 +6,41 @@ Shows past games with details and statistics
 import tkinter as tk
 from tkinter import ttk
 from ui.database import get_database
+from ui.hover import modern_button_style
+from ui.window import run_root, screen_frame, shared_root, ui_font
 from mysql.connector import Error
 from datetime import datetime
+import time
+import weakref
+
+
+HISTORY_CACHE_SECONDS = 1.0  # Refreshes within this window reuse the last query
+REFRESH_DEBOUNCE_MS = 150    # Refresh clicks closer together than this coalesce
+
+
+# Tk roots whose Tcl interpreter already has the Treeview styles. Styles live
+# in the interpreter, so they are set once per root rather than per window.
+_STYLED_ROOTS = weakref.WeakSet()
+
+
+def _configure_styles(root):
+    """Set up the Treeview styles for root's interpreter, if not done already."""
+    if root in _STYLED_ROOTS:
+        return
+    style = ttk.Style(root)
+    style.theme_use('clam')
+    style.configure("Treeview",
+                   background="#1a1a2e",
+                   foreground="#e0e0ff",
+                   fieldbackground="#1a1a2e",
+                   borderwidth=0)
+    style.configure("Treeview.Heading",
+                   background="#6366f1",
+                   foreground="white",
+                   borderwidth=0,
+                   font=("Segoe UI", 10, "bold"))
+    style.map('Treeview', background=[('selected', '#6366f1')])
+    _STYLED_ROOTS.add(root)
 
 
 class GameHistoryGUI:
@@ -22,15 +55,20 @@ class GameHistoryGUI:
         """
         self.username = username
         self.db = get_database()
+        self._history_cache = None
+        self._history_fetched_at = 0.0
+        self._refresh_job = None
         
         # Create main window
-        self.root = tk.Tk()
+        self.root = shared_root()
+        self.frame = screen_frame(self.root)
         self.root.title("♟️ NeuroChess - Game History")
         self.root.geometry("900x700")
         self.root.configure(bg='#0f0f1e')
         self.root.resizable(True, True)
         
         self.center_window()
+        _configure_styles(self.root)
         self.create_ui()
         self.load_history()
     
@@ -43,45 +81,28 @@ class GameHistoryGUI:
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'{width}x{height}+{x}+{y}')
     
+    def _font(self, size, weight='normal', slant='roman'):
+        """Get a shared Segoe UI font, so Tk resolves each font only once."""
+        return ui_font(self.root, size, weight, slant)
+    
     def create_modern_button(self, parent, text, command, bg_color='#6366f1', hover_color='#7c3aed'):
-        """Create a modern styled button with hover effects."""
-        btn = tk.Button(
-            parent,
-            text=text,
-            command=command,
-            font=("Segoe UI", 11, "bold"),
-            bg=bg_color,
-            fg='white',
-            activebackground=hover_color,
-            activeforeground='white',
-            relief=tk.FLAT,
-            cursor='hand2',
-            borderwidth=0,
-            pady=10
-        )
-        
-        def on_enter(e):
-            btn.config(bg=hover_color)
-        
-        def on_leave(e):
-            btn.config(bg=bg_color)
-        
-        btn.bind("<Enter>", on_enter)
-        btn.bind("<Leave>", on_leave)
-        
-        return btn
+        """Create a modern styled ttk button; hover colors come from its style map."""
+        style = modern_button_style(self.root, bg_color, hover_color,
+                                    self._font(11, 'bold'), (1, 10))
+        return ttk.Button(parent, text=text, command=command,
+                          style=style, cursor='hand2')
     
     def create_ui(self):
         """Create the modern UI."""
         # Header
-        header_frame = tk.Frame(self.root, bg='#1a1a2e', height=100)
+        header_frame = tk.Frame(self.frame, bg='#1a1a2e', height=100)
         header_frame.pack(fill=tk.X)
         header_frame.pack_propagate(False)
         
         title = tk.Label(
             header_frame,
             text="📜 Game History",
-            font=("Segoe UI", 28, "bold"),
+            font=self._font(28, 'bold'),
             bg='#1a1a2e',
             fg='#ffffff'
         )
@@ -90,14 +111,14 @@ class GameHistoryGUI:
         subtitle = tk.Label(
             header_frame,
             text=f"Viewing games for {self.username}",
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='#a0a0c0'
         )
         subtitle.pack(pady=(0, 15))
         
         # Main content
-        content_frame = tk.Frame(self.root, bg='#0f0f1e')
+        content_frame = tk.Frame(self.frame, bg='#0f0f1e')
         content_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=20)
         
         # Stats section
@@ -113,7 +134,7 @@ class GameHistoryGUI:
         tk.Label(
             history_frame,
             text="📋 Recent Games",
-            font=("Segoe UI", 14, "bold"),
+            font=self._font(14, 'bold'),
             bg='#16213e',
             fg='#e0e0ff'
         ).pack(pady=15, padx=20, anchor='w')
@@ -122,7 +143,7 @@ class GameHistoryGUI:
         self.create_game_list(history_frame)
         
         # Button frame
-        button_frame = tk.Frame(self.root, bg='#0f0f1e')
+        button_frame = tk.Frame(self.frame, bg='#0f0f1e')
         button_frame.pack(fill=tk.X, padx=30, pady=(0, 20))
         
         back_btn = self.create_modern_button(
@@ -137,7 +158,7 @@ class GameHistoryGUI:
         refresh_btn = self.create_modern_button(
             button_frame,
             "🔄 Refresh",
-            self.load_history,
+            self.schedule_refresh,
             bg_color='#6366f1',
             hover_color='#7c3aed'
         )
@@ -146,15 +167,7 @@ class GameHistoryGUI:
     def create_stats_display(self, parent):
         """Create statistics display."""
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute(
-                "SELECT games_played, wins, losses, draws FROM users WHERE username = %s",
-                (self.username,)
-            )
-            stats = cursor.fetchone()
-            cursor.close()
+            stats = self.db.fetch_user_stats(self.username)
             
             if stats:
                 stats_container = tk.Frame(parent, bg='#16213e')
@@ -175,7 +188,7 @@ class GameHistoryGUI:
                     tk.Label(
                         stat_box,
                         text=str(value),
-                        font=("Segoe UI", 24, "bold"),
+                        font=self._font(24, 'bold'),
                         bg='#1a1a2e',
                         fg=color
                     ).pack(pady=(10, 0))
@@ -183,7 +196,7 @@ class GameHistoryGUI:
                     tk.Label(
                         stat_box,
                         text=label,
-                        font=("Segoe UI", 10),
+                        font=self._font(10),
                         bg='#1a1a2e',
                         fg='#a0a0c0'
                     ).pack(pady=(0, 10))
@@ -201,20 +214,6 @@ class GameHistoryGUI:
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         # Treeview
-        style = ttk.Style()
-        style.theme_use('clam')
-        style.configure("Treeview",
-                       background="#1a1a2e",
-                       foreground="#e0e0ff",
-                       fieldbackground="#1a1a2e",
-                       borderwidth=0)
-        style.configure("Treeview.Heading",
-                       background="#6366f1",
-                       foreground="white",
-                       borderwidth=0,
-                       font=("Segoe UI", 10, "bold"))
-        style.map('Treeview', background=[('selected', '#6366f1')])
-        
         columns = ('Date', 'Opponent', 'Result', 'Winner')
         self.tree = ttk.Treeview(
             tree_frame,
@@ -239,26 +238,32 @@ class GameHistoryGUI:
         self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
         scrollbar.config(command=self.tree.yview)
     
+    def schedule_refresh(self):
+        """Reload the history shortly, folding rapid Refresh clicks into one reload."""
+        if self._refresh_job is not None:
+            self.root.after_cancel(self._refresh_job)
+        self._refresh_job = self.root.after(REFRESH_DEBOUNCE_MS, self._run_refresh)
+    
+    def _run_refresh(self):
+        self._refresh_job = None
+        self.load_history()
+    
+    def _fetch_history(self) -> list:
+        """Games of this user, from the database at most once per HISTORY_CACHE_SECONDS."""
+        now = time.monotonic()
+        if self._history_cache is None or now - self._history_fetched_at >= HISTORY_CACHE_SECONDS:
+            # Get games where user was player1 or player2
+            self._history_cache = self.db.fetch_game_history(self.username, limit=100)
+            self._history_fetched_at = now
+        return self._history_cache
+    
     def load_history(self):
         """Load game history from database."""
-        # Clear existing items
-        for item in self.tree.get_children():
-            self.tree.delete(item)
+        # Clear existing items in one call
+        self.tree.delete(*self.tree.get_children())
         
         try:
-            connection = self.db.get_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            # Get games where user was player1 or player2
-            cursor.execute("""
-                SELECT * FROM game_history 
-                WHERE player1_username = %s OR player2_username = %s 
-                ORDER BY played_at DESC 
-                LIMIT 100
-            """, (self.username, self.username))
-            
-            games = cursor.fetchall()
-            cursor.close()
+            games = self._fetch_history()
             
             if not games:
                 # Add a message if no games found
@@ -269,31 +274,13 @@ class GameHistoryGUI:
                     'Start playing to see history!'
                 ))
             else:
-                for game in games:
-                    # Determine opponent
-                    opponent = game['player2_username'] if game['player1_username'] == self.username else game['player1_username']
-                    
-                    # Format date
-                    date_str = game['played_at'].strftime('%Y-%m-%d %H:%M')
-                    
-                    # Determine result from user's perspective
-                    if game['winner'] == self.username:
-                        result = 'Win'
-                    elif game['winner'] == opponent:
-                        result = 'Loss'
-                    elif game['result'] == 'draw':
-                        result = 'Draw'
-                    else:
-                        result = game['result']
-                    
-                    winner = game['winner'] if game['winner'] else 'Draw'
-                    
-                    self.tree.insert('', 'end', values=(
-                        date_str,
-                        opponent,
-                        result,
-                        winner
-                    ))
+                # Rows arrive formatted from the user's perspective; insert them
+                # through the raw Tcl command, skipping Treeview.insert's option handling
+                rows = [(game['played_on'], game['opponent'], game['outcome'], game['winner'])
+                        for game in games]
+                call, tree = self.tree.tk.call, str(self.tree)
+                for values in rows:
+                    call(tree, 'insert', '', 'end', '-values', values)
         except Error as e:
             print(f"Error loading game history: {e}")
             self.tree.insert('', 'end', values=(
@@ -305,11 +292,13 @@ class GameHistoryGUI:
     
     def back_to_menu(self):
         """Return to game menu."""
-        self.root.destroy()
+        if self._refresh_job is not None:
+            self.root.after_cancel(self._refresh_job)
+        self.frame.destroy()
         from ui.game_menu import GameMenu
         menu = GameMenu(self.username)
         menu.run()
     
     def run(self):
         """Start the GUI."""
-        self.root.mainloop()
+        run_root(self.root)
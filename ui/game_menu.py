@@ -4,13 +4,66 @@ Game menu for selecting game mode - Modern UI Design
 
 import tkinter as tk
 from tkinter import font as tkfont
+from tkinter import ttk
 from ui.simple_gui import ChessGUI
-from engine.neural_net import ChessNet
+from engine.neural_net import load_play_model
+from engine.utils import checkpoint_key, latest_checkpoint
 import torch
-import os
+import threading
+from concurrent.futures import Future
 from ui.database import get_database
-from mysql.connector import Error
+from ui.auth import AuthGUI
+from ui.background import run_in_background
+from ui.hover import modern_button_style
+from ui.window import run_root, screen_frame, shared_root, ui_font
 from datetime import datetime
+import time
+
+
+# AI model per device as ((checkpoint path, mtime), future), so a game start
+# only reads a checkpoint that has not been loaded yet; a newer checkpoint
+# replaces the device's entry instead of keeping the old model alive
+_MODEL_CACHE = {}
+_model_lock = threading.Lock()
+
+RECENT_GAMES_CACHE_SECONDS = 5.0  # Menus rebuilt within this window reuse the last query
+
+# Recent games per username as (fetch time, rows); cleared whenever a game starts
+_RECENT_GAMES = {}
+
+
+def preload_model() -> Future:
+    """
+    Start loading the AI model for the latest checkpoint on a background thread.
+    
+    Calls for a checkpoint that is already loaded or loading return the same
+    future, so AI games reuse the model instead of paying for checkpoint
+    loading and device initialization again. A newer checkpoint, or one
+    rewritten in place, is loaded on the next call and replaces the
+    previous model.
+    
+    Returns:
+        Future resolving to (model, device)
+    """
+    device = 'cuda' if torch.cuda.is_available() else 'cpu'
+    checkpoint_path = latest_checkpoint('models/checkpoints')
+    key = checkpoint_key(checkpoint_path)
+    with _model_lock:
+        cached = _MODEL_CACHE.get(device)
+        future = cached[1] if cached is not None and cached[0] == key else None
+        if future is None:
+            future = Future()
+            _MODEL_CACHE[device] = (key, future)
+            
+            def worker():
+                try:
+                    model, _ = load_play_model(checkpoint_path, device)
+                    future.set_result((model, device))
+                except BaseException as e:
+                    future.set_exception(e)
+            
+            threading.Thread(target=worker, daemon=True).start()
+        return future
 
 
 class GameMenu:
@@ -24,7 +77,8 @@ class GameMenu:
             username: Current logged in username
         """
         self.username = username
-        self.root = tk.Tk()
+        self.root = shared_root()
+        self.frame = screen_frame(self.root)
         self.root.title("NeuroChess - Game Menu")
         self.root.geometry("1000x750")
         self.root.configure(bg='#0f0f1e')
@@ -32,6 +86,9 @@ class GameMenu:
         
         self.center_window()
         self.create_menu()
+        
+        # Load the AI model while the user is in the menu
+        preload_model()
     
     def center_window(self):
         """Center the window on screen."""
@@ -42,52 +99,39 @@ class GameMenu:
         y = (self.root.winfo_screenheight() // 2) - (height // 2)
         self.root.geometry(f'{width}x{height}+{x}+{y}')
     
+    def _font(self, size, weight='normal', slant='roman'):
+        """Get a shared Segoe UI font, so Tk resolves each font only once."""
+        return ui_font(self.root, size, weight, slant)
+    
     def create_modern_button(self, parent, text, command, bg_color='#6366f1', hover_color='#7c3aed'):
-        """Create a modern styled button with hover effects."""
-        btn = tk.Button(
-            parent,
-            text=text,
-            command=command,
-            font=("Segoe UI", 13, "bold"),
-            bg=bg_color,
-            fg='white',
-            activebackground=hover_color,
-            activeforeground='white',
-            relief=tk.FLAT,
-            cursor='hand2',
-            borderwidth=0,
-            padx=30,
-            pady=15
-        )
-        
-        # Hover effects
-        def on_enter(e):
-            btn.config(bg=hover_color)
-        
-        def on_leave(e):
-            btn.config(bg=bg_color)
-        
-        btn.bind("<Enter>", on_enter)
-        btn.bind("<Leave>", on_leave)
-        
-        return btn
+        """Create a modern styled ttk button; hover colors come from its style map."""
+        style = modern_button_style(self.root, bg_color, hover_color,
+                                    self._font(13, 'bold'), (30, 15))
+        return ttk.Button(parent, text=text, command=command,
+                          style=style, cursor='hand2')
     
     def create_menu(self):
         """Create the modern game menu interface."""
         # Main container with gradient effect simulation
-        main_container = tk.Frame(self.root, bg='#0f0f1e')
+        main_container = tk.Frame(self.frame, bg='#0f0f1e')
         main_container.pack(fill=tk.BOTH, expand=True, padx=0, pady=0)
         
+        # Header, user, content and footer bands share one grid, sized in a
+        # single layout pass; the minimum sizes keep the banded look
+        main_container.grid_columnconfigure(0, weight=1)
+        main_container.grid_rowconfigure(0, minsize=200)
+        main_container.grid_rowconfigure(1, minsize=80)
+        main_container.grid_rowconfigure(2, weight=1)
+        
         # Header section with gradient background
-        header_frame = tk.Frame(main_container, bg='#1a1a2e', height=200)
-        header_frame.pack(fill=tk.X, pady=0)
-        header_frame.pack_propagate(False)
+        header_frame = tk.Frame(main_container, bg='#1a1a2e')
+        header_frame.grid(row=0, column=0, sticky='nsew')
         
         # Title with modern font
         title = tk.Label(
             header_frame,
             text="♔ NeuroChess ♚",
-            font=("Segoe UI", 42, "bold"),
+            font=self._font(42, 'bold'),
             bg='#1a1a2e',
             fg='#ffffff'
         )
@@ -97,21 +141,20 @@ class GameMenu:
         subtitle = tk.Label(
             header_frame,
             text="AI-Powered Chess Experience",
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='#a0a0c0'
         )
         subtitle.pack(pady=(0, 20))
         
         # User info with modern styling
-        user_frame = tk.Frame(main_container, bg='#16213e', height=80)
-        user_frame.pack(fill=tk.X, pady=0)
-        user_frame.pack_propagate(False)
+        user_frame = tk.Frame(main_container, bg='#16213e')
+        user_frame.grid(row=1, column=0, sticky='nsew')
         
         user_label = tk.Label(
             user_frame,
             text=f"👤 Welcome back, {self.username}!",
-            font=("Segoe UI", 15, "bold"),
+            font=self._font(15, 'bold'),
             bg='#16213e',
             fg='#e0e0ff'
         )
@@ -119,7 +162,7 @@ class GameMenu:
         
         # Content container for split layout
         content_container = tk.Frame(main_container, bg='#0f0f1e')
-        content_container.pack(fill=tk.BOTH, expand=True, padx=40, pady=20)
+        content_container.grid(row=2, column=0, sticky='nsew', padx=40, pady=20)
 
         # LEFT COLUMN - Game Modes
         left_frame = tk.Frame(content_container, bg='#0f0f1e')
@@ -129,7 +172,7 @@ class GameMenu:
         tk.Label(
             left_frame,
             text="Start New Game",
-            font=("Segoe UI", 18, "bold"),
+            font=self._font(18, 'bold'),
             bg='#0f0f1e',
             fg='#ffffff'
         ).pack(pady=(0, 30), anchor='w')
@@ -163,7 +206,7 @@ class GameMenu:
 
         # Footer Buttons (Full Width)
         footer_frame = tk.Frame(main_container, bg='#0f0f1e')
-        footer_frame.pack(fill=tk.X, side=tk.BOTTOM, padx=40, pady=20)
+        footer_frame.grid(row=3, column=0, sticky='ew', padx=40, pady=20)
 
         # View Full History Button
         history_btn = self.create_modern_button(
@@ -195,7 +238,7 @@ class GameMenu:
         tk.Label(
             header,
             text="📋 Recent Activity",
-            font=("Segoe UI", 12, "bold"),
+            font=self._font(12, 'bold'),
             bg='#1a1a2e',
             fg='#e0e0ff'
         ).pack(side=tk.LEFT, padx=15, pady=10)
@@ -207,98 +250,110 @@ class GameMenu:
         self.load_recent_games()
 
     def load_recent_games(self):
-        """Load recent games into the history panel."""
-        try:
-            db = get_database()
-            connection = db.get_connection()
-            cursor = connection.cursor(dictionary=True)
-            
-            cursor.execute("""
-                SELECT * FROM game_history 
-                WHERE player1_username = %s OR player2_username = %s 
-                ORDER BY played_at DESC 
-                LIMIT 5
-            """, (self.username, self.username))
-            
-            games = cursor.fetchall()
-            cursor.close()
-            
-            if not games:
-                tk.Label(
-                    self.history_list_frame,
-                    text="No games played yet.\nStart a game to see history!",
-                    font=("Segoe UI", 10, "italic"),
-                    bg='#16213e',
-                    fg='#a0a0c0',
-                    justify=tk.CENTER
-                ).pack(expand=True)
-            else:
-                for game in games:
-                    self.create_history_item(game)
-                    
-        except Error as e:
-            print(f"Error loading recent games: {e}")
+        """Load recent games into the history panel without blocking the window."""
+        loading = tk.Label(
+            self.history_list_frame,
+            text="Loading…",
+            font=self._font(10, slant='italic'),
+            bg='#16213e',
+            fg='#a0a0c0'
+        )
+        loading.pack(pady=10)
+        
+        def on_done(games, error):
+            # The user may have left the menu while the query ran
+            if not self.history_list_frame.winfo_exists():
+                return
+            loading.destroy()
+            self._populate_history(games, error)
+        
+        # The database round-trip runs on a worker thread; rows come back as plain dicts
+        run_in_background(self.root, self._fetch_recent_games, on_done)
+    
+    def _fetch_recent_games(self):
+        """Recent games of this user, reusing a query made in the last RECENT_GAMES_CACHE_SECONDS."""
+        cached = _RECENT_GAMES.get(self.username)
+        if cached is not None and time.monotonic() - cached[0] < RECENT_GAMES_CACHE_SECONDS:
+            return cached[1]
+        games = get_database().fetch_game_history(self.username, limit=5)
+        _RECENT_GAMES[self.username] = (time.monotonic(), games)
+        return games
+    
+    def _populate_history(self, games, error):
+        """Fill the history panel with fetched games, or an explanation if there are none."""
+        if error is not None:
+            print(f"Error loading recent games: {error}")
             tk.Label(
                 self.history_list_frame,
                 text="Unable to load history",
-                font=("Segoe UI", 10),
+                font=self._font(10),
                 bg='#16213e',
                 fg='#ef4444'
             ).pack(pady=10)
+        elif not games:
+            tk.Label(
+                self.history_list_frame,
+                text="No games played yet.\nStart a game to see history!",
+                font=self._font(10, slant='italic'),
+                bg='#16213e',
+                fg='#a0a0c0',
+                justify=tk.CENTER
+            ).pack(expand=True)
+        else:
+            self.draw_history(games)
 
-    def create_history_item(self, game):
-        """Create a single history item widget."""
-        item_frame = tk.Frame(self.history_list_frame, bg='#1a1a2e', height=60)
-        item_frame.pack(fill=tk.X, pady=1, padx=5)
-        item_frame.pack_propagate(False)
+    def draw_history(self, games):
+        """Draw the history items on one canvas instead of a frame and labels per item."""
+        canvas = tk.Canvas(self.history_list_frame, bg='#16213e', highlightthickness=0)
+        canvas.pack(fill=tk.BOTH, expand=True)
+        
+        for index, game in enumerate(games):
+            self.create_history_item(canvas, index, game)
+        
+        def stretch_rows(event):
+            # Row backgrounds span the canvas width, like the frames they replace
+            for item in canvas.find_withtag('row'):
+                x1, y1, _, y2 = canvas.coords(item)
+                canvas.coords(item, x1, y1, event.width - 5, y2)
+        
+        canvas.bind('<Configure>', stretch_rows)
+        canvas.configure(scrollregion=canvas.bbox('all'))
+        canvas.bind('<MouseWheel>', lambda e: canvas.yview_scroll(-1 if e.delta > 0 else 1, 'units'))
+        canvas.bind('<Button-4>', lambda e: canvas.yview_scroll(-1, 'units'))
+        canvas.bind('<Button-5>', lambda e: canvas.yview_scroll(1, 'units'))
+
+    def create_history_item(self, canvas, index, game):
+        """Draw a single history item as canvas items."""
+        top = 1 + index * 61
         
-        # Determine details
-        opponent = game['player2_username'] if game['player1_username'] == self.username else game['player1_username']
-        winner = game['winner']
+        # Opponent and outcome come precomputed from the history query
+        opponent = game['opponent']
         
-        if winner == self.username:
+        if game['outcome'] == 'Win':
             result_color = '#10b981' # Green
             result_text = "V"
-        elif winner == opponent:
+        elif game['outcome'] == 'Loss':
             result_color = '#ef4444' # Red
             result_text = "L"
         else:
             result_color = '#f59e0b' # Yellow
             result_text = "D"
             
-        date_str = game['played_at'].strftime('%b %d, %H:%M')
+        date_str = game['played_at_str']
 
+        # Row background, widened to the canvas on <Configure>
+        canvas.create_rectangle(5, top, max(canvas.winfo_width(), 10) - 5, top + 60,
+                                fill='#1a1a2e', outline='', tags='row')
+        
         # Result Indicator
-        tk.Label(
-            item_frame,
-            text=result_text,
-            font=("Segoe UI", 14, "bold"),
-            bg='#1a1a2e',
-            fg=result_color,
-            width=3
-        ).pack(side=tk.LEFT, padx=(5, 0))
+        canvas.create_text(30, top + 30, text=result_text, fill=result_color,
+                           font=self._font(14, 'bold'))
         
         # Game Info
-        info_frame = tk.Frame(item_frame, bg='#1a1a2e')
-        info_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5, pady=5)
-        
-        tk.Label(
-            info_frame,
-            text=f"vs {opponent}",
-            font=("Segoe UI", 11, "bold"),
-            bg='#1a1a2e',
-            fg='white',
-            anchor='w'
-        ).pack(fill=tk.X)
-        
-        tk.Label(
-            info_frame,
-            text=date_str,
-            font=("Segoe UI", 9),
-            bg='#1a1a2e',
-            fg='#a0a0c0',
-            anchor='w'
-        ).pack(fill=tk.X)
+        canvas.create_text(60, top + 21, text=f"vs {opponent}", fill='white',
+                           font=self._font(11, 'bold'), anchor='w')
+        canvas.create_text(60, top + 41, text=date_str, fill='#a0a0c0',
+                           font=self._font(9), anchor='w')
     
     def start_two_player(self):
         """Start two-player game."""
@@ -325,7 +380,7 @@ class GameMenu:
         tk.Label(
             header,
             text="⚔️ Two Player Setup",
-            font=("Segoe UI", 20, "bold"),
+            font=self._font(20, 'bold'),
             bg='#1a1a2e',
             fg='white'
         ).pack(pady=25)
@@ -338,7 +393,7 @@ class GameMenu:
         tk.Label(
             frame,
             text="⚪ Player 1 (White):",
-            font=("Segoe UI", 12, "bold"),
+            font=self._font(12, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -346,7 +401,7 @@ class GameMenu:
         
         p1_entry = tk.Entry(
             frame,
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -361,7 +416,7 @@ class GameMenu:
         tk.Label(
             frame,
             text="⚫ Player 2 (Black):",
-            font=("Segoe UI", 12, "bold"),
+            font=self._font(12, 'bold'),
             bg='#0f0f1e',
             fg='#e0e0ff',
             anchor='w'
@@ -369,7 +424,7 @@ class GameMenu:
         
         p2_entry = tk.Entry(
             frame,
-            font=("Segoe UI", 12),
+            font=self._font(12),
             bg='#1a1a2e',
             fg='white',
             insertbackground='white',
@@ -384,7 +439,8 @@ class GameMenu:
             p1_name = p1_entry.get().strip() or "Player 1"
             p2_name = p2_entry.get().strip() or "Player 2"
             dialog.destroy()
-            self.root.destroy()
+            self.frame.destroy()
+            _RECENT_GAMES.clear()
             from ui.two_player_gui import TwoPlayerChessGUI
             TwoPlayerChessGUI(p1_name, p2_name).run()
         
@@ -402,45 +458,25 @@ class GameMenu:
     
     def start_ai_game(self):
         """Start game vs AI."""
-        self.root.destroy()
-        device = 'cuda' if torch.cuda.is_available() else 'cpu'
-        model = ChessNet().to(device)
-        
-        # Try to load checkpoint
-        checkpoint_dir = 'models/checkpoints'
-        if os.path.exists(checkpoint_dir):
-            checkpoints = [f for f in os.listdir(checkpoint_dir) if f.endswith('.pth')]
-            if checkpoints:
-                checkpoint_path = os.path.join(checkpoint_dir, sorted(checkpoints)[-1])
-                try:
-                    checkpoint = torch.load(checkpoint_path, map_location=device)
-                    model.load_state_dict(checkpoint['model_state_dict'])
-                    print(f"Loaded model from {checkpoint_path}")
-                except:
-                    print("Warning: Could not load checkpoint. Using untrained model.")
-        
-        model.eval()
+        self.frame.destroy()
+        # The game will add to the history, so the next menu queries it again
+        _RECENT_GAMES.clear()
+        model, device = preload_model().result()
         gui = ChessGUI(model, device=device, username=self.username)
         gui.run()
     
     def view_history(self):
         """View game history."""
-        self.root.destroy()
+        self.frame.destroy()
         from ui.game_history import GameHistoryGUI
         history = GameHistoryGUI(self.username)
         history.run()
     
     def logout(self):
         """Logout and return to login."""
-        self.root.destroy()
-        # Import here to avoid circular imports
-        import sys
-        import os
-        sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-        from ui.auth import AuthGUI
+        self.frame.destroy()
         
         def on_login_success(username):
-            from ui.game_menu import GameMenu
             menu = GameMenu(username)
             menu.run()
         
@@ -449,5 +485,5 @@ class GameMenu:
     
     def run(self):
         """Start the menu."""
-        self.root.mainloop()
+        run_root(self.root)
 
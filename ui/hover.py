@@ -0,0 +1,59 @@
+"""
+Hover highlighting for the Tkinter buttons
+Cached ttk button styles whose hover color is applied by Tk itself
+"""
+
+import weakref
+from tkinter import ttk
+
+# Button style names already configured, per root and style parameters
+_BUTTON_STYLES = weakref.WeakKeyDictionary()
+
+
+def modern_button_style(root, bg_color: str, hover_color: str, font, padding) -> str:
+    """
+    Get a ttk button style with bg_color turning to hover_color on hover.
+    
+    The hover color is a style map on the 'active' state, so Tk switches it
+    without running any Python callback. Each combination of colors, font
+    and padding is configured once per root and reused by later buttons.
+    The background can only be changed under the 'clam' theme, which is
+    selected for root if needed.
+    
+    Args:
+        root: Tk root the buttons belong to
+        bg_color: Background when the pointer is outside
+        hover_color: Background when the pointer is over the button
+        font: Font of the button text
+        padding: ttk padding, (horizontal, vertical) in pixels
+        
+    Returns:
+        Name of the style, for ttk.Button(style=...)
+    """
+    styles = _BUTTON_STYLES.setdefault(root, {})
+    key = (bg_color, hover_color, str(font), tuple(padding))
+    name = styles.get(key)
+    if name is not None:
+        return name
+    
+    style = ttk.Style(root)
+    if style.theme_use() != 'clam':
+        style.theme_use('clam')
+    name = f'Modern{len(styles)}.TButton'
+    style.configure(name,
+                    background=bg_color,
+                    foreground='white',
+                    font=font,
+                    padding=padding,
+                    borderwidth=0,
+                    relief='flat',
+                    focuscolor=bg_color,
+                    lightcolor=bg_color,
+                    darkcolor=bg_color)
+    style.map(name,
+              background=[('pressed', hover_color), ('active', hover_color)],
+              lightcolor=[('active', hover_color)],
+              darkcolor=[('active', hover_color)],
+              foreground=[('active', 'white')])
+    styles[key] = name
+    return name
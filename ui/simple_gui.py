@@ -8,9 +8,42 @@ from tkinter import messagebox, ttk
 import chess
 from engine.game import ChessGame
 from engine.mcts import MCTS
+from ui.background import run_in_background
+from ui.hover import modern_button_style
+from ui.window import run_root, screen_frame, shared_root, ui_font
 import config
 
 
+SQUARE_SIZE = 72  # Side of a board square on the canvas, in pixels
+
+# Base color of each (row, col): light squares soft cream, dark squares modern green
+_SQUARE_BG = tuple(
+    tuple('#ebecd0' if (row + col) % 2 == 0 else '#739552' for col in range(8))
+    for row in range(8)
+)
+
+# (row, col) of each square and square of each (row, col), indexed by
+# whether the board is flipped
+_SQUARE_COORDS = (
+    tuple((7 - square // 8, square % 8) for square in range(64)),
+    tuple((square // 8, 7 - square % 8) for square in range(64)),
+)
+_COORD_SQUARES = (
+    tuple(tuple((7 - row) * 8 + col for col in range(8)) for row in range(8)),
+    tuple(tuple(row * 8 + 7 - col for col in range(8)) for row in range(8)),
+)
+
+# Unicode glyph per (color, piece type)
+_PIECE_SYMBOLS = {
+    (chess.WHITE, chess.PAWN): '♙', (chess.BLACK, chess.PAWN): '♟',
+    (chess.WHITE, chess.ROOK): '♖', (chess.BLACK, chess.ROOK): '♜',
+    (chess.WHITE, chess.KNIGHT): '♘', (chess.BLACK, chess.KNIGHT): '♞',
+    (chess.WHITE, chess.BISHOP): '♗', (chess.BLACK, chess.BISHOP): '♝',
+    (chess.WHITE, chess.QUEEN): '♕', (chess.BLACK, chess.QUEEN): '♛',
+    (chess.WHITE, chess.KING): '♔', (chess.BLACK, chess.KING): '♚',
+}
+
+
 class ChessGUI:
     """Enhanced GUI for chess gameplay using Tkinter."""
     
@@ -26,24 +59,32 @@ class ChessGUI:
         self.model = model
         self.device = device
         self.username = username
-        self.mcts = MCTS(model, device=device, temperature=0.1)
+        self.mcts = MCTS(model, device=device, temperature=0.1, play_mode=True)
         self.game = ChessGame()
         self.selected_square = None
         self.human_plays_white = True
         self.last_move = None
         self.legal_moves_for_selected = []
         self.board_flipped = False
-        self.move_history = []
+        self._san_moves = []  # SAN of every ply played, for the move history and saving
+        self._ai_busy = False  # An AI search is running on the worker thread
+        self._legal_by_from = (None, {})  # (position key, from square -> legal moves)
+        self._redraw_pending = None  # after_idle job for the pending redraw, if any
+        self._history_dirty = False  # The pending redraw includes the move history
+        self._history_written = []  # History lines currently in history_text
+        self._promo_dialog = None  # Promotion dialog, built on first use
+        self._ai_after_id = None  # Pending after() job that starts the AI's move
         
         # Create main window with modern styling
-        self.root = tk.Tk()
+        self.root = shared_root()
+        self.frame = screen_frame(self.root)
         self.root.title("♔ NeuroChess - AI Challenge")
         self.root.geometry("1100x750")
         self.root.configure(bg='#0f0f1e')
         self.root.minsize(900, 650)
         
         # Main container with modern background
-        main_container = tk.Frame(self.root, bg='#0f0f1e')
+        main_container = tk.Frame(self.frame, bg='#0f0f1e')
         main_container.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
         
         # Left panel - Board with modern styling
@@ -62,7 +103,7 @@ class ChessGUI:
             label = tk.Label(
                 coord_top,
                 text=chr(97 + col),  # a-h
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=7
@@ -80,7 +121,7 @@ class ChessGUI:
             label = tk.Label(
                 coord_left,
                 text=str(8 - row),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=2,
@@ -100,7 +141,9 @@ class ChessGUI:
         self.board_frame.pack(side=tk.LEFT, padx=5, pady=5)
         
         # Create squares
-        self.squares = {}
+        self._rects = {}  # (row, col) -> canvas rectangle of the square
+        self._texts = {}  # (row, col) -> canvas text item of its piece
+        self._square_state = {}  # (row, col) -> (fill, text) last applied
         self.create_board()
         
         # Right coordinates (8-1) with modern styling
@@ -110,7 +153,7 @@ class ChessGUI:
             label = tk.Label(
                 coord_right,
                 text=str(8 - row),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=2,
@@ -126,7 +169,7 @@ class ChessGUI:
             label = tk.Label(
                 coord_bottom,
                 text=chr(97 + col),  # a-h
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=7
@@ -206,22 +249,10 @@ class ChessGUI:
         
         # Helper function for modern buttons
         def create_btn(text, command, bg='#6366f1', hover='#7c3aed'):
-            btn = tk.Button(
-                button_frame,
-                text=text,
-                command=command,
-                font=("Segoe UI", 11, "bold"),
-                bg=bg,
-                fg='white',
-                activebackground=hover,
-                relief=tk.FLAT,
-                cursor='hand2',
-                borderwidth=0,
-                pady=10
-            )
-            btn.bind("<Enter>", lambda e: btn.config(bg=hover))
-            btn.bind("<Leave>", lambda e: btn.config(bg=bg))
-            return btn
+            # Hover colors come from the style map, with no Python callbacks
+            style = modern_button_style(self.root, bg, hover, ("Segoe UI", 11, "bold"), (1, 10))
+            return ttk.Button(button_frame, text=text, command=command,
+                              style=style, cursor='hand2')
         
         self.new_game_btn = create_btn("🔄 New Game", self.new_game, '#6366f1', '#7c3aed')
         self.new_game_btn.pack(fill=tk.X, pady=5)
@@ -238,120 +269,93 @@ class ChessGUI:
         self.update_display()
     
     def create_board(self):
-        """Create the chess board GUI."""
+        """Create the chess board as items on a single canvas."""
+        self.canvas = tk.Canvas(
+            self.board_frame,
+            width=SQUARE_SIZE * 8,
+            height=SQUARE_SIZE * 8,
+            bg='#000000',
+            highlightthickness=0,
+            cursor='hand2'
+        )
+        self.canvas.pack()
+        
         for row in range(8):
             for col in range(8):
-                square = tk.Button(
-                    self.board_frame,
-                    width=7,
-                    height=3,
-                    font=("Arial", 24, "bold"),
-                    command=lambda r=row, c=col: self.on_square_click(r, c),
-                    relief=tk.FLAT,
-                    borderwidth=0,
-                    highlightthickness=0,
-                    cursor='hand2'
+                x, y = col * SQUARE_SIZE, row * SQUARE_SIZE
+                self._rects[(row, col)] = self.canvas.create_rectangle(
+                    x, y, x + SQUARE_SIZE, y + SQUARE_SIZE,
+                    fill=self.get_square_color(row, col),
+                    outline='#000000'
+                )
+                self._texts[(row, col)] = self.canvas.create_text(
+                    x + SQUARE_SIZE // 2, y + SQUARE_SIZE // 2,
+                    text='',
+                    font=ui_font(self.root, 24, 'bold', family="Arial")
                 )
-                square.grid(row=row, column=col, padx=1, pady=1, sticky='nsew')
-                self.squares[(row, col)] = square
         
-        # Configure grid weights for proper sizing
-        for i in range(8):
-            self.board_frame.grid_rowconfigure(i, weight=1, uniform='square')
-            self.board_frame.grid_columnconfigure(i, weight=1, uniform='square')
+        # One binding for the whole board; the square is found from the position
+        self.canvas.bind('<Button-1>', self._on_board_click)
+    
+    def _on_board_click(self, event):
+        """Translate a click on the canvas into on_square_click for its square."""
+        row, col = event.y // SQUARE_SIZE, event.x // SQUARE_SIZE
+        if 0 <= row < 8 and 0 <= col < 8:
+            self.on_square_click(row, col)
     
     def square_to_coords(self, square: int) -> tuple:
         """Convert chess square index to (row, col)."""
-        if self.board_flipped:
-            row = square // 8
-            col = 7 - (square % 8)
-        else:
-            row = 7 - (square // 8)
-            col = square % 8
-        return (row, col)
+        return _SQUARE_COORDS[self.board_flipped][square]
     
     def coords_to_square(self, row: int, col: int) -> int:
         """Convert (row, col) to chess square index."""
-        if self.board_flipped:
-            square = row * 8 + (7 - col)
-        else:
-            square = (7 - row) * 8 + col
-        return square
+        return _COORD_SQUARES[self.board_flipped][row][col]
     
     def get_piece_symbol(self, piece: chess.Piece) -> str:
         """Get Unicode symbol for a chess piece."""
-        symbols = {
-            chess.PAWN: '♟' if piece.color == chess.BLACK else '♙',
-            chess.ROOK: '♜' if piece.color == chess.BLACK else '♖',
-            chess.KNIGHT: '♞' if piece.color == chess.BLACK else '♘',
-            chess.BISHOP: '♝' if piece.color == chess.BLACK else '♗',
-            chess.QUEEN: '♛' if piece.color == chess.BLACK else '♕',
-            chess.KING: '♚' if piece.color == chess.BLACK else '♔',
-        }
-        return symbols.get(piece.piece_type, '')
+        return _PIECE_SYMBOLS[piece.color, piece.piece_type]
     
     def get_square_color(self, row: int, col: int) -> str:
         """Get modern base color for a square."""
-        if (row + col) % 2 == 0:
-            return '#ebecd0'  # Light square - soft cream
-        else:
-            return '#739552'  # Dark square - modern green
+        return _SQUARE_BG[row][col]
     
     def update_display(self):
         """Update the board display."""
         board = self.game.get_board()
         
-        # Reset all squares
-        for row in range(8):
-            for col in range(8):
-                square_idx = self.coords_to_square(row, col)
-                square = self.squares[(row, col)]
-                
-                # Base color - ensure all squares are visible with borders
-                base_color = self.get_square_color(row, col)
-                square.config(
-                    bg=base_color, 
-                    activebackground=base_color,
-                    relief=tk.RAISED,
-                    borderwidth=2,
-                    highlightthickness=1,
-                    highlightbackground='#000000',
-                    highlightcolor='#000000'
-                )
-                
-                # Highlight last move
-                if self.last_move:
-                    from_row, from_col = self.square_to_coords(self.last_move.from_square)
-                    to_row, to_col = self.square_to_coords(self.last_move.to_square)
-                    if (row, col) == (from_row, from_col) or (row, col) == (to_row, to_col):
-                        square.config(bg='#baca44')  # Highlighted yellow-green for last move
-                
-                # Highlight selected square
-                if self.selected_square is not None:
-                    sel_row, sel_col = self.square_to_coords(self.selected_square)
-                    if (row, col) == (sel_row, sel_col):
-                        square.config(bg='#f6f669')  # Bright yellow for selected
-                
-                # Highlight legal moves
-                if self.selected_square is not None and square_idx in [m.to_square for m in self.legal_moves_for_selected]:
-                    if (row, col) != (sel_row, sel_col):
-                        # Highlight legal move destinations
-                        square.config(bg='#a8d5ba')  # Soft mint green for legal moves
-                
-                # Highlight king in check
-                if board.is_check():
-                    king_square = board.king(board.turn)
-                    if king_square is not None:
-                        king_row, king_col = self.square_to_coords(king_square)
-                        if (row, col) == (king_row, king_col):
-                            square.config(bg='#ff5252')  # Bright red for check
-                
-                # Add piece
-                piece = board.piece_at(square_idx)
-                if piece:
-                    square.config(text=self.get_piece_symbol(piece))
-                else:
-                    square.config(text='')
+        # Highlighted squares, in increasing priority
+        highlights = {}
+        if self.last_move:
+            highlights[self.last_move.from_square] = '#baca44'  # Highlighted yellow-green for last move
+            highlights[self.last_move.to_square] = '#baca44'
+        if self.selected_square is not None:
+            for move in self.legal_moves_for_selected:
+                highlights[move.to_square] = '#a8d5ba'  # Soft mint green for legal moves
+            highlights[self.selected_square] = '#f6f669'  # Bright yellow for selected
+        if board.is_check():
+            king_square = board.king(board.turn)
+            if king_square is not None:
+                highlights[king_square] = '#ff5252'  # Bright red for check
+        
+        # Glyph of every occupied square, read off the twelve piece bitboards
+        # rather than calling board.piece_at for each of the 64 squares
+        glyphs = {}
+        for (color, piece_type), glyph in _PIECE_SYMBOLS.items():
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                glyphs[square] = glyph
+        
+        # Reconfigure only the canvas items whose color or piece changed
+        coord_squares = _COORD_SQUARES[self.board_flipped]
+        for (row, col), rect in self._rects.items():
+            square_idx = coord_squares[row][col]
+            fill, text = state = (highlights.get(square_idx, _SQUARE_BG[row][col]),
+                                  glyphs.get(square_idx, ''))
+            old = self._square_state.get((row, col), (None, None))
+            if fill != old[0]:
+                self.canvas.itemconfig(rect, fill=fill)
+            if text != old[1]:
+                self.canvas.itemconfig(self._texts[(row, col)], text=text)
+            self._square_state[(row, col)] = state
         
         # Update status and win banner
         status_text = ""
@@ -397,16 +401,38 @@ class ChessGUI:
             elif board.is_stalemate():
                 status_text = "Stalemate - Draw!"
         
+        if self._ai_busy:
+            status_text = "AI is thinking..."
         self.status_label.config(text=status_text)
     
     def show_promotion_dialog(self) -> chess.PieceType:
         """Show modern dialog to choose promotion piece."""
-        dialog = tk.Toplevel(self.root)
+        if self._promo_dialog is None:
+            self._build_promotion_dialog()
+        dialog = self._promo_dialog
+        
+        # The dialog is built once and only hidden between promotions
+        self._promo_choice.set(0)
+        dialog.deiconify()
+        dialog.lift()
+        dialog.grab_set()
+        dialog.wait_variable(self._promo_choice)
+        dialog.grab_release()
+        dialog.withdraw()
+        return self._promo_choice.get() or chess.QUEEN
+    
+    def _build_promotion_dialog(self):
+        """Create the promotion dialog, hidden until show_promotion_dialog."""
+        # A child of the screen's frame, so it goes away with the game screen
+        dialog = tk.Toplevel(self.frame)
+        dialog.withdraw()
         dialog.title("Pawn Promotion")
         dialog.geometry("350x280")
         dialog.configure(bg='#0f0f1e')
         dialog.transient(self.root)
-        dialog.grab_set()
+        # Closing the window picks a queen, as before
+        dialog.protocol('WM_DELETE_WINDOW', lambda: self._set_promotion_choice(chess.QUEEN))
+        self._promo_choice = tk.IntVar(dialog, 0)
         
         # Header
         header = tk.Frame(dialog, bg='#1a1a2e', height=70)
@@ -433,8 +459,6 @@ class ChessGUI:
             fg='#a0a0c0'
         ).pack(pady=(0, 15))
         
-        choice = [None]
-        
         button_frame = tk.Frame(content, bg='#0f0f1e')
         button_frame.pack(fill=tk.X)
         
@@ -446,34 +470,24 @@ class ChessGUI:
         ]
         
         def create_promo_btn(piece_type, label):
-            btn = tk.Button(
+            style = modern_button_style(self.root, '#6366f1', '#7c3aed', ("Segoe UI", 11, "bold"), (1, 8))
+            return ttk.Button(
                 button_frame,
                 text=label,
-                font=("Segoe UI", 11, "bold"),
-                bg='#6366f1',
-                fg='white',
-                activebackground='#7c3aed',
-                relief=tk.FLAT,
+                style=style,
                 cursor='hand2',
-                borderwidth=0,
-                pady=8,
-                command=lambda pt=piece_type: self._set_promotion_choice(dialog, choice, pt)
+                command=lambda pt=piece_type: self._set_promotion_choice(pt)
             )
-            btn.bind("<Enter>", lambda e: btn.config(bg='#7c3aed'))
-            btn.bind("<Leave>", lambda e: btn.config(bg='#6366f1'))
-            return btn
         
         for piece_type, label in pieces:
             btn = create_promo_btn(piece_type, label)
             btn.pack(fill=tk.X, pady=3)
         
-        dialog.wait_window()
-        return choice[0] if choice[0] else chess.QUEEN
+        self._promo_dialog = dialog
     
-    def _set_promotion_choice(self, dialog, choice, piece_type):
+    def _set_promotion_choice(self, piece_type):
         """Helper for promotion dialog."""
-        choice[0] = piece_type
-        dialog.destroy()
+        self._promo_choice.set(piece_type)
     
     def on_square_click(self, row: int, col: int):
         """Handle square click."""
@@ -494,10 +508,8 @@ class ChessGUI:
             if piece and piece.color == board.turn:
                 self.selected_square = square_idx
                 # Get legal moves for this piece
-                self.legal_moves_for_selected = [
-                    m for m in board.legal_moves if m.from_square == square_idx
-                ]
-                self.update_display()
+                self.legal_moves_for_selected = self._legal_from(square_idx)
+                self._schedule_redraw()
         else:
             # Try to make move
             move = None
@@ -506,7 +518,7 @@ class ChessGUI:
             if square_idx == self.selected_square:
                 self.selected_square = None
                 self.legal_moves_for_selected = []
-                self.update_display()
+                self._schedule_redraw()
                 return
             
             # Find the move
@@ -515,10 +527,9 @@ class ChessGUI:
                     move = legal_move
                     break
             
-            # Check for promotion
-            if move and board.piece_at(self.selected_square) and \
-               board.piece_at(self.selected_square).piece_type == chess.PAWN and \
-               (square_idx // 8 == 0 or square_idx // 8 == 7):
+            # Check for promotion: pawn moves to the last rank are generated
+            # with a promotion piece, so the move found already tells
+            if move and move.promotion is not None:
                 # Need promotion
                 promotion_piece = self.show_promotion_dialog()
                 move = chess.Move(self.selected_square, square_idx, promotion=promotion_piece)
@@ -526,24 +537,14 @@ class ChessGUI:
             if move and move in board.legal_moves:
                 # Get move notation before making the move
                 move_san = board.san(move)
-                is_white_move = board.turn == chess.WHITE
                 
                 self.game.make_move(move)
+                self._san_moves.append(move_san)
                 self.last_move = move
                 self.selected_square = None
                 self.legal_moves_for_selected = []
                 
-                # Add to move history
-                if is_white_move:  # White just moved
-                    self.move_history.append(f"{len(self.move_history) + 1}. {move_san}")
-                else:  # Black just moved
-                    if self.move_history and '.' in self.move_history[-1] and '...' not in self.move_history[-1]:
-                        self.move_history[-1] += f" {move_san}"
-                    else:
-                        self.move_history.append(f"{len(self.move_history) + 1}... {move_san}")
-                
-                self.update_history_display()
-                self.update_display()
+                self._schedule_redraw(history=True)
                 
                 # Check if game is over
                 if self.game.is_game_over():
@@ -551,30 +552,99 @@ class ChessGUI:
                 else:
                     # Auto-make AI move if it's AI's turn
                     if (board.turn == chess.WHITE) != self.human_plays_white:
-                        self.root.after(500, self.make_ai_move)
+                        self._schedule_ai()
             else:
                 # Invalid move or clicked different piece - select new piece
                 piece = board.piece_at(square_idx)
                 if piece and piece.color == board.turn:
                     self.selected_square = square_idx
-                    self.legal_moves_for_selected = [
-                        m for m in board.legal_moves if m.from_square == square_idx
-                    ]
+                    self.legal_moves_for_selected = self._legal_from(square_idx)
                 else:
                     self.selected_square = None
                     self.legal_moves_for_selected = []
-                self.update_display()
+                self._schedule_redraw()
+    
+    def _legal_from(self, square: int) -> list:
+        """Legal moves from square, generated once per position for all squares."""
+        board = self.game.get_board()
+        key = board._transposition_key()
+        if self._legal_by_from[0] != key:
+            by_from = {}
+            for move in board.legal_moves:
+                by_from.setdefault(move.from_square, []).append(move)
+            self._legal_by_from = (key, by_from)
+        return self._legal_by_from[1].get(square, [])
+    
+    def _schedule_redraw(self, history: bool = False):
+        """
+        Redraw the board, and the move history if asked, once Tk is idle.
+        
+        State changes made in one event, such as a move followed by the
+        game-over check, then share a single redraw.
+        
+        Args:
+            history: Whether the move history changed as well
+        """
+        self._history_dirty = self._history_dirty or history
+        if self._redraw_pending is None:
+            self._redraw_pending = self.root.after_idle(self._do_redraw)
+    
+    def _do_redraw(self):
+        """Apply the redraw requested through _schedule_redraw."""
+        self._redraw_pending = None
+        # The user may have left the game before Tk became idle
+        if not self.frame.winfo_exists():
+            return
+        if self._history_dirty:
+            self._history_dirty = False
+            self.update_history_display()
+        self.update_display()
+    
+    def _history_lines(self) -> list:
+        """Move history lines ("1. e4 e5"), formatted from the SAN of each ply."""
+        plies = self._san_moves
+        return [f"{i // 2 + 1}. " + " ".join(plies[i:i + 2]) for i in range(0, len(plies), 2)]
     
     def update_history_display(self):
-        """Update the move history display."""
-        self.history_text.delete(1.0, tk.END)
-        for move in self.move_history:
-            self.history_text.insert(tk.END, move + "\n")
+        """Update the move history display, rewriting only the lines that changed."""
+        written = self._history_written
+        lines = self._history_lines()
+        # Usually only the last line changes (black's reply) or one is appended
+        first = 0
+        for old, new in zip(written, lines):
+            if old != new:
+                break
+            first += 1
+        if first == len(written) == len(lines):
+            return
+        
+        self.history_text.delete(f"{first + 1}.0", tk.END)
+        if first < len(lines):
+            self.history_text.insert(tk.END, "".join(line + "\n" for line in lines[first:]))
+        self._history_written = lines
         self.history_text.see(tk.END)
     
+    def _schedule_ai(self, delay_ms: int = 500):
+        """Start the AI's move after delay_ms, replacing any start already pending."""
+        self._cancel_scheduled_ai()
+        self._ai_after_id = self.root.after(delay_ms, self._run_scheduled_ai)
+    
+    def _cancel_scheduled_ai(self):
+        """Drop a pending start of the AI's move, if any."""
+        if self._ai_after_id is not None:
+            self.root.after_cancel(self._ai_after_id)
+            self._ai_after_id = None
+    
+    def _run_scheduled_ai(self):
+        """Run the AI's move scheduled by _schedule_ai."""
+        self._ai_after_id = None
+        # The user may have left the game during the delay
+        if self.frame.winfo_exists():
+            self.make_ai_move()
+    
     def make_ai_move(self):
-        """Make AI move."""
-        if self.game.is_game_over():
+        """Start the AI's search on a worker thread; the move is played when it finishes."""
+        if self._ai_busy or self.game.is_game_over():
             return
         
         board = self.game.get_board()
@@ -583,9 +653,35 @@ class ChessGUI:
             return
         
         self.status_label.config(text="AI is thinking...")
-        self.root.update()
+        self._ai_busy = True
+        self.ai_move_btn.config(state=tk.DISABLED)
         
-        move, _ = self.mcts.search(self.game)
+        # The search gets its own copy, as the game may be reset or undone meanwhile
+        snapshot = self.game.copy()
+        
+        def on_done(result, error):
+            self._ai_busy = False
+            # The user may have left the game while the AI was thinking
+            if not self.frame.winfo_exists():
+                return
+            self.ai_move_btn.config(state=tk.NORMAL)
+            if error is not None:
+                print(f"Warning: AI search failed ({error})")
+                self._schedule_redraw()
+                return
+            self._apply_ai_move(snapshot, result[0])
+        
+        # Tk keeps servicing events while the network evaluates positions
+        run_in_background(self.root, lambda: self.mcts.search(snapshot), on_done)
+    
+    def _apply_ai_move(self, snapshot, move):
+        """Play the move found by a search of snapshot, if the game is still there."""
+        board = self.game.get_board()
+        if board.fen() != snapshot.get_fen():
+            # New game or undo while the AI was thinking: the move is stale
+            self._schedule_redraw()
+            self.make_ai_move()
+            return
         
         if move is None:
             messagebox.showinfo("Game Over", "AI has no legal moves!")
@@ -593,80 +689,60 @@ class ChessGUI:
         
         # Get move notation before making the move
         move_san = board.san(move)
-        is_white_move = board.turn == chess.WHITE
         
         self.game.make_move(move)
+        self._san_moves.append(move_san)
         self.last_move = move
         
-        # Add to move history
-        if is_white_move:  # White (AI) just moved
-            self.move_history.append(f"{len(self.move_history) + 1}. {move_san}")
-        else:  # Black (AI) just moved
-            if self.move_history and '.' in self.move_history[-1] and '...' not in self.move_history[-1]:
-                self.move_history[-1] += f" {move_san}"
-            else:
-                self.move_history.append(f"{len(self.move_history) + 1}... {move_san}")
-        
-        self.update_history_display()
-        self.update_display()
+        self._schedule_redraw(history=True)
         
         if self.game.is_game_over():
             self.show_game_over()
     
     def new_game(self):
         """Start a new game."""
+        self._cancel_scheduled_ai()
+        if self._ai_busy:
+            # Its result is for the old game; let the search end early
+            self.mcts.stop()
         self.game = ChessGame()
         self.selected_square = None
         self.last_move = None
         self.legal_moves_for_selected = []
-        self.move_history = []
+        self._san_moves = []
         self.win_banner.pack_forget()  # Hide win banner
-        self.update_history_display()
-        self.update_display()
+        self._schedule_redraw(history=True)
     
     def undo_move(self):
         """Undo the last move."""
         board = self.game.get_board()
         if len(board.move_stack) == 0:
             return
+        self._cancel_scheduled_ai()
+        if self._ai_busy:
+            # Its result is for the position being undone; let the search end early
+            self.mcts.stop()
         
         # Undo one move
         board.pop()
-        
-        # Update move history
-        if len(self.move_history) > 0:
-            last_move = self.move_history[-1]
-            # If it's a black move (has ...), remove it
-            if '...' in last_move:
-                self.move_history.pop()
-            # If it's a white move, check if it has black's move too
-            elif ' ' in last_move and '.' in last_move:
-                # Has both moves, remove black's part
-                parts = last_move.split(' ', 1)
-                if len(parts) == 2:
-                    self.move_history[-1] = parts[0]
-                else:
-                    self.move_history.pop()
-            else:
-                self.move_history.pop()
+        if self._san_moves:
+            self._san_moves.pop()
         
         self.selected_square = None
         self.legal_moves_for_selected = []
         self.last_move = board.peek() if len(board.move_stack) > 0 else None
-        self.update_history_display()
-        self.update_display()
+        self._schedule_redraw(history=True)
     
     def flip_board(self):
         """Flip the board view."""
         self.board_flipped = not self.board_flipped
         self.selected_square = None
         self.legal_moves_for_selected = []
-        self.update_display()
+        self._schedule_redraw()
     
     def show_game_over(self):
         """Show game over message and save to database."""
         result = self.game.get_board().result()
-        board = self.game.get_board()
         
         # Determine winner
         winner = None
@@ -690,8 +766,8 @@ class ChessGUI:
             connection = db.get_connection()
             cursor = connection.cursor()
             
-            # Get move list as string
-            moves_str = ' '.join([board.san(move) for move in board.move_stack])
+            # Move list as string, from the SAN recorded as the moves were played
+            moves_str = ' '.join(self._san_moves)
             
             # Determine player names
             player1 = self.username if self.human_plays_white else "AI"
@@ -721,4 +797,4 @@ class ChessGUI:
     
     def run(self):
         """Start the GUI."""
-        self.root.mainloop()
+        run_root(self.root)
@@ -3,9 +3,41 @@ Two-player chess GUI with modern design - play with a friend
 """
 
 import tkinter as tk
-from tkinter import messagebox
+from tkinter import messagebox, ttk
 import chess
 from engine.game import ChessGame
+from ui.background import run_in_background
+from ui.hover import modern_button_style
+from ui.window import run_root, screen_frame, shared_root, ui_font
+
+SQUARE_SIZE = 72  # Side of a board square on the canvas, in pixels
+
+# Base color of each (row, col): light squares soft cream, dark squares modern green
+_SQUARE_BG = tuple(
+    tuple('#ebecd0' if (row + col) % 2 == 0 else '#739552' for col in range(8))
+    for row in range(8)
+)
+
+# (row, col) of each square and square of each (row, col), indexed by
+# whether the board is flipped
+_SQUARE_COORDS = (
+    tuple((7 - square // 8, square % 8) for square in range(64)),
+    tuple((square // 8, 7 - square % 8) for square in range(64)),
+)
+_COORD_SQUARES = (
+    tuple(tuple((7 - row) * 8 + col for col in range(8)) for row in range(8)),
+    tuple(tuple(row * 8 + 7 - col for col in range(8)) for row in range(8)),
+)
+
+# Unicode glyph per (color, piece type)
+_PIECE_SYMBOLS = {
+    (chess.WHITE, chess.PAWN): '♙', (chess.BLACK, chess.PAWN): '♟',
+    (chess.WHITE, chess.ROOK): '♖', (chess.BLACK, chess.ROOK): '♜',
+    (chess.WHITE, chess.KNIGHT): '♘', (chess.BLACK, chess.KNIGHT): '♞',
+    (chess.WHITE, chess.BISHOP): '♗', (chess.BLACK, chess.BISHOP): '♝',
+    (chess.WHITE, chess.QUEEN): '♕', (chess.BLACK, chess.QUEEN): '♛',
+    (chess.WHITE, chess.KING): '♔', (chess.BLACK, chess.KING): '♚',
+}
 
 
 class TwoPlayerChessGUI:
@@ -26,17 +58,25 @@ class TwoPlayerChessGUI:
         self.last_move = None
         self.legal_moves_for_selected = []
         self.board_flipped = False
-        self.move_history = []
+        self._san_moves = []  # SAN of every ply played, for the move history and saving
+        self._redraw_pending = None  # after_idle job for the pending redraw, if any
+        self._history_dirty = False  # The pending redraw includes the move history
+        self._history_written = []  # History lines currently in history_text
+        self._legal_by_from = (None, {})  # (position key, from square -> legal moves)
+        self._promo_dialog = None  # Promotion dialog, built on first use
+        self._label_turn = None  # Side whose player label is currently highlighted
+        self._banner_shown = False  # The win banner is packed
         
         # Create main window with modern styling
-        self.root = tk.Tk()
+        self.root = shared_root()
+        self.frame = screen_frame(self.root)
         self.root.title("♔ NeuroChess - Two Player Mode")
         self.root.geometry("1100x750")
         self.root.configure(bg='#0f0f1e')
         self.root.minsize(900, 650)
         
         # Main container with modern background
-        main_container = tk.Frame(self.root, bg='#0f0f1e')
+        main_container = tk.Frame(self.frame, bg='#0f0f1e')
         main_container.pack(fill=tk.BOTH, expand=True, padx=15, pady=15)
         
         # Left panel - Board with modern styling
@@ -55,7 +95,7 @@ class TwoPlayerChessGUI:
             label = tk.Label(
                 coord_top,
                 text=chr(97 + col),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=7
@@ -73,7 +113,7 @@ class TwoPlayerChessGUI:
             label = tk.Label(
                 coord_left,
                 text=str(8 - row),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=2,
@@ -93,7 +133,9 @@ class TwoPlayerChessGUI:
         self.board_frame.pack(side=tk.LEFT, padx=5, pady=5)
         
         # Create squares
-        self.squares = {}
+        self._rects = {}  # (row, col) -> canvas rectangle of the square
+        self._texts = {}  # (row, col) -> canvas text item of its piece
+        self._square_state = {}  # (row, col) -> (fill, text) last applied
         self.create_board()
         
         # Right coordinates (8-1) with modern styling
@@ -103,7 +145,7 @@ class TwoPlayerChessGUI:
             label = tk.Label(
                 coord_right,
                 text=str(8 - row),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=2,
@@ -119,7 +161,7 @@ class TwoPlayerChessGUI:
             label = tk.Label(
                 coord_bottom,
                 text=chr(97 + col),
-                font=("Segoe UI", 11, "bold"),
+                font=ui_font(self.root, 11, 'bold'),
                 bg='#1a1a2e',
                 fg='#a0a0c0',
                 width=7
@@ -225,22 +267,10 @@ class TwoPlayerChessGUI:
         
         # Helper function for modern buttons
         def create_btn(text, command, bg='#6366f1', hover='#7c3aed'):
-            btn = tk.Button(
-                button_frame,
-                text=text,
-                command=command,
-                font=("Segoe UI", 11, "bold"),
-                bg=bg,
-                fg='white',
-                activebackground=hover,
-                relief=tk.FLAT,
-                cursor='hand2',
-                borderwidth=0,
-                pady=10
-            )
-            btn.bind("<Enter>", lambda e: btn.config(bg=hover))
-            btn.bind("<Leave>", lambda e: btn.config(bg=bg))
-            return btn
+            # Hover colors come from the style map, with no Python callbacks
+            style = modern_button_style(self.root, bg, hover, ("Segoe UI", 11, "bold"), (1, 10))
+            return ttk.Button(button_frame, text=text, command=command,
+                              style=style, cursor='hand2')
         
         self.new_game_btn = create_btn("🔄 New Game", self.new_game, '#6366f1', '#7c3aed')
         self.new_game_btn.pack(fill=tk.X, pady=5)
@@ -257,127 +287,118 @@ class TwoPlayerChessGUI:
         self.update_display()
     
     def create_board(self):
-        """Create the chess board GUI."""
+        """Create the chess board as items on a single canvas."""
+        self.canvas = tk.Canvas(
+            self.board_frame,
+            width=SQUARE_SIZE * 8,
+            height=SQUARE_SIZE * 8,
+            bg='#000000',
+            highlightthickness=0,
+            cursor='hand2'
+        )
+        self.canvas.pack()
+        
         for row in range(8):
             for col in range(8):
-                square = tk.Button(
-                    self.board_frame,
-                    width=7,
-                    height=3,
-                    font=("Arial", 24, "bold"),
-                    command=lambda r=row, c=col: self.on_square_click(r, c),
-                    relief=tk.FLAT,
-                    borderwidth=0,
-                    highlightthickness=0,
-                    cursor='hand2'
+                x, y = col * SQUARE_SIZE, row * SQUARE_SIZE
+                self._rects[(row, col)] = self.canvas.create_rectangle(
+                    x, y, x + SQUARE_SIZE, y + SQUARE_SIZE,
+                    fill=self.get_square_color(row, col),
+                    outline='#000000'
+                )
+                self._texts[(row, col)] = self.canvas.create_text(
+                    x + SQUARE_SIZE // 2, y + SQUARE_SIZE // 2,
+                    text='',
+                    font=ui_font(self.root, 24, 'bold', family="Arial")
                 )
-                square.grid(row=row, column=col, padx=1, pady=1, sticky='nsew')
-                self.squares[(row, col)] = square
         
-        # Configure grid weights for proper sizing
-        for i in range(8):
-            self.board_frame.grid_rowconfigure(i, weight=1, uniform='square')
-            self.board_frame.grid_columnconfigure(i, weight=1, uniform='square')
+        # One binding for the whole board; the square is found from the position
+        self.canvas.bind('<Button-1>', self._on_board_click)
+    
+    def _on_board_click(self, event):
+        """Translate a click on the canvas into on_square_click for its square."""
+        row, col = event.y // SQUARE_SIZE, event.x // SQUARE_SIZE
+        if 0 <= row < 8 and 0 <= col < 8:
+            self.on_square_click(row, col)
     
     def square_to_coords(self, square: int) -> tuple:
         """Convert chess square index to (row, col)."""
-        if self.board_flipped:
-            row = square // 8
-            col = 7 - (square % 8)
-        else:
-            row = 7 - (square // 8)
-            col = square % 8
-        return (row, col)
+        return _SQUARE_COORDS[self.board_flipped][square]
     
     def coords_to_square(self, row: int, col: int) -> int:
         """Convert (row, col) to chess square index."""
-        if self.board_flipped:
-            square = row * 8 + (7 - col)
-        else:
-            square = (7 - row) * 8 + col
-        return square
+        return _COORD_SQUARES[self.board_flipped][row][col]
     
     def get_piece_symbol(self, piece: chess.Piece) -> str:
         """Get Unicode symbol for a chess piece."""
-        symbols = {
-            chess.PAWN: '♟' if piece.color == chess.BLACK else '♙',
-            chess.ROOK: '♜' if piece.color == chess.BLACK else '♖',
-            chess.KNIGHT: '♞' if piece.color == chess.BLACK else '♘',
-            chess.BISHOP: '♝' if piece.color == chess.BLACK else '♗',
-            chess.QUEEN: '♛' if piece.color == chess.BLACK else '♕',
-            chess.KING: '♚' if piece.color == chess.BLACK else '♔',
-        }
-        return symbols.get(piece.piece_type, '')
+        return _PIECE_SYMBOLS[piece.color, piece.piece_type]
     
     def get_square_color(self, row: int, col: int) -> str:
         """Get modern base color for a square."""
-        if (row + col) % 2 == 0:
-            return '#ebecd0'  # Light square - soft cream
-        else:
-            return '#739552'  # Dark square - modern green
+        return _SQUARE_BG[row][col]
     
     def update_display(self):
         """Update the board display."""
         board = self.game.get_board()
         
-        # Update player labels with modern highlighting
-        if board.turn == chess.WHITE:
-            self.white_player_label.config(fg='#6ef1ff', font=("Segoe UI", 14, "bold"))
-            self.black_player_label.config(fg='#a0a0c0', font=("Segoe UI", 13))
-        else:
-            self.white_player_label.config(fg='#a0a0c0', font=("Segoe UI", 13))
-            self.black_player_label.config(fg='#6ef1ff', font=("Segoe UI", 14, "bold"))
-        
-        # Reset all squares
-        for row in range(8):
-            for col in range(8):
-                square_idx = self.coords_to_square(row, col)
-                square = self.squares[(row, col)]
-                
-                base_color = self.get_square_color(row, col)
-                square.config(
-                    bg=base_color,
-                    activebackground=base_color,
-                    relief=tk.RAISED,
-                    borderwidth=2,
-                    highlightthickness=1,
-                    highlightbackground='#000000',
-                    highlightcolor='#000000'
-                )
-                
-                # Highlight last move
-                if self.last_move:
-                    from_row, from_col = self.square_to_coords(self.last_move.from_square)
-                    to_row, to_col = self.square_to_coords(self.last_move.to_square)
-                    if (row, col) == (from_row, from_col) or (row, col) == (to_row, to_col):
-                        square.config(bg='#baca44')  # Highlighted yellow-green for last move
-                
-                # Highlight selected square
-                if self.selected_square is not None:
-                    sel_row, sel_col = self.square_to_coords(self.selected_square)
-                    if (row, col) == (sel_row, sel_col):
-                        square.config(bg='#f6f669')  # Bright yellow for selected
-                
-                # Highlight legal moves
-                if self.selected_square is not None and square_idx in [m.to_square for m in self.legal_moves_for_selected]:
-                    sel_row, sel_col = self.square_to_coords(self.selected_square)
-                    if (row, col) != (sel_row, sel_col):
-                        square.config(bg='#a8d5ba')  # Soft mint green for legal moves
-                
-                # Highlight king in check
-                if board.is_check():
-                    king_square = board.king(board.turn)
-                    if king_square is not None:
-                        king_row, king_col = self.square_to_coords(king_square)
-                        if (row, col) == (king_row, king_col):
-                            square.config(bg='#ff5252')  # Bright red for check
-                
-                # Add piece
-                piece = board.piece_at(square_idx)
-                if piece:
-                    square.config(text=self.get_piece_symbol(piece))
-                else:
-                    square.config(text='')
+        # Update player labels with modern highlighting, only when the turn changed
+        if board.turn != self._label_turn:
+            self._label_turn = board.turn
+            active = ui_font(self.root, 14, 'bold')
+            idle = ui_font(self.root, 13)
+            if board.turn == chess.WHITE:
+                self.white_player_label.config(fg='#6ef1ff', font=active)
+                self.black_player_label.config(fg='#a0a0c0', font=idle)
+            else:
+                self.white_player_label.config(fg='#a0a0c0', font=idle)
+                self.black_player_label.config(fg='#6ef1ff', font=active)
+        
+        # Work out the highlighted squares once, not again for every square
+        in_check = board.is_check()
+        check_sq = board.king(board.turn) if in_check else None
+        # Last-move and legal-target squares as bitboards, tested with a shift and a mask
+        last_mask = 0
+        if self.last_move:
+            last_mask = chess.BB_SQUARES[self.last_move.from_square] | chess.BB_SQUARES[self.last_move.to_square]
+        legal_mask = 0
+        for m in self.legal_moves_for_selected:
+            legal_mask |= chess.BB_SQUARES[m.to_square]
+        
+        # Glyph of every occupied square, read off the twelve piece bitboards
+        # rather than calling board.piece_at for each of the 64 squares
+        glyphs = {}
+        for (color, piece_type), glyph in _PIECE_SYMBOLS.items():
+            for square in chess.scan_forward(board.pieces_mask(piece_type, color)):
+                glyphs[square] = glyph
+        
+        # Reconfigure only the canvas items whose color or piece changed
+        coord_squares = _COORD_SQUARES[self.board_flipped]
+        for (row, col), rect in self._rects.items():
+            square_idx = coord_squares[row][col]
+            bg = _SQUARE_BG[row][col]
+            
+            # Highlight last move
+            if last_mask >> square_idx & 1:
+                bg = '#baca44'  # Highlighted yellow-green for last move
+            
+            # Highlight selected square
+            if square_idx == self.selected_square:
+                bg = '#f6f669'  # Bright yellow for selected
+            # Highlight legal moves
+            elif legal_mask >> square_idx & 1:
+                bg = '#a8d5ba'  # Soft mint green for legal moves
+            
+            # Highlight king in check
+            if square_idx == check_sq:
+                bg = '#ff5252'  # Bright red for check
+            
+            text = glyphs.get(square_idx, '')
+            old = self._square_state.get((row, col), (None, None))
+            if bg != old[0]:
+                self.canvas.itemconfig(rect, fill=bg)
+            if text != old[1]:
+                self.canvas.itemconfig(self._texts[(row, col)], text=text)
+            self._square_state[(row, col)] = (bg, text)
         
         # Update status
         status_text = ""
@@ -399,10 +420,16 @@ class TwoPlayerChessGUI:
                 win_color = '#888888'
                 text_color = '#ffffff'
             
-            self.win_banner.config(text=win_text, bg=win_color, fg=text_color)
-            self.win_banner.pack(fill=tk.X, pady=5)
+            # Pack the banner only when the game has just ended; repacking
+            # lays out the whole right panel again
+            if not self._banner_shown:
+                self.win_banner.config(text=win_text, bg=win_color, fg=text_color)
+                self.win_banner.pack(fill=tk.X, pady=5)
+                self._banner_shown = True
         else:
-            self.win_banner.pack_forget()
+            if self._banner_shown:
+                self.win_banner.pack_forget()
+                self._banner_shown = False
             turn = self.player1_name if board.turn == chess.WHITE else self.player2_name
             status_text = f"{turn} to move"
             
@@ -417,12 +444,32 @@ class TwoPlayerChessGUI:
     
     def show_promotion_dialog(self) -> chess.PieceType:
         """Show modern dialog to choose promotion piece."""
-        dialog = tk.Toplevel(self.root)
+        if self._promo_dialog is None:
+            self._build_promotion_dialog()
+        dialog = self._promo_dialog
+        
+        # The dialog is built once and only hidden between promotions
+        self._promo_choice.set(0)
+        dialog.deiconify()
+        dialog.lift()
+        dialog.grab_set()
+        dialog.wait_variable(self._promo_choice)
+        dialog.grab_release()
+        dialog.withdraw()
+        return self._promo_choice.get() or chess.QUEEN
+    
+    def _build_promotion_dialog(self):
+        """Create the promotion dialog, hidden until show_promotion_dialog."""
+        # A child of the screen's frame, so it goes away with the game screen
+        dialog = tk.Toplevel(self.frame)
+        dialog.withdraw()
         dialog.title("Pawn Promotion")
         dialog.geometry("350x280")
         dialog.configure(bg='#0f0f1e')
         dialog.transient(self.root)
-        dialog.grab_set()
+        # Closing the window picks a queen, as before
+        dialog.protocol('WM_DELETE_WINDOW', lambda: self._set_promotion_choice(chess.QUEEN))
+        self._promo_choice = tk.IntVar(dialog, 0)
         
         # Header
         header = tk.Frame(dialog, bg='#1a1a2e', height=70)
@@ -449,7 +496,6 @@ class TwoPlayerChessGUI:
             fg='#a0a0c0'
         ).pack(pady=(0, 15))
         
-        choice = [None]
         button_frame = tk.Frame(content, bg='#0f0f1e')
         button_frame.pack(fill=tk.X)
         
@@ -461,34 +507,24 @@ class TwoPlayerChessGUI:
         ]
         
         def create_promo_btn(piece_type, label):
-            btn = tk.Button(
+            style = modern_button_style(self.root, '#6366f1', '#7c3aed', ("Segoe UI", 11, "bold"), (1, 8))
+            return ttk.Button(
                 button_frame,
                 text=label,
-                font=("Segoe UI", 11, "bold"),
-                bg='#6366f1',
-                fg='white',
-                activebackground='#7c3aed',
-                relief=tk.FLAT,
+                style=style,
                 cursor='hand2',
-                borderwidth=0,
-                pady=8,
-                command=lambda pt=piece_type: self._set_promotion_choice(dialog, choice, pt)
+                command=lambda pt=piece_type: self._set_promotion_choice(pt)
             )
-            btn.bind("<Enter>", lambda e: btn.config(bg='#7c3aed'))
-            btn.bind("<Leave>", lambda e: btn.config(bg='#6366f1'))
-            return btn
         
         for piece_type, label in pieces:
             btn = create_promo_btn(piece_type, label)
             btn.pack(fill=tk.X, pady=3)
         
-        dialog.wait_window()
-        return choice[0] if choice[0] else chess.QUEEN
+        self._promo_dialog = dialog
     
-    def _set_promotion_choice(self, dialog, choice, piece_type):
+    def _set_promotion_choice(self, piece_type):
         """Helper for promotion dialog."""
-        choice[0] = piece_type
-        dialog.destroy()
+        self._promo_choice.set(piece_type)
     
     def on_square_click(self, row: int, col: int):
         """Handle square click."""
@@ -502,17 +538,15 @@ class TwoPlayerChessGUI:
             piece = board.piece_at(square_idx)
             if piece and piece.color == board.turn:
                 self.selected_square = square_idx
-                self.legal_moves_for_selected = [
-                    m for m in board.legal_moves if m.from_square == square_idx
-                ]
-                self.update_display()
+                self.legal_moves_for_selected = self._legal_from(square_idx)
+                self._schedule_redraw()
         else:
             move = None
             
             if square_idx == self.selected_square:
                 self.selected_square = None
                 self.legal_moves_for_selected = []
-                self.update_display()
+                self._schedule_redraw()
                 return
             
             for legal_move in self.legal_moves_for_selected:
@@ -520,31 +554,26 @@ class TwoPlayerChessGUI:
                     move = legal_move
                     break
             
-            if move and board.piece_at(self.selected_square) and \
-               board.piece_at(self.selected_square).piece_type == chess.PAWN and \
-               (square_idx // 8 == 0 or square_idx // 8 == 7):
+            # Pawn moves to the last rank are generated with a promotion piece,
+            # so the move found already tells whether one must be chosen. Each
+            # piece is a legal move of its own, so the chosen one is among them.
+            if move and move.promotion is not None:
                 promotion_piece = self.show_promotion_dialog()
-                move = chess.Move(self.selected_square, square_idx, promotion=promotion_piece)
+                move = next(m for m in self.legal_moves_for_selected
+                            if m.to_square == square_idx and m.promotion == promotion_piece)
             
-            if move and move in board.legal_moves:
+            # The candidates were generated for this position (the selection is
+            # cleared whenever it changes), so they need no legality check
+            if move:
                 move_san = board.san(move)
-                is_white_move = board.turn == chess.WHITE
                 
                 self.game.make_move(move)
+                self._san_moves.append(move_san)
                 self.last_move = move
                 self.selected_square = None
                 self.legal_moves_for_selected = []
                 
-                if is_white_move:
-                    self.move_history.append(f"{len(self.move_history) + 1}. {move_san}")
-                else:
-                    if self.move_history and '.' in self.move_history[-1] and '...' not in self.move_history[-1]:
-                        self.move_history[-1] += f" {move_san}"
-                    else:
-                        self.move_history.append(f"{len(self.move_history) + 1}... {move_san}")
-                
-                self.update_history_display()
-                self.update_display()
+                self._schedule_redraw(history=True)
                 
                 if self.game.is_game_over():
                     self.show_game_over()
@@ -552,19 +581,70 @@ class TwoPlayerChessGUI:
                 piece = board.piece_at(square_idx)
                 if piece and piece.color == board.turn:
                     self.selected_square = square_idx
-                    self.legal_moves_for_selected = [
-                        m for m in board.legal_moves if m.from_square == square_idx
-                    ]
+                    self.legal_moves_for_selected = self._legal_from(square_idx)
                 else:
                     self.selected_square = None
                     self.legal_moves_for_selected = []
-                self.update_display()
+                self._schedule_redraw()
+    
+    def _legal_from(self, square: int) -> list:
+        """Legal moves from square, generated once per position for all squares."""
+        board = self.game.get_board()
+        key = board._transposition_key()
+        if self._legal_by_from[0] != key:
+            by_from = {}
+            for move in board.legal_moves:
+                by_from.setdefault(move.from_square, []).append(move)
+            self._legal_by_from = (key, by_from)
+        return self._legal_by_from[1].get(square, [])
+    
+    def _schedule_redraw(self, history: bool = False):
+        """
+        Redraw the board, and the move history if asked, once Tk is idle.
+        
+        State changes made in one event, such as a move followed by the
+        game-over check, then share a single redraw.
+        
+        Args:
+            history: Whether the move history changed as well
+        """
+        self._history_dirty = self._history_dirty or history
+        if self._redraw_pending is None:
+            self._redraw_pending = self.root.after_idle(self._do_redraw)
+    
+    def _do_redraw(self):
+        """Apply the redraw requested through _schedule_redraw."""
+        self._redraw_pending = None
+        # The players may have left the game before Tk became idle
+        if not self.frame.winfo_exists():
+            return
+        if self._history_dirty:
+            self._history_dirty = False
+            self.update_history_display()
+        self.update_display()
+    
+    def _history_lines(self) -> list:
+        """Move history lines ("1. e4 e5"), formatted from the SAN of each ply."""
+        plies = self._san_moves
+        return [f"{i // 2 + 1}. " + " ".join(plies[i:i + 2]) for i in range(0, len(plies), 2)]
     
     def update_history_display(self):
-        """Update the move history display."""
-        self.history_text.delete(1.0, tk.END)
-        for move in self.move_history:
-            self.history_text.insert(tk.END, move + "\n")
+        """Update the move history display, rewriting only the lines that changed."""
+        written = self._history_written
+        lines = self._history_lines()
+        # Usually only the last line changes (black's reply) or one is appended
+        first = 0
+        for old, new in zip(written, lines):
+            if old != new:
+                break
+            first += 1
+        if first == len(written) == len(lines):
+            return
+        
+        self.history_text.delete(f"{first + 1}.0", tk.END)
+        if first < len(lines):
+            self.history_text.insert(tk.END, "".join(line + "\n" for line in lines[first:]))
+        self._history_written = lines
         self.history_text.see(tk.END)
     
     def new_game(self):
@@ -573,10 +653,8 @@ class TwoPlayerChessGUI:
         self.selected_square = None
         self.last_move = None
         self.legal_moves_for_selected = []
-        self.move_history = []
-        self.win_banner.pack_forget()
-        self.update_history_display()
-        self.update_display()
+        self._san_moves = []
+        self._schedule_redraw(history=True)
     
     def undo_move(self):
         """Undo the last move."""
@@ -585,38 +663,24 @@ class TwoPlayerChessGUI:
             return
         
         board.pop()
-        
-        if len(self.move_history) > 0:
-            last_move = self.move_history[-1]
-            if '...' in last_move:
-                self.move_history.pop()
-            elif ' ' in last_move and '.' in last_move:
-                parts = last_move.split(' ', 1)
-                if len(parts) == 2:
-                    self.move_history[-1] = parts[0]
-                else:
-                    self.move_history.pop()
-            else:
-                self.move_history.pop()
+        if self._san_moves:
+            self._san_moves.pop()
         
         self.selected_square = None
         self.legal_moves_for_selected = []
         self.last_move = board.peek() if len(board.move_stack) > 0 else None
-        self.win_banner.pack_forget()
-        self.update_history_display()
-        self.update_display()
+        self._schedule_redraw(history=True)
     
     def flip_board(self):
         """Flip the board view."""
         self.board_flipped = not self.board_flipped
         self.selected_square = None
         self.legal_moves_for_selected = []
-        self.update_display()
+        self._schedule_redraw()
     
     def show_game_over(self):
         """Show game over message and save to database."""
         result = self.game.get_board().result()
-        board = self.game.get_board()
         
         # Determine winner
         winner = None
@@ -633,50 +697,32 @@ class TwoPlayerChessGUI:
             result_str = 'draw'
             messagebox.showinfo("Game Over", "It's a draw!")
         
-        # Save game to database
-        try:
+        # Save game to database in the background, so the board stays responsive
+        stats = []
+        for player, opponent in ((self.player1_name, self.player2_name),
+                                 (self.player2_name, self.player1_name)):
+            if player != 'Guest':
+                # (wins, losses, draws, username); a win takes precedence, as
+                # both players may have the same name
+                won = winner == player
+                stats.append((int(won), int(winner == opponent and not won),
+                              int(winner is None), player))
+        moves_str = ' '.join(self._san_moves)
+        
+        def save():
             from ui.database import get_database
-            db = get_database()
-            connection = db.get_connection()
-            cursor = connection.cursor()
-            
-            # Get move list as string
-            moves_str = ' '.join([board.san(move) for move in board.move_stack])
-            
-            # Insert game record
-            cursor.execute("""
-                INSERT INTO game_history (player1_username, player2_username, winner, result, moves)
-                VALUES (%s, %s, %s, %s, %s)
-            """, (self.player1_name, self.player2_name, winner, result_str, moves_str))
-            
-            connection.commit()
-            cursor.close()
-            
-            # Update user stats if not guest
-            from ui.auth import AuthSystem
-            auth = AuthSystem()
-            
-            if self.player1_name != 'Guest':
-                if winner == self.player1_name:
-                    auth.update_user_stats(self.player1_name, won=True)
-                elif winner == self.player2_name:
-                    auth.update_user_stats(self.player1_name, lost=True)
-                else:
-                    auth.update_user_stats(self.player1_name, draw=True)
-            
-            if self.player2_name != 'Guest':
-                if winner == self.player2_name:
-                    auth.update_user_stats(self.player2_name, won=True)
-                elif winner == self.player1_name:
-                    auth.update_user_stats(self.player2_name, lost=True)
-                else:
-                    auth.update_user_stats(self.player2_name, draw=True)
-        except Exception as e:
-            print(f"Error saving game: {e}")
+            get_database().record_game(self.player1_name, self.player2_name,
+                                       winner, result_str, moves_str, stats)
+        
+        def on_done(_, error):
+            if error is not None:
+                print(f"Error saving game: {error}")
+        
+        run_in_background(self.root, save, on_done)
     
     def back_to_menu(self):
         """Return to game menu."""
-        self.root.destroy()
+        self.frame.destroy()
         # Import here to avoid circular imports
         from ui.game_menu import GameMenu
         menu = GameMenu(self.player1_name)
@@ -684,5 +730,5 @@ class TwoPlayerChessGUI:
     
     def run(self):
         """Start the GUI."""
-        self.root.mainloop()
+        run_root(self.root)
 
@@ -5,28 +5,395 @@ Serves the modern web interface and provides API endpoints for the chess engine
 
 import os
 import json
+import queue
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
-from http.server import HTTPServer, SimpleHTTPRequestHandler
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
 from urllib.parse import urlparse, parse_qs
 import threading
+import config
+
+# orjson encodes and decodes in C, straight to and from bytes
+try:
+    import orjson
+    
+    def json_dumps(data) -> bytes:
+        return orjson.dumps(data)
+    
+    json_loads = orjson.loads
+except ImportError:
+    def json_dumps(data) -> bytes:
+        return json.dumps(data).encode('utf-8')
+    
+    def json_loads(data):
+        # json takes bytes but not a memoryview; bytes() of bytes is no copy
+        return json.loads(bytes(data))
 
 # Try to import the chess engine components
 try:
     from engine.game import ChessGame
-    from engine.mcts import MCTS
-    from engine.neural_net import ChessNet
-    import torch
+    from engine.mcts import MCTS, SharedTranspositionTable
+    from engine.neural_net import load_play_model
+    from engine.utils import checkpoint_key, latest_checkpoint
+    import numpy as np
     import chess
     CHESS_ENGINE_AVAILABLE = True
 except ImportError:
     CHESS_ENGINE_AVAILABLE = False
     print("Warning: Chess engine not available. Running in demo mode.")
 
+# Board position of each square as sent to the web UI (row 0 is rank 8);
+# the dicts are only ever read, so responses share them
+_SQUARE_POSITIONS = tuple({'row': 7 - square // 8, 'col': square % 8} for square in range(64))
+
+# Demo mode answers never change, so they are encoded once
+_DEMO_AI_MOVE = json_dumps({
+    'success': True,
+    'move': {'from': {'row': 1, 'col': 0}, 'to': {'row': 3, 'col': 0}},
+    'demo': True
+})
+_DEMO_VALIDATE_MOVE = json_dumps({'success': True, 'legal': True, 'demo': True})
+
+
+class InferenceBatcher:
+    """
+    Evaluate the positions of all running searches in shared forward passes.
+    
+    Stands in for the model in MCTS, like OnnxChessNet: predict_legal and
+    predict_legal_batch queue their positions and wait. One worker thread
+    joins whatever the concurrent searches have queued into a single call
+    of the wrapped model, which is therefore only ever used from that
+    thread.
+    """
+    
+    def __init__(self, model, device: str = 'cpu', window: float = None, max_batch: int = None):
+        """
+        Start the worker thread.
+        
+        Args:
+            model: ChessNet (or compatible) doing the evaluations
+            device: Device the model runs on
+            window: Seconds a batch waits for positions from the other
+                running searches; a lone search never waits
+            max_batch: Most positions per model call
+        """
+        self.model = model
+        self.device = device
+        self.window = window if window is not None else config.WEB_CONFIG['batch_window']
+        self.max_batch = max_batch or config.WEB_CONFIG['max_batch']
+        # Evaluations of model, shared by all searches so positions seen in
+        # earlier requests (or other games) skip the network
+        self.table = SharedTranspositionTable(config.MCTS_CONFIG['tt_size'])
+        self._queue = queue.Queue()
+        self._searches = 0  # Searches running through this batcher
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+    
+    @contextmanager
+    def searching(self):
+        """Count a search as running while the block executes, so batches wait for it."""
+        with self._lock:
+            self._searches += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._searches -= 1
+    
+    def predict_legal(self, board_tensor, legal_indices, device: str = 'cpu'):
+        """Predict priors over the legal moves and value for a single board position."""
+        priors, values = self.predict_legal_batch(board_tensor[np.newaxis], [legal_indices], device)
+        return priors[0], float(values[0])
+    
+    def predict_legal_batch(self, board_tensors, legal_indices, device: str = 'cpu'):
+        """
+        Predict priors over the legal moves and values for a batch of positions.
+        
+        Blocks until the worker has evaluated the batch, together with those
+        of other searches. The caller's arrays are read by the worker, which
+        is safe because the caller waits.
+        
+        Args:
+            board_tensors: numpy array of shape (batch_size, 18, 8, 8)
+            legal_indices: One array of legal move policy indices per position
+            device: Ignored; the batcher's device is used
+            
+        Returns:
+            priors: List of arrays, each aligned with its legal_indices entry
+            values: numpy array of shape (batch_size,)
+        """
+        future = Future()
+        self._queue.put((board_tensors, legal_indices, future))
+        return future.result()
+    
+    def _gather(self) -> list:
+        """Wait for queued batches and collect those arriving within the window."""
+        pending = [self._queue.get()]
+        size = len(pending[0][0])
+        deadline = time.monotonic() + self.window
+        # Wait only while some other running search has nothing queued yet
+        while size < self.max_batch:
+            try:
+                if len(pending) < self._searches:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                else:
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            pending.append(item)
+            size += len(item[0])
+        return pending
+    
+    def _run(self):
+        """Worker loop: evaluate gathered batches and hand each caller its slice."""
+        while True:
+            pending = self._gather()
+            try:
+                tensors = np.concatenate([tensors for tensors, _, _ in pending])
+                legal = [idxs for _, batch_legal, _ in pending for idxs in batch_legal]
+                priors, values = self.model.predict_legal_batch(tensors, legal, self.device)
+            except Exception as e:
+                for _, _, future in pending:
+                    future.set_exception(e)
+                continue
+            start = 0
+            for tensors, _, future in pending:
+                end = start + len(tensors)
+                future.set_result((priors[start:end], values[start:end]))
+                start = end
+
+
+# Checkpoint directory mtime, time of the scan and the newest checkpoint it found
+_CHECKPOINT_SCAN = (None, 0.0, None)
+CHECKPOINT_RESCAN_SECONDS = 10.0  # Longest a scan is trusted while the directory looks unchanged
+
+# Model per device as ((checkpoint path, mtime), model), kept between requests
+_MODEL_CACHE = {}
+_MODEL_LOCK = threading.Lock()
+
+# Batcher per device, sharing the forward passes of concurrent searches
+_BATCHERS = {}
+_BATCHERS_LOCK = threading.Lock()
+
+# AI-move searches run on a bounded pool, so a burst of requests queues
+# rather than oversubscribing the CPU; connection threads only do I/O
+_SEARCH_POOL = ThreadPoolExecutor(max_workers=config.WEB_CONFIG['search_workers'],
+                                  thread_name_prefix='search')
+
+# Search and position kept for each game in progress, least recently used
+# first, as game id -> (expiry time, MCTS, ChessGame)
+_SESSIONS = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
+
+# Search of each search-pool thread, reused by one-off searches
+_SEARCH_LOCAL = threading.local()
+
+
+def newest_checkpoint(checkpoint_dir):
+    """
+    Newest checkpoint in checkpoint_dir, rescanning mostly when the directory changed.
+    
+    Adding, removing or renaming a file changes the directory's mtime, so a
+    single stat usually replaces the scan with a stat per file. Overwriting
+    an existing checkpoint in place leaves the directory's mtime alone, so
+    the scan is also repeated once it is CHECKPOINT_RESCAN_SECONDS old; an
+    older file rewritten to become the newest is picked up within that time.
+    
+    Args:
+        checkpoint_dir: Directory holding the .pth checkpoints
+        
+    Returns:
+        Path to the newest checkpoint, or None if there is none
+    """
+    global _CHECKPOINT_SCAN
+    try:
+        dir_mtime = os.stat(checkpoint_dir).st_mtime_ns
+    except OSError:
+        return None
+    scanned_mtime, scanned_at, checkpoint = _CHECKPOINT_SCAN
+    now = time.monotonic()
+    if dir_mtime != scanned_mtime or now - scanned_at > CHECKPOINT_RESCAN_SECONDS:
+        checkpoint = latest_checkpoint(checkpoint_dir)
+        # One tuple, so concurrent requests never pair a path with another scan's mtime
+        _CHECKPOINT_SCAN = (dir_mtime, now, checkpoint)
+    return checkpoint
+
+
+def get_model(device: str = 'cpu'):
+    """
+    Get the model for AI moves on device, loaded once per checkpoint.
+    
+    The newest checkpoint is looked up on every call, through the directory
+    mtime, but its weights are only read when it differs, by path or mtime,
+    from the one in memory.
+    On CPU the model is quantized to int8 if configured, as for desktop games;
+    otherwise its inference forward pass is compiled with torch.compile.
+    
+    Args:
+        device: Device to run the model on
+        
+    Returns:
+        ChessNet in eval mode on device (int8 on CPU if configured, else compiled)
+    """
+    checkpoint_dir = Path(__file__).parent.parent / 'models' / 'checkpoints'
+    key = checkpoint_key(newest_checkpoint(checkpoint_dir))
+    with _MODEL_LOCK:
+        cached = _MODEL_CACHE.get(device)
+        if cached is None or cached[0] != key:
+            model, quantized = load_play_model(key[0], device)
+            if not quantized:
+                # Compiled on its first forward pass, which warm_up runs before serving
+                model.compile_for_inference()
+            cached = _MODEL_CACHE[device] = (key, model)
+        return cached[1]
+
+
+def get_batcher(device: str = 'cpu') -> InferenceBatcher:
+    """
+    Get the batcher evaluating AI moves on device, with the newest weights.
+    
+    Args:
+        device: Device to run the model on
+        
+    Returns:
+        InferenceBatcher for device
+    """
+    with _BATCHERS_LOCK:
+        # Looked up under the lock, so a request holding older weights can
+        # never swap them back in after another request installed newer ones
+        model = get_model(device)
+        batcher = _BATCHERS.get(device)
+        if batcher is None:
+            batcher = _BATCHERS[device] = InferenceBatcher(model, device)
+        elif batcher.model is not model:
+            # Searches already running pick up new weights with their next batch;
+            # evaluations by the old weights are dropped
+            batcher.model = model
+            batcher.table = SharedTranspositionTable(config.MCTS_CONFIG['tt_size'])
+        return batcher
+
+
+def checkout_session(game_id, batcher: InferenceBatcher):
+    """
+    Take the search and board kept for a game out of the session store.
+    
+    A game's session is removed while in use, so two requests for the same
+    game never share a tree or board; hand it back with checkin_session.
+    A kept search evaluated by older weights is replaced by a new one.
+    
+    Args:
+        game_id: Id from /api/new-game, or None for a one-off search
+        batcher: Batcher the search evaluates through
+        
+    Returns:
+        (MCTS, ChessGame or None if no position was kept) for the game;
+        (None, None) for a one-off search, which uses thread_search
+    """
+    now = time.monotonic()
+    with _SESSIONS_LOCK:
+        # Drop the games nobody has asked about for a while
+        while _SESSIONS and next(iter(_SESSIONS.values()))[0] < now:
+            _SESSIONS.popitem(last=False)
+        entry = _SESSIONS.pop(game_id, None) if game_id else None
+    if not game_id:
+        return None, None
+    game = entry[2] if entry is not None else None
+    if entry is not None and entry[1].transposition_table is batcher.table:
+        return entry[1], game
+    mcts = MCTS(batcher, device=batcher.device, temperature=0.1, play_mode=True,
+                transposition_table=batcher.table)
+    return mcts, game
+
+
+def thread_search(batcher: InferenceBatcher):
+    """
+    Search kept by the calling thread, for requests without a game.
+    
+    Each search-pool thread builds its own MCTS once and reuses it, rather
+    than every one-off request constructing one. The tree left by an
+    earlier request is only reused if it stands for the searched position.
+    
+    Args:
+        batcher: Batcher the search evaluates through
+        
+    Returns:
+        The thread's MCTS, evaluating through batcher
+    """
+    mcts = getattr(_SEARCH_LOCAL, 'mcts', None)
+    if mcts is None or mcts.transposition_table is not batcher.table:
+        mcts = _SEARCH_LOCAL.mcts = MCTS(batcher, device=batcher.device, temperature=0.1,
+                                         play_mode=True, transposition_table=batcher.table)
+    return mcts
+
+
+def checkin_session(game_id, mcts, game):
+    """
+    Keep a game's search and position for its next request.
+    
+    Args:
+        game_id: Id from /api/new-game
+        mcts: Search returned by checkout_session
+        game: Game at the position the client will be in
+    """
+    expiry = time.monotonic() + config.WEB_CONFIG['session_ttl']
+    with _SESSIONS_LOCK:
+        _SESSIONS[game_id] = (expiry, mcts, game)
+
+
+def session_board(game_id):
+    """
+    Copy of the position kept for a game, if there is one.
+    
+    Args:
+        game_id: Id from /api/new-game
+        
+    Returns:
+        chess.Board without move stack, or None
+    """
+    with _SESSIONS_LOCK:
+        entry = _SESSIONS.get(game_id) if game_id else None
+        if entry is None or entry[2] is None:
+            return None
+        return entry[2].board.copy(stack=False)
+
+
+def warm_up(device: str = 'cpu', passes: int = 3):
+    """
+    Load the model and run a few throwaway evaluations before serving.
+    
+    The first forward passes pay for lazy initialization (kernel selection,
+    buffer allocation and, when enabled, compilation). Each batch size MCTS
+    uses is run, so the first player's move does not pay for it.
+    
+    Args:
+        device: Device the model runs on
+        passes: Evaluations per batch size
+    """
+    model = get_model(device)
+    legal = np.arange(20)
+    for batch_size in sorted({1, config.MCTS_CONFIG['batch_size']}):
+        boards = np.zeros((batch_size, 18, 8, 8), dtype=np.uint8)
+        for _ in range(passes):
+            model.predict_legal_batch(boards, [legal] * batch_size, device)
+
 
 class NeuroChessHandler(SimpleHTTPRequestHandler):
     """Custom HTTP handler for NeuroChess web interface"""
     
+    # Keep-alive: a browser reuses its connection for the following requests,
+    # which works because every response states its Content-Length
+    protocol_version = "HTTP/1.1"
+    
+    # POST bodies up to this size are read into a buffer reused by the connection
+    BODY_BUFFER_SIZE = 8192
+    
     def __init__(self, *args, **kwargs):
+        # Before super().__init__, which serves the whole connection
+        self._body_buf = bytearray(self.BODY_BUFFER_SIZE)
         # Set the directory to serve files from
         self.directory = str(Path(__file__).parent / 'web')
         super().__init__(*args, directory=self.directory, **kwargs)
@@ -41,14 +408,23 @@ class NeuroChessHandler(SimpleHTTPRequestHandler):
         
         return super().do_GET()
     
+    def copyfile(self, source, outputfile):
+        """Send a static file with sendfile, so its bytes never pass through Python"""
+        self.connection.sendfile(source)
+    
     def do_POST(self):
         """Handle POST requests for API endpoints"""
         parsed_path = urlparse(self.path)
         content_length = int(self.headers.get('Content-Length', 0))
-        body = self.rfile.read(content_length).decode('utf-8') if content_length > 0 else '{}'
+        if 0 < content_length <= len(self._body_buf):
+            body = memoryview(self._body_buf)[:content_length]
+            body = body[:self.rfile.readinto(body)]
+        else:
+            body = self.rfile.read(content_length) if content_length > 0 else b''
         
+        # Both decoders take the body as read; orjson's error is a JSONDecodeError too
         try:
-            data = json.loads(body) if body else {}
+            data = json_loads(body) if body else {}
         except json.JSONDecodeError:
             self.send_error(400, "Invalid JSON")
             return
@@ -64,52 +440,76 @@ class NeuroChessHandler(SimpleHTTPRequestHandler):
             self.send_error(404, "Endpoint not found")
     
     def handle_ai_move(self, data):
-        """Get AI move using MCTS"""
+        """
+        Get AI move using MCTS.
+        
+        With the game_id given by /api/new-game, the game's search tree and
+        position are kept between requests. The player's reply can then be
+        sent as last_move (UCI) without a board: it is played on the kept
+        position, and the search starts from the matching subtree. If there
+        is no kept position for it to be played on, the request fails and
+        the board has to be sent again.
+        """
         if not CHESS_ENGINE_AVAILABLE:
-            # Return a random legal move in demo mode
-            response = {
-                'success': True,
-                'move': {'from': {'row': 1, 'col': 0}, 'to': {'row': 3, 'col': 0}},
-                'demo': True
-            }
-            self.send_json_response(response)
+            # Return a fixed move in demo mode
+            self.send_json_bytes(_DEMO_AI_MOVE)
             return
         
         try:
-            # Get board state from request
-            board_fen = data.get('board', chess.STARTING_FEN)
-            
-            # Create game and MCTS
-            game = ChessGame()
-            game.board = chess.Board(board_fen)
-            
-            # Load model if available
-            model = None
+            # Evaluations go through the shared batcher, together with those
+            # of the other games being searched at the same time
             device = 'cpu'
+            batcher = get_batcher(device)
             
-            # Try to load the latest checkpoint
-            checkpoint_dir = Path(__file__).parent.parent / 'models' / 'checkpoints'
-            if checkpoint_dir.exists():
-                checkpoints = list(checkpoint_dir.glob('*.pth'))
-                if checkpoints:
-                    latest_checkpoint = max(checkpoints, key=lambda p: p.stat().st_mtime)
-                    model = ChessNet()
-                    model.load_state_dict(torch.load(latest_checkpoint, map_location=device))
-                    model.eval()
-            
-            if model is None:
-                model = ChessNet()
-            
-            # Get AI move
-            mcts = MCTS(model, device=device, temperature=0.1)
-            move, _ = mcts.search(game)
+            game_id = data.get('game_id')
+            last_move = chess.Move.from_uci(data['last_move']) if data.get('last_move') else None
+            mcts, game = checkout_session(game_id, batcher)
+            # What goes back to the session if the request fails, so a
+            # rejected move or failed search does not lose the game
+            kept = (mcts, game)
+            played = False
+            try:
+                if game is None and 'board' not in data and last_move is not None:
+                    # The reply cannot be played without the position it answers
+                    raise ValueError("Game session expired, resend board")
+                if game is None or 'board' in data:
+                    # Get board state from request
+                    game = ChessGame()
+                    game.board = chess.Board(data.get('board', chess.STARTING_FEN))
+                elif last_move is not None:
+                    # Play the reply on the kept position instead of parsing a FEN
+                    if not game.make_move(last_move):
+                        raise ValueError(f"Illegal move: {last_move.uci()}")
+                    played = True
+                
+                # Get AI move
+                def run_search():
+                    search = mcts or thread_search(batcher)
+                    with batcher.searching():
+                        return search.search(game, last_move=last_move)
+                
+                move, _ = _SEARCH_POOL.submit(run_search).result()
+                if game_id and move:
+                    # The client plays the move, so the kept tree and board follow it
+                    mcts.advance_root(move)
+                    game.make_move(move)
+                kept = (mcts, game)
+            except Exception:
+                if played:
+                    # The client will resend its reply, so take it back
+                    game.board.pop()
+                    game.move_history.pop()
+                raise
+            finally:
+                if game_id and kept[1] is not None:
+                    checkin_session(game_id, *kept)
             
             if move:
                 response = {
                     'success': True,
                     'move': {
-                        'from': {'row': 7 - (move.from_square // 8), 'col': move.from_square % 8},
-                        'to': {'row': 7 - (move.to_square // 8), 'col': move.to_square % 8},
+                        'from': _SQUARE_POSITIONS[move.from_square],
+                        'to': _SQUARE_POSITIONS[move.to_square],
                         'uci': move.uci()
                     }
                 }
@@ -124,14 +524,16 @@ class NeuroChessHandler(SimpleHTTPRequestHandler):
         """Validate if a move is legal"""
         if not CHESS_ENGINE_AVAILABLE:
             # In demo mode, accept all moves
-            self.send_json_response({'success': True, 'legal': True, 'demo': True})
+            self.send_json_bytes(_DEMO_VALIDATE_MOVE)
             return
         
         try:
-            board_fen = data.get('board', chess.STARTING_FEN)
             move_uci = data.get('move')
             
-            board = chess.Board(board_fen)
+            # A game's kept position saves parsing the FEN
+            board = session_board(data.get('game_id')) if 'board' not in data else None
+            if board is None:
+                board = chess.Board(data.get('board', chess.STARTING_FEN))
             move = chess.Move.from_uci(move_uci)
             
             is_legal = move in board.legal_moves
@@ -149,20 +551,26 @@ class NeuroChessHandler(SimpleHTTPRequestHandler):
             self.send_json_response({'success': False, 'error': str(e)})
     
     def handle_new_game(self, data):
-        """Start a new game"""
+        """Start a new game, with an id that keeps its search tree between AI moves"""
         response = {
             'success': True,
-            'board': chess.STARTING_FEN if CHESS_ENGINE_AVAILABLE else None
+            'board': chess.STARTING_FEN if CHESS_ENGINE_AVAILABLE else None,
+            'game_id': uuid.uuid4().hex
         }
         self.send_json_response(response)
     
     def send_json_response(self, data):
         """Send JSON response"""
+        self.send_json_bytes(json_dumps(data))
+    
+    def send_json_bytes(self, payload: bytes):
+        """Send an already encoded JSON response"""
         self.send_response(200)
         self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
         self.send_header('Access-Control-Allow-Origin', '*')
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(payload)
     
     def log_message(self, format, *args):
         """Custom log message format"""
@@ -172,7 +580,15 @@ class NeuroChessHandler(SimpleHTTPRequestHandler):
 def run_server(port=8000, host='localhost'):
     """Run the web server"""
     server_address = (host, port)
-    httpd = HTTPServer(server_address, NeuroChessHandler)
+    if CHESS_ENGINE_AVAILABLE:
+        print("Warming up the chess engine...")
+        try:
+            warm_up()
+        except Exception as e:
+            print(f"Warning: Engine warm-up failed ({e}). The first move will be slower.")
+    
+    # A thread per request, so searches for several games run (and batch) together
+    httpd = ThreadingHTTPServer(server_address, NeuroChessHandler)
     
     print(f"""
 ╔═══════════════════════════════════════════════════════════╗
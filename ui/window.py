@@ -0,0 +1,106 @@
+"""
+Shared main window for the Tkinter interfaces
+Screens build inside a frame of one long-lived Tk root instead of each
+creating, and later destroying, a Tk interpreter of their own
+"""
+
+import tkinter as tk
+import weakref
+from tkinter import font as tkfont
+
+_root = None
+_running = False
+
+# Fonts already created, per root and (size, weight, slant, family)
+_FONTS = weakref.WeakKeyDictionary()
+
+
+def shared_root() -> tk.Tk:
+    """
+    Get the application's Tk root, creating it on first use.
+    
+    A new root is created only if there is none yet or the previous one
+    was closed by the user.
+    
+    Returns:
+        The shared tk.Tk instance
+    """
+    global _root
+    if _root is not None:
+        try:
+            _root.winfo_exists()
+        except tk.TclError:
+            _root = None
+    if _root is None:
+        _root = tk.Tk()
+    return _root
+
+
+def screen_frame(root: tk.Tk, bg: str = '#0f0f1e') -> tk.Frame:
+    """
+    Create the frame holding one screen's widgets and show it in root.
+    
+    Switching screens destroys this frame, leaving the root and its
+    interpreter, fonts and ttk styles in place. Size limits set by the
+    previous screen are reset, so create the frame before configuring the
+    window.
+    
+    Args:
+        root: The shared Tk root
+        bg: Background color of the screen
+        
+    Returns:
+        Packed tk.Frame filling the window
+    """
+    root.minsize(1, 1)
+    root.resizable(True, True)
+    frame = tk.Frame(root, bg=bg)
+    frame.pack(fill=tk.BOTH, expand=True)
+    return frame
+
+
+def run_root(root: tk.Tk):
+    """
+    Enter root's event loop, unless it is already running.
+    
+    Screens opened from a callback of another screen are simply shown by
+    the loop that is already running, rather than nesting a new one.
+    
+    Args:
+        root: The shared Tk root
+    """
+    global _running
+    if _running:
+        return
+    _running = True
+    try:
+        root.mainloop()
+    finally:
+        _running = False
+
+
+def ui_font(root: tk.Tk, size: int, weight: str = 'normal', slant: str = 'roman',
+            family: str = "Segoe UI") -> tkfont.Font:
+    """
+    Get a font for root, created once and shared by every screen.
+    
+    Passing the same Font object to many widgets lets Tk resolve the font
+    once, where a ("Segoe UI", size, ...) tuple is parsed for each widget.
+    
+    Args:
+        root: The shared Tk root
+        size: Point size
+        weight: 'normal' or 'bold'
+        slant: 'roman' or 'italic'
+        family: Font family
+        
+    Returns:
+        Cached tkfont.Font
+    """
+    fonts = _FONTS.setdefault(root, {})
+    key = (size, weight, slant, family)
+    font = fonts.get(key)
+    if font is None:
+        font = fonts[key] = tkfont.Font(root=root, family=family, size=size,
+                                        weight=weight, slant=slant)
+    return font